@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Control de admisión para el API de Clima CDMX
+Limita las peticiones en curso y las que esperan turno; el resto se rechaza
+de inmediato con 503 + Retry-After en lugar de acumularse hasta el timeout
+del cliente. Las rutas reservadas (/health, /api) nunca pasan por aquí.
+Author: EdbETO Solutions Team
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict
+
+class _AdmissionStats:
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = int(max_in_flight)
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    def _stats(self, waiting: int) -> Dict[str, int]:
+        return {
+            'enabled': self.enabled,
+            'max_in_flight': self.max_in_flight,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'waiting': waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
+
+class AdmissionController(_AdmissionStats):
+    """Versión para hilos: quien excede el límite espera en una Condition hasta queue_timeout"""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        super().__init__(max_in_flight, max_queue, queue_timeout)
+        self._cond = threading.Condition()
+        self.waiting = 0
+
+    def acquire(self) -> bool:
+        """True si la petición puede ejecutarse; False si debe rechazarse"""
+        if not self.enabled:
+            return True
+        with self._cond:
+            if self.in_flight < self.max_in_flight and self.waiting == 0:
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                return False
+
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while self.in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                self.admitted += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._cond:
+            return self._stats(self.waiting)
+
+class AsyncAdmissionController(_AdmissionStats):
+    """Versión para el event loop: la cola es FIFO de futures y release cede el turno directamente"""
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        super().__init__(max_in_flight, max_queue, queue_timeout)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        if not self.enabled:
+            return True
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            return False
+
+        turn = asyncio.get_running_loop().create_future()
+        self._waiters.append(turn)
+        try:
+            await asyncio.wait_for(turn, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        finally:
+            if turn in self._waiters:
+                self._waiters.remove(turn)
+        # release() transfirió su lugar: in_flight no cambia
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        while self._waiters:
+            turn = self._waiters.popleft()
+            if not turn.done():
+                turn.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return self._stats(len(self._waiters))
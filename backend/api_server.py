@@ -8,22 +8,44 @@ Licencia: MIT
 
 import json
 import os
-from datetime import datetime
+import queue
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import urllib.parse
-import requests
+
+from config import config
+from admission import AdmissionController
+from event_stream import SSEBroadcaster, parse_event_id, retry_frame, weather_event_hub
+from forecast_index import ForecastIndex
+from json_stream import chunked_frames, is_streamed, iter_json_object
+from singleflight import SingleFlight
+from ttl_cache import TTLCache
+from upstream_client import upstream_client
+from weather_models import to_float, to_int
+from response_cache import (
+    COMPRESSION_MIN_BYTES, VersionedRenderCache, body_digest, compress_body, compress_chunks, http_date,
+    is_not_modified, make_etag, negotiate_encoding
+)
 
 # Importar módulo de Conagua
 try:
-    from conagua_collector import get_weather_for_alcaldia, start_weather_collection, get_collection_status
+    from conagua_collector import (
+        get_weather_for_alcaldia, get_weather_for_alcaldias, start_weather_collection, get_collection_status,
+        follow_weather_snapshot, stop_weather_collection, weather_collector
+    )
     CONAGUA_AVAILABLE = True
     print("✅ Módulo de Conagua cargado correctamente")
     
     # Intentar cargar el módulo de series de tiempo si Conagua está disponible
     try:
-        from conagua_timeseries import ConaguaTimeseriesCollector
+        from conagua_timeseries import timeseries_collector
         TIMESERIES_AVAILABLE = True
-        timeseries_collector = ConaguaTimeseriesCollector()
         print("✅ Módulo de series de tiempo cargado correctamente")
     except ImportError as e:
         print(f"⚠️ Módulo de series de tiempo no disponible: {e}")
@@ -36,35 +58,27 @@ except ImportError as e:
 # External Conagua proxy settings (example — sustituir por dominio real si aplica)
 BASE_URL = "https://smn.conagua.gob.mx/"
 RESOURCE = "tools/GUI/webservices/?method=1"
+PRONOSTICO_URL = BASE_URL + RESOURCE
+PRONOSTICO_TIMEOUT = 10
+PRONOSTICO_HEADERS = {'User-Agent': 'Hydredelback/1.0 (+https://github.com/Edbeto13/Hydredelback)', 'Accept': 'application/json'}
 
-# Simple in-memory cache for pronostico responses: key -> (timestamp, data)
-PRONOSTICO_CACHE = {}
+# Caché del proxy de pronóstico: LRU acotado, TTL de 75 minutos, gracia stale y errores de corta duración
 CACHE_TTL = 75 * 60  # 75 minutes in seconds
+pronostico_cache = TTLCache(
+    max_entries=config.PRONOSTICO_CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+    stale_grace=config.PRONOSTICO_STALE_SECONDS, error_ttl=config.PRONOSTICO_ERROR_TTL
+)
 
-def _cache_get(key):
-    """Obtener valor de caché si existe y no ha expirado"""
-    if key not in PRONOSTICO_CACHE:
-        return None
-    timestamp, data = PRONOSTICO_CACHE[key]
-    if (datetime.now().timestamp() - timestamp) > CACHE_TTL:
-        return None
-    return data
-
-def _cache_set(key, data):
-    """Almacenar valor en caché con timestamp actual"""
-    PRONOSTICO_CACHE[key] = (datetime.now().timestamp(), data)
-
-def to_float(v):
-    try:
-        return float(str(v).replace(",", ".")) if v not in (None, "") else None
-    except Exception:
-        return None
-
-def to_int(v):
-    try:
-        return int(float(v)) if v not in (None, "") else None
-    except Exception:
-        return None
+# Índice local del pronóstico municipal: una descarga por ciclo en lugar de una consulta por clave
+forecast_index = ForecastIndex(
+    PRONOSTICO_URL, config.FORECAST_INDEX_FILE, refresh_interval=CACHE_TTL, states=config.FORECAST_INDEX_STATES,
+    headers=PRONOSTICO_HEADERS, timeout=config.WEATHER_API_TIMEOUT, poll_interval=config.SNAPSHOT_POLL_SECONDS,
+    jitter=config.REFRESH_JITTER_SECONDS
+)
+if CONAGUA_AVAILABLE and config.FORECAST_INDEX_ENABLED:
+    # Los estados del colector se indexan desde su propia descarga: SMN se consulta una vez por estado y ciclo
+    forecast_index.feed_from(weather_collector.tracked_states())
+    weather_collector.add_ingest_listener(forecast_index.ingest)
 
 def parse_dloc(s):
     if not s:
@@ -78,420 +92,1358 @@ def parse_dloc(s):
         except ValueError:
             return s
 
-class ClimaCDMXHandler(BaseHTTPRequestHandler):
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+# Respuestas que por definición no llevan cuerpo ni Content-Length
+BODYLESS_STATUSES = (204, 304)
+
+class ApiResponse:
+    """Respuesta HTTP independiente del motor de servidor.
+
+    El cuerpo es bytes o, para respuestas grandes, un iterable de fragmentos
+    que el motor envía con Transfer-Encoding: chunked.
+    """
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status=200, body=b'', headers=None):
+        self.status = status
+        self.headers = headers if headers is not None else {}
+        self.body = body
+
+def _accept_encoding(request_headers):
+    return negotiate_encoding(request_headers.get('Accept-Encoding') if request_headers is not None else None)
+
+def rendered_response(rendered, request_headers=None, status=200, etag_digest=None, weak=False):
+    """Respuesta a partir de un RenderedBody, eligiendo la variante según Accept-Encoding.
+
+    El ETag usa el digest del cuerpo salvo que la ruta proporcione uno propio;
+    en ambos casos lleva el sufijo de la codificación servida.
+    """
+    headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+    headers.update(CORS_HEADERS)
+    encoding, body = rendered.select(_accept_encoding(request_headers))
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    headers['ETag'] = make_etag(etag_digest or rendered.digest, encoding, weak)
+    return ApiResponse(status, body, headers)
+
+def streamed_response(chunks, request_headers=None, etag_digest=None, weak=False):
+    """Respuesta JSON en fragmentos, comprimida de forma incremental según Accept-Encoding.
+
+    El iterable no se consume aquí: si la petición termina en 304 el cuerpo
+    nunca llega a generarse.
+    """
+    headers = {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
+    headers.update(CORS_HEADERS)
+    encoding = _accept_encoding(request_headers)
+    if encoding != 'identity':
+        chunks = compress_chunks(chunks, encoding)
+        headers['Content-Encoding'] = encoding
+    if etag_digest is not None:
+        headers['ETag'] = make_etag(etag_digest, encoding, weak)
+    return ApiResponse(200, chunks, headers)
+
+def compress_response(response, request_headers):
+    """Comprimir por petición las respuestas JSON que no vienen de un caché pre-renderizado"""
+    headers = response.headers
+    if (response.status in BODYLESS_STATUSES or 'Content-Encoding' in headers or 'ETag' in headers
+            or is_streamed(response.body) or not headers.get('Content-Type', '').startswith('application/json')
+            or len(response.body) < COMPRESSION_MIN_BYTES):
+        return response
     
-    def do_GET(self):
-        # Parse URL
-        parsed_path = urllib.parse.urlparse(self.path)
-        path = parsed_path.path
-        query = urllib.parse.parse_qs(parsed_path.query)
-        
-        # Routes
-        if path == '/api/' or path == '/api':
-            self.handle_api_status()
-        elif path == '/api/weather':
-            self.handle_weather_data(query)
-        elif path == '/api/pronostico':
-            self.handle_pronostico(query)
-        elif path == '/api/weather/status':
-            self.handle_weather_status()
-        elif path == '/api/weather/timeseries':
-            self.handle_timeseries(query)
-        elif path == '/health':
-            self.handle_health()
-        else:
-            self.handle_404()
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = _accept_encoding(request_headers)
+    if encoding != 'identity':
+        response.body = compress_body(response.body, encoding)
+        headers['Content-Encoding'] = encoding
+    return response
+
+def conditional_response(response, request_headers, last_modified=None, max_age=None, etag=None):
+    """Agregar validadores HTTP y resolver GET condicionales.
+
+    El ETag se toma del argumento, del header ya presente o, en último caso,
+    del hash del cuerpo. Si el cliente ya tiene la representación vigente se
+    devuelve un 304 sin cuerpo con los mismos validadores.
+    """
+    if response.status != 200:
+        return response
     
-    def do_POST(self):
-        if self.path == '/api/chat':
-            self.handle_chat()
-        elif self.path == '/api/llm':
-            self.handle_nvidia_api()
+    headers = response.headers
+    if etag is not None:
+        headers['ETag'] = etag
+    elif 'ETag' not in headers:
+        headers['ETag'] = make_etag(body_digest(response.body))
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if max_age is not None:
+        # Alineado al siguiente ciclo de actualización: el cliente no repite la descarga antes
+        headers['Cache-Control'] = f"public, max-age={max(0, int(max_age))}"
+    
+    if is_not_modified(request_headers, headers['ETag'], last_modified):
+        not_modified = {k: v for k, v in headers.items() if k not in ('Content-Type', 'Content-Encoding')}
+        return ApiResponse(304, b'', not_modified)
+    return response
+
+def json_response(payload, status=200):
+    """Serializar un payload como respuesta JSON con headers CORS"""
+    headers = {'Content-Type': 'application/json'}
+    headers.update(CORS_HEADERS)
+    body = json.dumps(payload, indent=2, ensure_ascii=False).encode('utf-8')
+    return ApiResponse(status, body, headers)
+
+def get_simulated_data(alcaldia):
+    """Datos meteorológicos simulados como fallback"""
+    import random
+    
+    # Generar datos realistas para CDMX
+    base_temp = 20 + random.uniform(-3, 8)
+    
+    return {
+        "alcaldia": alcaldia,
+        "temperatura": f"{base_temp:.0f}°C",
+        "humedad": f"{55 + random.randint(0, 25)}%",
+        "viento": f"{8 + random.randint(0, 12)} km/h",
+        "precipitacion": f"{random.choice([0, 0, 0, 0.5, 1.2, 2.8])} mm",
+        "presion": f"{1013 + random.randint(-8, 8)} hPa",
+        "timestamp": datetime.now().isoformat(),
+        "pronostico": get_default_forecast(),
+        "source": "Simulated Data",
+        "station_name": f"Estación {alcaldia.title()}"
+    }
+
+def get_default_forecast():
+    """Pronóstico por defecto"""
+    return [
+        {"dia": "Hoy", "temp_max": "25°C", "temp_min": "18°C", "condicion": "Parcialmente nublado"},
+        {"dia": "Mañana", "temp_max": "27°C", "temp_min": "19°C", "condicion": "Soleado"},
+        {"dia": "Pasado mañana", "temp_max": "24°C", "temp_min": "17°C", "condicion": "Lluvioso"}
+    ]
+
+def generate_chat_response(question):
+    """Genera respuestas del chatbot"""
+    question_lower = question.lower()
+    
+    if 'temperatura' in question_lower or 'temp' in question_lower:
+        return "La temperatura actual en CDMX es de 22°C con máxima de 25°C."
+    elif 'lluvia' in question_lower or 'llover' in question_lower:
+        return "No se esperan lluvias para hoy. Precipitación: 0 mm."
+    elif 'viento' in question_lower:
+        return "El viento actual es de 15 km/h del noreste."
+    elif 'humedad' in question_lower:
+        return "La humedad relativa es del 65%. "
+    else:
+        return f"Información sobre el clima en CDMX disponible. Pregunta sobre temperatura, lluvia, viento o humedad."
+
+# ---------------------------------------------------------------------------
+# Rutas del API
+# Cada función construye un ApiResponse sin escribir en el socket, de modo que
+# el mismo código sirve al handler threaded y al motor asyncio.
+# ---------------------------------------------------------------------------
+
+def api_status_response():
+    """Status del API con información de Conagua"""
+    response = {
+        "status": "active",
+        "service": "Clima CDMX API",
+        "version": "2.0.0",
+        "timestamp": datetime.now().isoformat(),
+        "endpoints": [
+            "/api/weather", "/api/weather/batch", "/api/weather/stream", "/api/weather/status", "/api/chat", "/health"
+        ],
+        "conagua_integration": {
+            "available": CONAGUA_AVAILABLE,
+            "status": "collecting" if CONAGUA_AVAILABLE else "fallback_mode",
+            "update_interval": "75 minutes" if CONAGUA_AVAILABLE else "N/A"
+        }
+    }
+    return json_response(response)
+
+def format_weather_data(alcaldia, weather_data):
+    """Formatear datos del colector al contrato público de /api/weather"""
+    return {
+        "alcaldia": alcaldia,
+        "temperatura": weather_data.get("temperatura", "22°C"),
+        "humedad": weather_data.get("humedad", "65%"),
+        "viento": weather_data.get("viento", "15 km/h"),
+        "precipitacion": weather_data.get("precipitacion", "0 mm"),
+        "presion": weather_data.get("presion", "1013 hPa"),
+        "timestamp": weather_data.get("timestamp", datetime.now().isoformat()),
+        "pronostico": weather_data.get("pronostico", get_default_forecast()),
+        "source": weather_data.get("source", "SMN/Conagua"),
+        # Fija por actualización (no una edad en minutos): el documento y su ETag no cambian entre ciclos
+        "last_update": weather_data.get("last_update"),
+        "station_name": weather_data.get("station_name", f"Estación {alcaldia.title()}"),
+        # Frescura del snapshot: stale=True indica que ya hay una actualización en segundo plano
+        "stale": weather_data.get("stale", False),
+        "refreshing": weather_data.get("refreshing", False),
+        "station_status": weather_data.get("station_status")
+    }
+
+# Cuerpos de /api/weather renderizados una vez por versión de datos del colector
+weather_body_cache = VersionedRenderCache()
+
+def weather_render_version():
+    """Versión de los cuerpos de /api/weather: datos y frescura forman parte del documento"""
+    return (weather_collector.data_seq, weather_collector.data_version,
+            weather_collector.needs_update(), weather_collector.is_refreshing())
+
+def weather_etag_digest():
+    """Validador de los documentos del colector derivado de la actualización y no del cuerpo.
+
+    last_update y data_seq viajan en el snapshot, así que todos los procesos
+    pre-fork entregan el mismo ETag para los mismos datos.
+    """
+    last_update = weather_collector.last_update
+    digest = f"{int(last_update.timestamp()) if last_update else 0}.{weather_collector.data_seq}"
+    if weather_collector.needs_update():
+        digest += '.stale'
+    if weather_collector.is_refreshing():
+        digest += '.refreshing'
+    return digest
+
+def _render_weather(alcaldia):
+    print(f"🌤️ Renderizando datos de Conagua para {alcaldia}")
+    return format_weather_data(alcaldia, get_weather_for_alcaldia(alcaldia))
+
+# Respuestas por coordenadas: clave redondeada a 3 decimales (~100 m) para acotar el número de cuerpos
+nearest_body_cache = VersionedRenderCache(max_entries=256)
+COORDINATE_DECIMALS = 3
+
+def parse_coordinates(query):
+    """?lat=&lon=&k= -> ((lat, lon, k), error)"""
+    lat = to_float(query.get('lat', [None])[0])
+    lon = to_float(query.get('lon', [None])[0])
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, json_response({
+            "error": "invalid_coordinates",
+            "message": "Proporcione lat (-90 a 90) y lon (-180 a 180) numéricos"
+        }, status=400)
+    k = to_int(query.get('k', [None])[0]) or config.NEAREST_STATIONS_K
+    k = max(1, min(k, weather_collector.locator.tree.size))
+    return (round(lat, COORDINATE_DECIMALS), round(lon, COORDINATE_DECIMALS), k), None
+
+def _render_nearest_weather(lat, lon, nearest):
+    alcaldia = nearest[0]['alcaldia']
+    print(f"📍 Renderizando datos de Conagua para ({lat}, {lon}) -> {alcaldia}")
+    payload = format_weather_data(alcaldia, get_weather_for_alcaldia(alcaldia))
+    payload["lat"] = lat
+    payload["lon"] = lon
+    payload["nearest"] = nearest
+    return payload
+
+def nearest_weather_response(query, request_headers=None):
+    """Datos de la estación más cercana a ?lat=&lon= y las k más cercanas con distancia y peso"""
+    coordinates, error = parse_coordinates(query)
+    if error:
+        return error
+    lat, lon, k = coordinates
+    
+    # Búsqueda en el KD-tree construido al iniciar: O(log n) por petición
+    nearest = weather_collector.nearest_stations(lat, lon, k)
+    if not nearest or nearest[0]['distance_km'] > config.NEAREST_MAX_DISTANCE_KM:
+        return json_response({
+            "error": "out_of_coverage",
+            "message": f"No hay estaciones a menos de {config.NEAREST_MAX_DISTANCE_KM:g} km de ({lat}, {lon})"
+        }, status=404)
+    
+    weather_collector.refresh_if_stale()
+    rendered = nearest_body_cache.get(coordinates, weather_render_version(),
+                                      lambda: _render_nearest_weather(lat, lon, nearest))
+    return conditional_response(
+        rendered_response(rendered, request_headers, etag_digest=weather_etag_digest()), request_headers,
+        last_modified=weather_collector.data_modified,
+        max_age=weather_collector.seconds_until_next_update()
+    )
+
+def weather_response(query, request_headers=None):
+    """Datos meteorológicos de Conagua/SMN"""
+    if CONAGUA_AVAILABLE and ('lat' in query or 'lon' in query):
+        return nearest_weather_response(query, request_headers)
+    alcaldia = query.get('alcaldia', ['cdmx'])[0]
+    
+    try:
+        if CONAGUA_AVAILABLE:
+            # Nunca bloquea: si los datos vencieron se sirven marcados como stale mientras se actualizan
+            weather_collector.refresh_if_stale()
+            if alcaldia in weather_collector.cache_data:
+                rendered = weather_body_cache.get(alcaldia, weather_render_version(), lambda: _render_weather(alcaldia))
+                return conditional_response(
+                    rendered_response(rendered, request_headers, etag_digest=weather_etag_digest()), request_headers,
+                    last_modified=weather_collector.data_modified,
+                    max_age=weather_collector.seconds_until_next_update()
+                )
+            
+            # Alcaldía desconocida: no se cachea para no crecer con claves arbitrarias
+            weather_data = get_weather_for_alcaldia(alcaldia)
+            print(f"🌤️ Datos obtenidos de Conagua para {alcaldia}")
         else:
-            self.handle_404()
+            # Fallback a datos simulados
+            weather_data = get_simulated_data(alcaldia)
+            print(f"📊 Usando datos simulados para {alcaldia}")
+        
+        return json_response(format_weather_data(alcaldia, weather_data))
+        
+    except Exception as e:
+        print(f"❌ Error obteniendo datos meteorológicos: {e}")
+        # Enviar datos de emergencia
+        emergency_data = get_simulated_data(alcaldia)
+        emergency_data["error"] = f"Error del sistema: {str(e)}"
+        emergency_data["source"] = "Emergency Fallback"
+        # Enviar 200 para que el frontend no falle
+        return json_response(emergency_data)
+
+# Documentos combinados por selección de alcaldías ('all' o lista explícita)
+batch_body_cache = VersionedRenderCache(max_entries=64)
+MAX_BATCH_ALCALDIAS = 32
+
+def parse_batch_query(query):
+    """Normalizar ?alcaldias=a,b (o repetido / 'all') -> (clave de selección, error)"""
+    names = []
+    for value in query.get('alcaldias', []) + query.get('alcaldia', []):
+        for name in value.split(','):
+            name = name.strip().lower()
+            if name and name not in names:
+                names.append(name)
     
-    def do_OPTIONS(self):
-        # Handle CORS preflight
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+    if not names or 'all' in names:
+        return 'all', None
+    if len(names) > MAX_BATCH_ALCALDIAS:
+        return None, json_response({
+            "error": "too_many_alcaldias",
+            "message": f"Máximo {MAX_BATCH_ALCALDIAS} alcaldías por petición (o use alcaldias=all)"
+        }, status=400)
+    return tuple(names), None
+
+def _render_weather_batch(selection):
+    alcaldias = list(weather_collector.cdmx_stations) if selection == 'all' else list(selection)
+    print(f"🗺️ Renderizando lote de Conagua ({len(alcaldias)} alcaldías)")
+    batch = get_weather_for_alcaldias(alcaldias)
+    return {
+        "alcaldias": {alcaldia: format_weather_data(alcaldia, data) for alcaldia, data in batch.items()},
+        "count": len(batch),
+        "not_found": [alcaldia for alcaldia in alcaldias if alcaldia not in batch],
+        "last_update": weather_collector.last_update.isoformat() if weather_collector.last_update else None,
+        "data_seq": weather_collector.data_seq,
+        "stale": weather_collector.needs_update(),
+        "refreshing": weather_collector.is_refreshing()
+    }
+
+def weather_batch_response(query, request_headers=None):
+    """Varias alcaldías en un solo documento, renderizado una vez por versión de datos"""
+    selection, error = parse_batch_query(query)
+    if error is not None:
+        return error
     
-    def handle_api_status(self):
-        """Status del API con información de Conagua"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+    try:
+        if not CONAGUA_AVAILABLE:
+            alcaldias = ['cdmx'] if selection == 'all' else list(selection)
+            print(f"📊 Usando datos simulados para lote de {len(alcaldias)} alcaldías")
+            return json_response({
+                "alcaldias": {alcaldia: get_simulated_data(alcaldia) for alcaldia in alcaldias},
+                "count": len(alcaldias),
+                "not_found": [],
+                "source": "Simulated Data"
+            })
+        
+        weather_collector.refresh_if_stale()
+        rendered = batch_body_cache.get(selection, weather_render_version(), lambda: _render_weather_batch(selection))
+        return conditional_response(
+            rendered_response(rendered, request_headers, etag_digest=weather_etag_digest()), request_headers,
+            last_modified=weather_collector.data_modified,
+            max_age=weather_collector.seconds_until_next_update()
+        )
+    
+    except Exception as e:
+        print(f"❌ Error obteniendo lote meteorológico: {e}")
+        return json_response({"error": "batch_error", "message": str(e)}, status=500)
+
+# Server-Sent Events: el colector publica una vez por actualización y cada motor reparte
+STREAM_PATH = '/api/weather/stream'
+_sse_broadcaster = None
+_sse_broadcaster_pid = None
+_sse_broadcaster_lock = threading.Lock()
+
+def get_sse_broadcaster():
+    """Difusor SSE de este proceso, creado en el primer /api/weather/stream.
+
+    Su selector (epoll) y su socketpair de aviso no pueden heredarse del
+    padre pre-fork: cada worker crea los suyos.
+    """
+    global _sse_broadcaster, _sse_broadcaster_pid
+    with _sse_broadcaster_lock:
+        if _sse_broadcaster is None or _sse_broadcaster_pid != os.getpid():
+            _sse_broadcaster = SSEBroadcaster(weather_event_hub)
+            _sse_broadcaster_pid = os.getpid()
+        return _sse_broadcaster
+
+def weather_event_id():
+    """Id de evento SSE: secuencia persistida de cambios del colector.
+
+    Crece también con los reintentos parciales y las recargas de un seguidor
+    (last_update solo cambia por ciclo completo) y es la misma en todos los
+    procesos pre-fork porque viaja en el snapshot.
+    """
+    return weather_collector.data_seq
+
+def publish_weather_update(data_version, changed):
+    """Listener del colector: publicar las alcaldías que cambiaron en la actualización"""
+    if not changed:
+        return
+    batch = get_weather_for_alcaldias(changed)
+    weather_event_hub.publish(weather_event_id(), 'update', {
+        "data_version": data_version,
+        "last_update": weather_collector.last_update.isoformat() if weather_collector.last_update else None,
+        "changed": changed,
+        "alcaldias": {alcaldia: format_weather_data(alcaldia, data) for alcaldia, data in batch.items()}
+    })
+    print(f"📡 Evento SSE publicado: {len(changed)} alcaldías")
+
+if CONAGUA_AVAILABLE:
+    weather_collector.add_update_listener(publish_weather_update)
+
+def event_stream_headers():
+    headers = {'Content-Type': 'text/event-stream; charset=utf-8', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    headers.update(CORS_HEADERS)
+    return headers
+
+def event_stream_preamble(request_headers=None):
+    """Bytes iniciales del stream y el id del último evento que incluyen.
+
+    Con un Last-Event-ID vigente o todavía en el historial solo se reenvía lo
+    perdido; en cualquier otro caso el cliente recibe el snapshot completo.
+    """
+    last_event_id = parse_event_id(request_headers.get('Last-Event-ID') if request_headers is not None else None)
+    event_id = weather_event_id()
+    backlog = weather_event_hub.backlog_since(last_event_id, event_id)
+    if backlog is None:
+        snapshot = weather_event_hub.snapshot(event_id, lambda: _render_weather_batch('all'))
+        return retry_frame() + snapshot, event_id
+    frames = b''.join(frame for _, frame in backlog)
+    return retry_frame() + frames, backlog[-1][0] if backlog else last_event_id
+
+def event_stream_unavailable_response():
+    return json_response({
+        "error": "stream_not_available",
+        "message": "El canal de eventos requiere el colector de Conagua y SERVER_MODE threaded o async"
+    }, status=503)
+
+def weather_status_response(server=None):
+    """Estado del sistema de recolección de datos"""
+    try:
+        if CONAGUA_AVAILABLE:
+            status = get_collection_status()
+            status["conagua_module"] = "available"
+        else:
+            status = {
+                "conagua_module": "not_available",
+                "status": "fallback_mode",
+                "message": "Using simulated data"
+            }
+        if hasattr(server, 'get_pool_status'):
+            status["server_pool"] = server.get_pool_status()
+        status["response_cache"] = {
+            "weather": weather_body_cache.get_stats(),
+            "nearest": nearest_body_cache.get_stats(),
+            "batch": batch_body_cache.get_stats(),
+            "timeseries": timeseries_body_cache.get_stats(),
+            "pronostico": pronostico_body_cache.get_stats()
+        }
+        status["event_stream"] = weather_event_hub.get_stats()
+        status["upstream"] = upstream_client.get_stats()
+        status["pronostico_proxy"] = {
+            "cache": pronostico_cache.get_stats(),
+            "single_flight": getattr(server, 'pronostico_flight', pronostico_flight).get_stats(),
+            "index": forecast_index.get_status() if config.FORECAST_INDEX_ENABLED else None
+        }
+        return json_response(status)
+        
+    except Exception as e:
+        return json_response({'error': 'server_error', 'message': f"Error getting weather status: {e}"}, status=500)
+
+def chat_response(post_data):
+    """Chatbot responses"""
+    try:
+        data = json.loads(post_data.decode())
+        question = data.get('question', '')
+        
+        # Simple chatbot logic
+        response_text = generate_chat_response(question)
         
         response = {
-            "status": "active",
-            "service": "Clima CDMX API",
-            "version": "2.0.0",
+            "response": response_text,
             "timestamp": datetime.now().isoformat(),
-            "endpoints": ["/api/weather", "/api/weather/status", "/api/chat", "/health"],
-            "conagua_integration": {
-                "available": CONAGUA_AVAILABLE,
-                "status": "collecting" if CONAGUA_AVAILABLE else "fallback_mode",
-                "update_interval": "75 minutes" if CONAGUA_AVAILABLE else "N/A"
-            }
+            "source": "backend_chatbot"
+        }
+        return json_response(response)
+        
+    except Exception as e:
+        return json_response({'error': 'bad_request', 'message': f"Error processing chat: {e}"}, status=400)
+
+def health_response():
+    """Health check endpoint"""
+    health = {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "uptime": "running",
+        "services": {
+            "api": "active",
+            "weather": "active",
+            "chat": "active"
+        },
+        "conagua_integration": CONAGUA_AVAILABLE
+    }
+    return json_response(health)
+
+def nvidia_response():
+    """NVIDIA FourCastNet integration"""
+    response = {
+        "error": "NVIDIA API integration requires additional setup",
+        "message": "Configure NGC_API_KEY environment variable",
+        "fallback": "Using local weather data instead"
+    }
+    return json_response(response, status=501)
+
+def not_found_response():
+    return json_response({'error': 'not_found', 'message': 'Endpoint not found'}, status=404)
+
+def options_response():
+    """Respuesta a preflight CORS"""
+    return ApiResponse(200, b'', dict(CORS_HEADERS))
+
+def timeseries_response(query, request_headers=None):
+    """Endpoint para obtener series temporales de datos meteorológicos"""
+    if not TIMESERIES_AVAILABLE:
+        response = {
+            "error": "timeseries_not_available",
+            "message": "El módulo de series temporales no está disponible",
+            "status": "error"
         }
-        self.wfile.write(json.dumps(response, indent=2, ensure_ascii=False).encode('utf-8'))
+        return json_response(response, status=501)
     
-    def handle_weather_data(self, query):
-        """Datos meteorológicos de Conagua/SMN"""
-        alcaldia = query.get('alcaldia', ['cdmx'])[0]
+    try:
+        # Obtener parámetros
+        alcaldia = query.get('alcaldia', ['cdmx'])[0]  # Usar CDMX como valor por defecto
+        stats_only = query.get('stats', ['false'])[0].lower() == 'true'
+        hours = query.get('hours', [None])[0]
         
-        try:
-            if CONAGUA_AVAILABLE:
-                # Obtener datos reales de Conagua
-                weather_data = get_weather_for_alcaldia(alcaldia)
-                print(f"🌤️ Datos obtenidos de Conagua para {alcaldia}")
-            else:
-                # Fallback a datos simulados
-                weather_data = self.get_simulated_data(alcaldia)
-                print(f"📊 Usando datos simulados para {alcaldia}")
-            
-            # Formatear respuesta
-            formatted_data = {
-                "alcaldia": alcaldia,
-                "temperatura": weather_data.get("temperatura", "22°C"),
-                "humedad": weather_data.get("humedad", "65%"),
-                "viento": weather_data.get("viento", "15 km/h"),
-                "precipitacion": weather_data.get("precipitacion", "0 mm"),
-                "presion": weather_data.get("presion", "1013 hPa"),
-                "timestamp": weather_data.get("timestamp", datetime.now().isoformat()),
-                "pronostico": weather_data.get("pronostico", self.get_default_forecast()),
-                "source": weather_data.get("source", "SMN/Conagua"),
-                "cache_age": weather_data.get("cache_age", "N/A"),
-                "station_name": weather_data.get("station_name", f"Estación {alcaldia.title()}")
-            }
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(formatted_data, indent=2, ensure_ascii=False).encode('utf-8'))
-            
-        except Exception as e:
-            print(f"❌ Error obteniendo datos meteorológicos: {e}")
-            # Enviar datos de emergencia
-            emergency_data = self.get_simulated_data(alcaldia)
-            emergency_data["error"] = f"Error del sistema: {str(e)}"
-            emergency_data["source"] = "Emergency Fallback"
-            
-            self.send_response(200)  # Enviar 200 para que el frontend no falle
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(emergency_data, indent=2, ensure_ascii=False).encode('utf-8'))
-    
-    def get_simulated_data(self, alcaldia):
-        """Datos meteorológicos simulados como fallback"""
-        import random
+        # Convertir hours a entero si existe
+        if hours:
+            try:
+                hours = int(hours)
+            except ValueError:
+                hours = None
         
-        # Generar datos realistas para CDMX
-        base_temp = 20 + random.uniform(-3, 8)
+        # Obtener datos de series temporales
+        if stats_only:
+            # Si solo se solicitan estadísticas
+            from conagua_timeseries import timeseries_collector
+            return json_response(timeseries_collector.get_statistics())
         
-        return {
-            "alcaldia": alcaldia,
-            "temperatura": f"{base_temp:.0f}°C",
-            "humedad": f"{55 + random.randint(0, 25)}%",
-            "viento": f"{8 + random.randint(0, 12)} km/h",
-            "precipitacion": f"{random.choice([0, 0, 0, 0.5, 1.2, 2.8])} mm",
-            "presion": f"{1013 + random.randint(-8, 8)} hPa",
-            "timestamp": datetime.now().isoformat(),
-            "pronostico": self.get_default_forecast(),
-            "source": "Simulated Data",
-            "station_name": f"Estación {alcaldia.title()}"
+        # Obtener datos para una alcaldía específica
+        from conagua_timeseries import get_timeseries, timeseries_collector
+        window = hours if hours and hours > 0 else None
+        series_version = timeseries_collector.get_series_version(alcaldia)
+        if series_version is None:
+            # Sin datos para la alcaldía: no se cachea para no crecer con claves arbitrarias
+            return json_response(get_timeseries(alcaldia))
+        
+        last_update, points = series_version
+        etag_digest = timeseries_digest(alcaldia, last_update, points, window)
+        if points >= config.TIMESERIES_STREAM_MIN_POINTS:
+            # Historial grande: se codifica punto por punto directamente desde la serie
+            response = streamed_response(_stream_timeseries(alcaldia, window), request_headers,
+                                         etag_digest=etag_digest, weak=window is not None)
+        else:
+            # Con ventana de horas se re-renderiza cada 5 minutos para ir descartando puntos viejos
+            version = (last_update, points, int(time.time() // 300) if window else None)
+            rendered = timeseries_body_cache.get(
+                (alcaldia, window), version, lambda: _render_timeseries(alcaldia, window)
+            )
+            response = rendered_response(rendered, request_headers, etag_digest=etag_digest,
+                                         weak=window is not None)
+        return conditional_response(response, request_headers, **timeseries_freshness(last_update))
+        
+    except Exception as e:
+        print(f"❌ Error obteniendo series temporales: {e}")
+        error_response = {
+            "error": "server_error",
+            "message": f"Error al procesar series temporales: {str(e)}",
+            "status": "error"
         }
+        return json_response(error_response, status=500)
+
+# Series renderizadas por (alcaldía, ventana de horas); acotado porque 'hours' es libre
+timeseries_body_cache = VersionedRenderCache(max_entries=256)
+
+def _render_timeseries(alcaldia, hours):
+    from conagua_timeseries import get_timeseries, timeseries_collector
+    timeseries_data = get_timeseries(alcaldia)
+    
+    # Filtrar por horas si se especifica: solo puntos de las últimas X horas
+    if hours:
+        since = datetime.now() - timedelta(hours=hours)
+        timeseries_data['series'] = list(timeseries_collector.iter_points(alcaldia, since))
+        timeseries_data['filtered_by_hours'] = hours
+    return timeseries_data
+
+def _stream_timeseries(alcaldia, hours):
+    """Mismo documento que _render_timeseries, generado en fragmentos sin copiar la serie"""
+    from conagua_timeseries import timeseries_collector
+    since = datetime.now() - timedelta(hours=hours) if hours else None
+    # Solo los metadatos: los puntos se leen de iter_points a medida que se envían
+    meta = timeseries_collector.series_meta(alcaldia) or {}
+    fields = [('municipio', meta.get('municipio')), ('lastUpdate', meta.get('lastUpdate')),
+              ('series', timeseries_collector.iter_points(alcaldia, since))]
+    fields.extend((key, value) for key, value in meta.items() if key not in ('municipio', 'lastUpdate'))
+    if hours:
+        fields.append(('filtered_by_hours', hours))
+    return iter_json_object(fields)
+
+def timeseries_digest(alcaldia, last_update, points, hours):
+    """Digest para el ETag derivado de lastUpdate de la serie (no del cuerpo).
+
+    Con filtro de horas la ventana avanza con el reloj aunque no haya datos
+    nuevos, así que el validador es débil: equivalente mientras no llegue un
+    punto nuevo.
+    """
+    return body_digest(f"{alcaldia}|{last_update}|{points}|{hours or ''}".encode('utf-8'))
+
+def timeseries_freshness(last_update):
+    """Last-Modified y max-age de una serie a partir del ciclo de 75 minutos"""
+    from conagua_timeseries import get_cron_info
+    cron = get_cron_info()
+    return {
+        'last_modified': datetime.fromisoformat(last_update),
+        'max_age': cron.get('remainingMinutes', 0) * 60
+    }
+
+def is_int_like(x):
+    if x is None: return False
+    try:
+        int(str(x))
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def parse_pronostico_query(query):
+    """Validar parámetros de /api/pronostico.
+
+    Retorna (params, cache_key, None) o (None, None, ApiResponse de error).
+    """
+    # leer parámetros compatibles con el ejemplo
+    ides = query.get('ides', [None])[0]
+    idmun = query.get('idmun', [None])[0]
+    ndia = query.get('ndia', [None])[0]
+
+    # If none provided, return 400
+    if not any([ides, idmun, ndia]):
+        error = json_response({'error': 'missing_parameters', 'message': 'Provide at least one of ides, idmun, ndia'}, status=400)
+        return None, None, error
+
+    params = {}
+    if ides and is_int_like(ides): params['ides'] = int(str(ides))
+    if idmun and is_int_like(idmun): params['idmun'] = int(str(idmun))
+    if ndia and is_int_like(ndia): params['ndia'] = int(str(ndia))
+
+    cache_key = f"p:{params.get('ides')}_{params.get('idmun')}_{params.get('ndia')}"
+    return params, cache_key, None
+
+def normalize_pronostico(data):
+    """Normalizar respuesta de SMN (matching example fields)"""
+    return {
+        'ides': to_int(data.get('ides')),
+        'idmun': to_int(data.get('idmun')),
+        'nes': data.get('nes'),
+        'nmun': data.get('nmun'),
+        'dloc': data.get('dloc'),
+        'dloc_iso': parse_dloc(data.get('dloc')),
+        'ndia': to_int(data.get('ndia')),
+        'tmax': to_float(data.get('tmax')),
+        'tmin': to_float(data.get('tmin')),
+        'desciel': data.get('desciel'),
+        'probprec': to_float(data.get('probprec')),
+        'prec': to_float(data.get('prec')),
+        'velvien': to_float(data.get('velvien')),
+        'dirvienc': data.get('dirvienc'),
+        'dirvieng': to_float(data.get('dirvieng')),
+        'cc': to_float(data.get('cc')),
+        'lat': to_float(data.get('lat')),
+        'lon': to_float(data.get('lon')),
+        'dh': to_int(data.get('dh')),
+        'raf': to_float(data.get('raf')),
+        'raw': data
+    }
+
+def fetch_pronostico(params):
+    """Consultar SMN (bloqueante) y normalizar la respuesta"""
+    data = upstream_client.get_json(PRONOSTICO_URL, params=params, headers=PRONOSTICO_HEADERS, timeout=PRONOSTICO_TIMEOUT)
+    return normalize_pronostico(data)
+
+# Al expirar una entrada solo una petición por clave consulta a SMN; las concurrentes esperan su resultado
+pronostico_flight = SingleFlight()
+
+def refresh_pronostico(cache_key, params):
+    """Consultar SMN y guardar en caché; retorna la CacheEntry. Los errores quedan en caché negativo"""
+    # Otra petición pudo completar la consulta entre la lectura del caché y el single-flight
+    entry = pronostico_cache.get_fresh(cache_key)
+    if entry is not None:
+        return entry
+    try:
+        return pronostico_cache.set(cache_key, fetch_pronostico(params))
+    except Exception as e:
+        pronostico_cache.set_error(cache_key, str(e))
+        raise
+
+def revalidate_pronostico(cache_key, params):
+    """Refrescar en segundo plano una entrada vencida que se sigue sirviendo"""
+    try:
+        pronostico_flight.do(cache_key, lambda: refresh_pronostico(cache_key, params))
+    except Exception as e:
+        print(f"⚠️ Revalidación de pronóstico fallida ({cache_key}): {e}")
+    finally:
+        pronostico_cache.end_revalidate(cache_key)
+
+def pronostico_error_response(error, retry_after=None):
+    print(f"❌ Error en proxy pronostico: {error}")
+    response = json_response({'error': 'proxy_failed', 'message': str(error)}, status=502)
+    if retry_after is None:
+        retry_after = pronostico_cache.error_ttl
+    response.headers['Retry-After'] = str(max(1, int(retry_after)))
+    return response
+
+def pronostico_cached_error_response(entry):
+    """502 desde el caché negativo: no se vuelve a consultar SMN hasta que expire"""
+    return pronostico_error_response(entry.error, retry_after=entry.expires_at - datetime.now().timestamp())
+
+# Cuerpos de pronóstico renderizados una vez por entrada del caché del proxy
+pronostico_body_cache = VersionedRenderCache(max_entries=config.PRONOSTICO_CACHE_MAX_ENTRIES)
+
+def pronostico_cached_response(entry, request_headers=None, cache_key=None):
+    """Respuesta de pronóstico con validadores según la CacheEntry (vencida en gracia = max-age 0)"""
+    remaining = entry.expires_at - datetime.now().timestamp()
+    rendered = pronostico_body_cache.get(cache_key, entry.stored_at, lambda: entry.value)
+    return conditional_response(
+        rendered_response(rendered, request_headers), request_headers,
+        last_modified=datetime.fromtimestamp(entry.stored_at), max_age=remaining
+    )
+
+def indexed_pronostico_response(params, cache_key, request_headers=None):
+    """Respuesta desde el índice local; None si la clave no está cubierta y debe ir al proxy en vivo"""
+    if not config.FORECAST_INDEX_ENABLED:
+        return None
+    # Registro, versión y fecha de la misma versión publicada aunque el líder instale otra en medio
+    snapshot = forecast_index.snapshot
+    covered, record = snapshot.lookup(params.get('ides'), params.get('idmun'), params.get('ndia'))
+    if not covered:
+        return None
+    if record is None:
+        return json_response({'error': 'not_found', 'message': 'SMN no publica pronóstico para esa clave'}, status=404)
+    rendered = pronostico_body_cache.get(cache_key, ('index', snapshot.version), lambda: normalize_pronostico(record))
+    return conditional_response(
+        rendered_response(rendered, request_headers), request_headers,
+        last_modified=datetime.fromtimestamp(snapshot.fetched_at), max_age=forecast_index.seconds_until_refresh(snapshot)
+    )
+
+def pronostico_response(query, request_headers=None):
+    """Proxy ligero para /api/pronostico usando el servicio externo de ejemplo"""
+    params, cache_key, error = parse_pronostico_query(query)
+    if error is not None:
+        return error
+
+    indexed = indexed_pronostico_response(params, cache_key, request_headers)
+    if indexed is not None:
+        return indexed
+
+    entry = pronostico_cache.lookup(cache_key)
+    if entry is not None:
+        if entry.error is not None:
+            return pronostico_cached_error_response(entry)
+        if entry.is_stale() and pronostico_cache.begin_revalidate(cache_key):
+            threading.Thread(target=revalidate_pronostico, args=(cache_key, params), daemon=True).start()
+        return pronostico_cached_response(entry, request_headers, cache_key)
+
+    try:
+        entry = pronostico_flight.do(cache_key, lambda: refresh_pronostico(cache_key, params))
+        return pronostico_cached_response(entry, request_headers, cache_key)
+    except Exception as e:
+        return pronostico_error_response(e)
+
+# Control de admisión: las rutas reservadas (sondas de orquestación) nunca esperan ni se rechazan
+RESERVED_PATHS = frozenset(path.strip() for path in config.ADMISSION_RESERVED_PATHS if path.strip())
+request_admission = AdmissionController(
+    config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE, config.ADMISSION_QUEUE_TIMEOUT
+)
+
+def overloaded_response():
+    """503 inmediato con Retry-After cuando se exceden los límites de admisión"""
+    response = json_response({'error': 'server_busy', 'message': 'Server overloaded, retry later'}, status=503)
+    response.headers['Retry-After'] = str(config.ADMISSION_RETRY_AFTER)
+    return response
+
+def dispatch_get(path, query, server=None, request_headers=None):
+    """Resolver una ruta GET a su ApiResponse"""
+    if path == '/api/' or path == '/api':
+        response = api_status_response()
+    elif path == '/api/weather':
+        response = weather_response(query, request_headers)
+    elif path == '/api/weather/batch':
+        response = weather_batch_response(query, request_headers)
+    elif path == '/api/pronostico':
+        response = pronostico_response(query, request_headers)
+    elif path == '/api/weather/status':
+        response = weather_status_response(server)
+    elif path == '/api/weather/timeseries':
+        response = timeseries_response(query, request_headers)
+    elif path == '/health':
+        response = health_response()
+    else:
+        response = not_found_response()
+    return compress_response(response, request_headers)
+
+def dispatch_post(path, body, request_headers=None):
+    """Resolver una ruta POST a su ApiResponse"""
+    if path == '/api/chat':
+        response = chat_response(body)
+    elif path == '/api/llm':
+        response = nvidia_response()
+    else:
+        response = not_found_response()
+    return compress_response(response, request_headers)
+
+class ClimaCDMXHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para reutilizar la conexión entre peticiones del dashboard
+    protocol_version = 'HTTP/1.1'
+    # Timeout de socket: cierra conexiones keep-alive inactivas
+    timeout = config.KEEPALIVE_TIMEOUT
+    max_requests_per_connection = config.KEEPALIVE_MAX_REQUESTS
     
-    def get_default_forecast(self):
-        """Pronóstico por defecto"""
-        return [
-            {"dia": "Hoy", "temp_max": "25°C", "temp_min": "18°C", "condicion": "Parcialmente nublado"},
-            {"dia": "Mañana", "temp_max": "27°C", "temp_min": "19°C", "condicion": "Soleado"},
-            {"dia": "Pasado mañana", "temp_max": "24°C", "temp_min": "17°C", "condicion": "Lluvioso"}
-        ]
+    def setup(self):
+        super().setup()
+        # Una conexión que vuelve del estacionamiento conserva su cuenta de peticiones
+        served = getattr(self.server, 'requests_served', None)
+        self.requests_on_connection = served(self.request) if served else 0
+        # True si la conexión quedó abierta y sin petición pendiente: el servidor la estaciona
+        self.idle = False
     
-    def handle_weather_status(self):
-        """Estado del sistema de recolección de datos"""
-        try:
-            if CONAGUA_AVAILABLE:
-                status = get_collection_status()
-                status["conagua_module"] = "available"
-            else:
-                status = {
-                    "conagua_module": "not_available",
-                    "status": "fallback_mode",
-                    "message": "Using simulated data"
-                }
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(status, indent=2, ensure_ascii=False).encode('utf-8'))
-            
-        except Exception as e:
-            self.send_error(500, f"Error getting weather status: {e}")
+    def handle(self):
+        """Atender las peticiones de la conexión.
+
+        Con un servidor que estaciona conexiones (pool de workers), en cuanto no
+        hay otra petición ya recibida el handler termina y la espera keep-alive
+        ocurre fuera del worker.
+        """
+        parking = hasattr(self.server, 'park_request')
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if parking and not self.request_buffered():
+                self.idle = True
+                return
+            self.handle_one_request()
     
-    def handle_chat(self):
-        """Chatbot responses"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        
+    def request_buffered(self):
+        """True si la siguiente petición (pipelining) ya está en el buffer o en el socket; nunca espera"""
+        self.connection.setblocking(False)
         try:
-            data = json.loads(post_data.decode())
-            question = data.get('question', '')
-            
-            # Simple chatbot logic
-            response_text = self.generate_chat_response(question)
-            
-            response = {
-                "response": response_text,
-                "timestamp": datetime.now().isoformat(),
-                "source": "backend_chatbot"
-            }
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response, indent=2).encode())
-            
-        except Exception as e:
-            self.send_error(400, f"Error processing chat: {e}")
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
     
-    def generate_chat_response(self, question):
-        """Genera respuestas del chatbot"""
-        question_lower = question.lower()
-        
-        if 'temperatura' in question_lower or 'temp' in question_lower:
-            return "La temperatura actual en CDMX es de 22°C con máxima de 25°C."
-        elif 'lluvia' in question_lower or 'llover' in question_lower:
-            return "No se esperan lluvias para hoy. Precipitación: 0 mm."
-        elif 'viento' in question_lower:
-            return "El viento actual es de 15 km/h del noreste."
-        elif 'humedad' in question_lower:
-            return "La humedad relativa es del 65%. "
-        else:
-            return f"Información sobre el clima en CDMX disponible. Pregunta sobre temperatura, lluvia, viento o humedad."
+    def do_GET(self):
+        # Parse URL
+        parsed_path = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed_path.query)
+        if parsed_path.path == STREAM_PATH:
+            self.start_event_stream()
+            return
+        self.send_admitted(parsed_path.path, lambda: dispatch_get(parsed_path.path, query, self.server, self.headers))
     
-    def handle_health(self):
-        """Health check endpoint"""
+    def start_event_stream(self):
+        """Abrir /api/weather/stream y ceder el socket al hilo de difusión SSE"""
+        detach = getattr(self.server, 'detach_request', None)
+        if not CONAGUA_AVAILABLE or detach is None:
+            self.close_connection = True
+            self.send_api_response(event_stream_unavailable_response())
+            return
+        sse_broadcaster = get_sse_broadcaster()
+        if not sse_broadcaster.has_capacity():
+            self.close_connection = True
+            self.send_api_response(json_response({'error': 'too_many_streams', 'message': 'Retry later'}, status=503))
+            return
+        
+        # Suscribir el difusor antes de calcular el preámbulo para no perder eventos intermedios
+        sse_broadcaster.start()
+        initial, last_id = event_stream_preamble(self.headers)
+        self.close_connection = True
         self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in event_stream_headers().items():
+            self.send_header(name, value)
+        # Sin Content-Length: el stream termina cuando se cierra la conexión
+        self.send_header('Connection', 'close')
         self.end_headers()
-        
-        health = {
-            "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
-            "uptime": "running",
-            "services": {
-                "api": "active",
-                "weather": "active",
-                "chat": "active"
-            },
-            "conagua_integration": CONAGUA_AVAILABLE
-        }
-        self.wfile.write(json.dumps(health, indent=2).encode())
+        detach(self.request)
+        sse_broadcaster.add(self.request, initial, last_id)
     
-    def handle_nvidia_api(self):
-        """NVIDIA FourCastNet integration"""
-        self.send_response(501)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
-        
-        response = {
-            "error": "NVIDIA API integration requires additional setup",
-            "message": "Configure NGC_API_KEY environment variable",
-            "fallback": "Using local weather data instead"
-        }
-        self.wfile.write(json.dumps(response, indent=2).encode())
-    
-    def handle_404(self):
-        self.send_error(404, "Endpoint not found")
-
-    def handle_timeseries(self, query):
-        """Endpoint para obtener series temporales de datos meteorológicos"""
-        if not TIMESERIES_AVAILABLE:
-            self.send_response(501)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            response = {
-                "error": "timeseries_not_available",
-                "message": "El módulo de series temporales no está disponible",
-                "status": "error"
-            }
-            self.wfile.write(json.dumps(response, indent=2, ensure_ascii=False).encode('utf-8'))
+    def do_POST(self):
+        if self.headers.get('Transfer-Encoding'):
+            # Sin parser chunked en este motor: leer Content-Length desincronizaría la conexión
+            self.send_error(411, "Content-Length required")
             return
-        
         try:
-            # Obtener parámetros
-            alcaldia = query.get('alcaldia', ['cdmx'])[0]  # Usar CDMX como valor por defecto
-            stats_only = query.get('stats', ['false'])[0].lower() == 'true'
-            hours = query.get('hours', [None])[0]
-            
-            # Convertir hours a entero si existe
-            if hours:
-                try:
-                    hours = int(hours)
-                except ValueError:
-                    hours = None
-            
-            # Obtener datos de series temporales
-            if stats_only:
-                # Si solo se solicitan estadísticas
-                from conagua_timeseries import timeseries_collector
-                stats_data = timeseries_collector.get_statistics()
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(json.dumps(stats_data, indent=2, ensure_ascii=False).encode('utf-8'))
-                return
-            
-            # Obtener datos para una alcaldía específica
-            from conagua_timeseries import get_timeseries
-            timeseries_data = get_timeseries(alcaldia)
-            
-            # Filtrar por horas si se especifica
-            if hours and hours > 0:
-                now = datetime.now()
-                filtered_series = []
-                
-                # Solo incluir puntos de las últimas X horas
-                for point in timeseries_data.get('series', []):
-                    point_time = datetime.fromisoformat(point['t'])
-                    if (now - point_time).total_seconds() <= hours * 3600:
-                        filtered_series.append(point)
-                
-                timeseries_data['series'] = filtered_series
-                timeseries_data['filtered_by_hours'] = hours
-            
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(timeseries_data, indent=2, ensure_ascii=False).encode('utf-8'))
-            
-        except Exception as e:
-            print(f"❌ Error obteniendo series temporales: {e}")
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            error_response = {
-                "error": "server_error",
-                "message": f"Error al procesar series temporales: {str(e)}",
-                "status": "error"
-            }
-            self.wfile.write(json.dumps(error_response, indent=2, ensure_ascii=False).encode('utf-8'))
-    
-    def handle_pronostico(self, query):
-        """Proxy ligero para /api/pronostico usando el servicio externo de ejemplo"""
-        # leer parámetros compatibles con el ejemplo
-        ides = query.get('ides', [None])[0]
-        idmun = query.get('idmun', [None])[0]
-        ndia = query.get('ndia', [None])[0]
-
-        # Validación básica: valores nulos o no numéricos -> 400
-        def is_int_like(x):
-            if x is None: return False
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.send_error(400, "Invalid Content-Length")
+            return
+        if content_length < 0:
+            # rfile.read(-1) esperaría el cierre de la conexión ocupando el worker
+            self.send_error(400, "Invalid Content-Length")
+            return
+        post_data = self.rfile.read(content_length)
+        path = urllib.parse.urlparse(self.path).path
+        self.send_admitted(path, lambda: dispatch_post(self.path, post_data, self.headers))
+    
+    def do_OPTIONS(self):
+        # Handle CORS preflight
+        self.send_api_response(options_response())
+    
+    def send_error(self, code, message=None, explain=None):
+        """Errores del framework (400, 414, 501...) como JSON con Content-Length"""
+        try:
+            short, _ = self.responses[code]
+        except KeyError:
+            short = 'Error'
+        self.log_error("code %d, message %s", code, message)
+        # El cuerpo de la petición pudo quedar sin leer: cerrar para no desincronizar la conexión
+        self.close_connection = True
+        error = {'error': short.lower().replace(' ', '_'), 'message': message or short}
+        self.send_api_response(json_response(error, status=code))
+    
+    def send_admitted(self, path, build):
+        """Construir la respuesta bajo control de admisión y enviarla"""
+        if path in RESERVED_PATHS:
+            self.send_api_response(build())
+            return
+        if not request_admission.acquire():
+            self.send_api_response(overloaded_response())
+            return
+        try:
+            response = build()
+        finally:
+            request_admission.release()
+        self.send_api_response(response)
+    
+    def send_api_response(self, response):
+        """Escribir un ApiResponse en el socket con framing HTTP/1.1"""
+        self.requests_on_connection += 1
+        self.send_response(response.status)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        streamed = is_streamed(response.body)
+        if streamed:
+            if self.request_version == 'HTTP/1.1':
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                # HTTP/1.0 no conoce chunked: el cierre de la conexión delimita el cuerpo
+                self.close_connection = True
+        elif response.status not in BODYLESS_STATUSES:
+            self.send_header('Content-Length', str(len(response.body)))
+        if self.close_connection or self.requests_on_connection >= self.max_requests_per_connection:
+            self.send_header('Connection', 'close')
+        else:
+            remaining = self.max_requests_per_connection - self.requests_on_connection
+            self.send_header('Connection', 'keep-alive')
+            self.send_header('Keep-Alive', f"timeout={self.timeout:.0f}, max={remaining}")
+        self.end_headers()
+        if self.command == 'HEAD' or response.status in BODYLESS_STATUSES:
+            return
+        if not streamed:
+            self.wfile.write(response.body)
+            return
+        chunks = chunked_frames(response.body) if self.request_version == 'HTTP/1.1' else response.body
+        for chunk in chunks:
+            self.wfile.write(chunk)
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """HTTPServer que atiende conexiones con un pool fijo de hilos.
+
+    El hilo principal solo acepta conexiones y las deja en una cola acotada;
+    los workers las procesan en paralelo. Si la cola está llena la conexión
+    se rechaza de inmediato con 503 en lugar de esperar indefinidamente.
+
+    Mientras no hay una petición recibida (conexión nueva o keep-alive entre
+    peticiones) la conexión no ocupa un worker: queda estacionada en un
+    selector y pasa a la cola cuando llegan datos, o se cierra al vencer
+    KEEPALIVE_TIMEOUT. Las rutas reservadas (sondas) tienen su propio worker
+    y su propia cola, así que nunca esperan detrás de la cola general.
+    """
+
+    daemon_threads = True
+    # Espera máxima a que llegue completa la línea de petición al clasificar una conexión
+    peek_timeout = 0.05
+
+    def __init__(self, server_address, handler_class, workers=8, queue_size=64, bind_and_activate=True):
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        # Backlog de listen() alineado con la cola de la aplicación
+        self.request_queue_size = self.queue_size
+        self._pending = queue.Queue(maxsize=self.queue_size)
+        # Carril de sondas: un worker dedicado que no compite con la cola general
+        self._reserved = queue.Queue(maxsize=self.queue_size)
+        self._threads = []
+        # Sockets cedidos a otro dueño (canal SSE); el worker no los cierra
+        self._detached = set()
+        # Conexiones keep-alive inactivas: socket -> (cliente, vencimiento). Con un timeout fijo el orden
+        # de inserción es el de vencimiento, así que los vencidos siempre están al principio
+        self.keepalive_timeout = handler_class.timeout
+        self.max_idle = config.KEEPALIVE_MAX_IDLE
+        self._parked = {}
+        self._served = {}
+        self._incoming = []
+        self._parking_lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._closing = False
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+        for i in range(self.workers):
+            worker = threading.Thread(target=self._worker_loop, args=(self._pending,), name=f"api-worker-{i}", daemon=True)
+            worker.start()
+            self._threads.append(worker)
+        self._probe_thread = threading.Thread(target=self._worker_loop, args=(self._reserved,), name="api-probe", daemon=True)
+        self._probe_thread.start()
+        self._parking_thread = threading.Thread(target=self._parking_loop, name="api-keepalive", daemon=True)
+        self._parking_thread.start()
+
+    def _worker_loop(self, lane):
+        while True:
+            item = lane.get()
+            if item is None:
+                break
+            request, client_address = item
+            handler = None
             try:
-                int(str(x))
-                return True
-            except:
+                handler = self.RequestHandlerClass(request, client_address, self)
+            except Exception:
+                self.handle_error(request, client_address)
+            parked = (handler is not None and handler.idle and request not in self._detached
+                      and self.park_request(request, client_address, handler.requests_on_connection))
+            if not parked:
+                self.shutdown_request(request)
+
+    def park_request(self, request, client_address, served):
+        """Dejar una conexión sin petición pendiente en el selector; False si se alcanzó KEEPALIVE_MAX_IDLE"""
+        with self._parking_lock:
+            if self._closing or len(self._parked) + len(self._incoming) >= self.max_idle:
                 return False
+            self._served[request] = served
+            self._incoming.append((request, client_address))
+        try:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            # El pipe lleno ya garantiza que el selector despierte
+            pass
+        return True
 
-        # If none provided, return 400
-        if not any([ides, idmun, ndia]):
-            self.send_response(400)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({'error': 'missing_parameters', 'message': 'Provide at least one of ides, idmun, ndia'}).encode('utf-8'))
-            return
+    def requests_served(self, request):
+        """Peticiones ya atendidas en una conexión que vuelve del estacionamiento (0 si es nueva)"""
+        with self._parking_lock:
+            return self._served.pop(request, 0)
+
+    def _parking_loop(self):
+        """Hilo del selector: despacha las conexiones con datos y cierra las que vencieron"""
+        while not self._closing:
+            now = time.monotonic()
+            timeout = None
+            if self._parked:
+                timeout = max(0, next(iter(self._parked.values()))[1] - now)
+            try:
+                events = self._selector.select(timeout)
+            except OSError:
+                if self._closing:
+                    break
+                raise
+            for key, _ in events:
+                if key.fileobj is self._wakeup_r:
+                    try:
+                        while self._wakeup_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                request = key.fileobj
+                self._selector.unregister(request)
+                client_address, _ = self._parked.pop(request)
+                self.dispatch_request(request, client_address)
+            with self._parking_lock:
+                incoming, self._incoming = self._incoming, []
+            deadline = time.monotonic() + self.keepalive_timeout
+            for request, client_address in incoming:
+                try:
+                    self._selector.register(request, selectors.EVENT_READ)
+                except (ValueError, OSError):
+                    self.shutdown_request(request)
+                    continue
+                self._parked[request] = (client_address, deadline)
+            now = time.monotonic()
+            while self._parked:
+                request, (client_address, expires) = next(iter(self._parked.items()))
+                if expires > now:
+                    break
+                del self._parked[request]
+                self._selector.unregister(request)
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        """Conexión nueva: esperar su primera petición en el selector sin ocupar un worker"""
+        if not self.park_request(request, client_address, 0):
+            self.dispatch_request(request, client_address)
 
-        params = {}
-        if ides and is_int_like(ides): params['ides'] = int(str(ides))
-        if idmun and is_int_like(idmun): params['idmun'] = int(str(idmun))
-        if ndia and is_int_like(ndia): params['ndia'] = int(str(ndia))
-
-        # Cache key
-        cache_key = f"p:{params.get('ides')}_{params.get('idmun')}_{params.get('ndia')}"
-        cached = _cache_get(cache_key)
-        if cached is not None:
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(cached, indent=2, ensure_ascii=False).encode('utf-8'))
+    def dispatch_request(self, request, client_address):
+        """Encolar una conexión con petición recibida: sondas al worker reservado, el resto al pool"""
+        path = self._peek_path(request, self.peek_timeout)
+        lane = self._reserved if path in RESERVED_PATHS else self._pending
+        try:
+            lane.put_nowait((request, client_address))
+        except queue.Full:
+            self.reject_request(request, client_address, path)
+
+    def reject_request(self, request, client_address, path):
+        """Responder sin ocupar un worker cuando la cola está llena: 503, salvo las rutas reservadas.
+
+        Corre en el hilo del selector: el socket queda no bloqueante y nada
+        aquí espera al cliente.
+        """
+        request.setblocking(False)
+        if path in RESERVED_PATHS:
+            response = dispatch_get(path, {}, self)
+        else:
+            response = overloaded_response()
+            print(f"⚠️ Conexión rechazada de {client_address[0]}: cola llena ({self.queue_size})")
+        head = [f"HTTP/1.0 {response.status} {self.RequestHandlerClass.responses[response.status][0]}"]
+        head.extend(f"{name}: {value}" for name, value in response.headers.items())
+        head.append(f"Content-Length: {len(response.body)}")
+        head.append("Connection: close")
+        try:
+            request.sendall(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + response.body)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    @staticmethod
+    def _peek_path(request, wait):
+        """Ruta de un GET sin consumir el socket.
+
+        Espera a lo sumo `wait` segundos a que llegue la línea de petición
+        completa; None si no llegó a tiempo o no es un GET.
+        """
+        deadline = time.monotonic() + wait
+        data = b''
+        try:
+            while b'\r\n' not in data and len(data) < 512:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if data:
+                    # Línea incompleta: recv con MSG_PEEK regresaría de inmediato con los mismos bytes
+                    time.sleep(min(0.005, remaining))
+                request.settimeout(remaining)
+                data = request.recv(512, socket.MSG_PEEK)
+                if not data:
+                    return None
+        except OSError:
+            return None
+        finally:
+            request.settimeout(None)
+        line = data.split(b'\r\n', 1)[0].split()
+        if len(line) < 2 or line[0] != b'GET':
+            return None
+        return urllib.parse.urlsplit(line[1].decode('latin-1')).path
+
+    def detach_request(self, request):
+        """Marcar un socket como cedido: al terminar el handler no se cierra"""
+        self._detached.add(request)
+
+    def shutdown_request(self, request):
+        if request in self._detached:
+            self._detached.discard(request)
             return
+        with self._parking_lock:
+            self._served.pop(request, None)
+        super().shutdown_request(request)
 
+    def get_pool_status(self):
+        """Estado del pool de workers"""
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queued': self._pending.qsize(),
+            'reserved_queued': self._reserved.qsize(),
+            'idle_connections': len(self._parked),
+            'keepalive_timeout': self.keepalive_timeout,
+            'event_streams': _sse_broadcaster.get_stats()['clients'] if _sse_broadcaster_pid == os.getpid() else 0,
+            'admission': request_admission.get_stats()
+        }
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._pending.put(None)
+        self._reserved.put(None)
+        with self._parking_lock:
+            self._closing = True
         try:
-            url = BASE_URL + RESOURCE
-            headers = {'User-Agent': 'Hydredelback/1.0 (+https://github.com/Edbeto13/Hydredelback)', 'Accept': 'application/json'}
-            r = requests.get(url, params=params, timeout=10, headers=headers)
-            r.raise_for_status()
-            data = r.json()
-
-            # Normalizar respuesta (matching example fields)
-            fc = {
-                'ides': to_int(data.get('ides')),
-                'idmun': to_int(data.get('idmun')),
-                'nes': data.get('nes'),
-                'nmun': data.get('nmun'),
-                'dloc': data.get('dloc'),
-                'dloc_iso': parse_dloc(data.get('dloc')),
-                'ndia': to_int(data.get('ndia')),
-                'tmax': to_float(data.get('tmax')),
-                'tmin': to_float(data.get('tmin')),
-                'desciel': data.get('desciel'),
-                'probprec': to_float(data.get('probprec')),
-                'prec': to_float(data.get('prec')),
-                'velvien': to_float(data.get('velvien')),
-                'dirvienc': data.get('dirvienc'),
-                'dirvieng': to_float(data.get('dirvieng')),
-                'cc': to_float(data.get('cc')),
-                'lat': to_float(data.get('lat')),
-                'lon': to_float(data.get('lon')),
-                'dh': to_int(data.get('dh')),
-                'raf': to_float(data.get('raf')),
-                'raw': data
-            }
-            # Store in cache
-            _cache_set(cache_key, fc)
-
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(fc, indent=2, ensure_ascii=False).encode('utf-8'))
-
-        except Exception as e:
-            print(f"\u274c Error en proxy pronostico: {e}")
-            self.send_response(502)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            err = {'error': 'proxy_failed', 'message': str(e)}
-            self.wfile.write(json.dumps(err, indent=2).encode('utf-8'))
-
-def run_server(port=8000):
-    """Ejecutar servidor con integración Conagua"""
-    # Inicializar recolección automática de Conagua si está disponible
-    if CONAGUA_AVAILABLE:
+            self._wakeup_w.send(b'\0')
+        except OSError:
+            pass
+        self._parking_thread.join(timeout=1)
+        for request in list(self._parked):
+            self.shutdown_request(request)
+        self._parked.clear()
+        self._selector.close()
+        self._wakeup_r.close()
+        self._wakeup_w.close()
+
+def create_server(host, port, mode='threaded', workers=8, queue_size=64, reuse_port=False):
+    """Crear el servidor HTTP según el modo de concurrencia configurado"""
+    if mode == 'single':
+        server = HTTPServer((host, port), ClimaCDMXHandler, bind_and_activate=False)
+    elif mode == 'threaded':
+        server = WorkerPoolHTTPServer((host, port), ClimaCDMXHandler, workers=workers,
+                                      queue_size=queue_size, bind_and_activate=False)
+    else:
+        raise ValueError(f"SERVER_MODE desconocido: {mode}")
+    
+    try:
+        if reuse_port:
+            # Varios procesos comparten el puerto y el kernel reparte las conexiones
+            server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.server_bind()
+        server.server_activate()
+    except Exception:
+        server.server_close()
+        raise
+    return server
+
+def start_collection(role='leader'):
+    """Iniciar la recolección Conagua de este proceso (líder) o seguir el snapshot (seguidor)"""
+    if config.FORECAST_INDEX_ENABLED:
+        if role == 'follower':
+            forecast_index.follow()
+        else:
+            forecast_index.start()
+    if not CONAGUA_AVAILABLE:
+        print("⚠️ Funcionando en modo fallback sin integración Conagua")
+    elif role == 'follower':
+        follow_weather_snapshot(config.SNAPSHOT_POLL_SECONDS)
+    else:
         print("🔄 Iniciando recolección automática de datos Conagua...")
         start_weather_collection()
         print("✅ Sistema de recolección Conagua iniciado (actualización cada 75 minutos)")
+
+def stop_collection():
+    """Detener el planificador o el seguidor de este proceso sin esperar a su siguiente plazo"""
+    forecast_index.stop()
+    if CONAGUA_AVAILABLE:
+        stop_weather_collection()
+
+def serve(host, port, mode, reuse_port=False):
+    """Atender peticiones en este proceso hasta Ctrl+C"""
+    if mode == 'async':
+        # Importación diferida: async_server reutiliza las rutas de este módulo
+        from async_server import run_async_server
+        print(f"🧵 Modo async: event loop único con conexiones keep-alive")
+        run_async_server(host, port, reuse_port=reuse_port)
+        return
+    
+    server = create_server(host, port, mode, config.SERVER_WORKERS, config.SERVER_ACCEPT_QUEUE, reuse_port)
+    if mode == 'threaded':
+        print(f"🧵 Modo threaded: {server.workers} workers, cola de {server.queue_size} conexiones")
     else:
-        print("⚠️ Funcionando en modo fallback sin integración Conagua")
+        print(f"🧵 Modo single: una petición a la vez")
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Servidor detenido")
+    finally:
+        server.server_close()
+
+def _run_worker_process(index, host, port, mode):
+    # Ctrl+C llega a todo el grupo de procesos; el padre coordina el cierre
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    role = 'leader' if index == 0 else 'follower'
+    print(f"👷 Worker {index} (pid {os.getpid()}) iniciado como {role}")
+    start_collection(role)
+    try:
+        serve(host, port, mode, reuse_port=True)
+    finally:
+        stop_collection()
+
+def run_prefork(host, port, mode, processes):
+    """Lanzar N procesos worker que comparten el puerto con SO_REUSEPORT.
+
+    El worker 0 es el líder: es el único que consulta a SMN y escribe el
+    snapshot en disco. Los demás lo recargan cuando cambia. Si un worker
+    termina inesperadamente se relanza con el mismo índice.
+    """
+    children = {}
+    stopping = False
+    
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker_process(index, host, port, mode)
+            finally:
+                os._exit(0)
+        children[pid] = index
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(processes):
+        spawn(index)
+    print(f"🧩 Pre-fork: {processes} procesos en el puerto {port} (pid padre {os.getpid()})")
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"⚠️ Worker {index} (pid {pid}) terminó con estado {status}, relanzando...")
+            spawn(index)
+    print("\n🛑 Servidor detenido")
+
+def run_server(port=None, host=None, mode=None, processes=None):
+    """Ejecutar servidor con integración Conagua"""
+    port = port or config.PORT
+    host = host or config.HOST
+    mode = mode or config.SERVER_MODE
+    processes = processes or config.SERVER_PROCESSES
     
-    server = HTTPServer(('0.0.0.0', port), ClimaCDMXHandler)
     print(f"🌤️ Servidor Clima CDMX iniciado en puerto {port}")
     print(f"📡 Endpoints disponibles:")
     print(f"   http://localhost:{port}/api/")
@@ -504,11 +1456,20 @@ def run_server(port=8000):
     else:
         print(f"📊 Integración Conagua: INACTIVA (usando datos simulados)")
     
+    if processes > 1:
+        if not hasattr(os, 'fork') or not hasattr(socket, 'SO_REUSEPORT'):
+            print("⚠️ Pre-fork requiere fork() y SO_REUSEPORT; usando un solo proceso")
+        else:
+            run_prefork(host, port, mode, processes)
+            return
+    
+    start_collection()
     try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\n🛑 Servidor detenido")
-        server.shutdown()
+        serve(host, port, mode)
+    finally:
+        stop_collection()
 
 if __name__ == "__main__":
+    # Registrar este script como 'api_server' para que async_server no lo importe dos veces
+    sys.modules.setdefault('api_server', sys.modules[__name__])
     run_server()
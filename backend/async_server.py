@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Motor HTTP asyncio para el API de Clima CDMX
+Sirve las mismas rutas que ClimaCDMXHandler desde un solo event loop, con
+conexiones keep-alive. Las consultas a SMN del proxy son coroutines sobre un
+pool keep-alive propio (AsyncUpstreamClient), así que no ocupan hilos; el
+trabajo bloqueante local (rutas que leen disco o SQLite, cuerpos generados en
+streaming) corre en un executor de SERVER_WORKERS hilos.
+Author: EdbETO Solutions Team
+Repositorio: https://github.com/Edbeto13/Hydredelback
+Licencia: MIT
+"""
+
+import asyncio
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from typing import Any, Dict, Iterable, Optional, Set
+
+from requests.structures import CaseInsensitiveDict
+
+from config import config
+from event_stream import HEARTBEAT_FRAME, weather_event_hub
+from json_stream import chunked_frames, is_streamed
+from admission import AsyncAdmissionController
+from singleflight import AsyncSingleFlight
+from upstream_client import AsyncUpstreamClient
+from api_server import (
+    BODYLESS_STATUSES, CONAGUA_AVAILABLE, PRONOSTICO_HEADERS, PRONOSTICO_TIMEOUT, PRONOSTICO_URL, RESERVED_PATHS, STREAM_PATH,
+    ApiResponse, compress_response, dispatch_get, dispatch_post,
+    event_stream_headers, event_stream_preamble, event_stream_unavailable_response, indexed_pronostico_response, json_response,
+    normalize_pronostico, options_response, overloaded_response, parse_pronostico_query, pronostico_cache,
+    pronostico_cached_error_response, pronostico_cached_response, pronostico_error_response
+)
+
+# Límite de bytes para la línea de petición + headers
+MAX_HEADER_BYTES = 64 * 1024
+
+# Tamaño máximo de un cuerpo con Transfer-Encoding: chunked (no hay Content-Length que lo anuncie)
+MAX_CHUNKED_BODY_BYTES = 1024 * 1024
+
+# Eventos pendientes por conexión SSE antes de considerarla un cliente lento
+STREAM_QUEUE_SIZE = 16
+
+class BadRequest(Exception):
+    """Petición HTTP mal formada"""
+
+    status = 400
+
+class UnsupportedTransferEncoding(BadRequest):
+    """Transfer-Encoding distinto de chunked"""
+
+    status = 501
+
+class HttpRequest:
+    """Petición HTTP ya parseada"""
+
+    __slots__ = ('method', 'target', 'version', 'headers', 'body')
+
+    def __init__(self, method: str, target: str, version: str, headers: CaseInsensitiveDict, body: bytes):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        """HTTP/1.1 es persistente por defecto; HTTP/1.0 solo si el cliente lo pide"""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+def _parse_head(head: bytes):
+    """Separar la primera línea y los headers (sin distinguir mayúsculas) de un bloque HTTP"""
+    lines = head.decode('latin-1').split('\r\n')
+    headers: CaseInsensitiveDict = CaseInsensitiveDict()
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise BadRequest(f"Header inválido: {line[:40]}")
+        headers[name.strip()] = value.strip()
+    return lines[0], headers
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[HttpRequest]:
+    """Leer una petición completa; None si el cliente cerró la conexión"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise BadRequest("Headers incompletos")
+    except asyncio.LimitOverrunError:
+        raise BadRequest("Headers demasiado grandes")
+
+    request_line, headers = _parse_head(head.lstrip(b'\r\n'))
+    parts = request_line.split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise BadRequest(f"Línea de petición inválida: {request_line[:80]}")
+    method, target, version = parts
+
+    body = b''
+    transfer_encoding = headers.get('transfer-encoding')
+    length = headers.get('content-length')
+    if transfer_encoding:
+        # Transfer-Encoding tiene prioridad sobre Content-Length (RFC 9112)
+        if transfer_encoding.split(',')[-1].strip().lower() != 'chunked':
+            raise UnsupportedTransferEncoding(f"Transfer-Encoding no soportado: {transfer_encoding[:40]}")
+        body = await read_chunked_body(reader)
+    elif length:
+        if not length.isdigit():
+            raise BadRequest("Content-Length inválido")
+        body = await reader.readexactly(int(length))
+    return HttpRequest(method, target, version, headers, body)
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        return await reader.readuntil(b'\r\n')
+    except asyncio.LimitOverrunError:
+        raise BadRequest("Línea de chunk demasiado larga")
+
+async def read_chunked_body(reader: asyncio.StreamReader) -> bytes:
+    """Cuerpo con Transfer-Encoding: chunked (se descartan extensiones y trailers)"""
+    body = bytearray()
+    while True:
+        size_field = (await _read_line(reader)).split(b';', 1)[0].strip()
+        try:
+            size = int(size_field, 16)
+        except ValueError:
+            raise BadRequest("Tamaño de chunk inválido")
+        if size < 0:
+            raise BadRequest("Tamaño de chunk inválido")
+        if size == 0:
+            break
+        if len(body) + size > MAX_CHUNKED_BODY_BYTES:
+            raise BadRequest("Cuerpo demasiado grande")
+        body += await reader.readexactly(size)
+        if await reader.readexactly(2) != b'\r\n':
+            raise BadRequest("Chunk mal delimitado")
+    while await _read_line(reader) != b'\r\n':
+        pass
+    return bytes(body)
+
+# Revalidaciones en segundo plano (referencia fuerte para que el GC no cancele las Tasks)
+_background_tasks: Set[asyncio.Future] = set()
+
+async def refresh_pronostico_async(cache_key, params, client: AsyncUpstreamClient):
+    """Consultar SMN sin bloquear el loop y guardar en caché; retorna la CacheEntry"""
+    entry = pronostico_cache.get_fresh(cache_key)
+    if entry is not None:
+        return entry
+    try:
+        # Misma política de reintentos que el cliente del colector, sin ocupar un hilo por consulta
+        data = await client.get_json(PRONOSTICO_URL, params=params, headers=PRONOSTICO_HEADERS, timeout=PRONOSTICO_TIMEOUT)
+        return pronostico_cache.set(cache_key, normalize_pronostico(data))
+    except Exception as e:
+        pronostico_cache.set_error(cache_key, str(e))
+        raise
+
+async def _refresh_shared(cache_key, params, flight: Optional[AsyncSingleFlight], client: AsyncUpstreamClient):
+    if flight is None:
+        return await refresh_pronostico_async(cache_key, params, client)
+    return await flight.do(cache_key, lambda: refresh_pronostico_async(cache_key, params, client))
+
+async def revalidate_pronostico_async(cache_key, params, flight: Optional[AsyncSingleFlight],
+                                      client: AsyncUpstreamClient) -> None:
+    try:
+        await _refresh_shared(cache_key, params, flight, client)
+    except Exception as e:
+        print(f"⚠️ Revalidación de pronóstico fallida ({cache_key}): {e}")
+    finally:
+        pronostico_cache.end_revalidate(cache_key)
+
+async def pronostico_response_async(query, client: AsyncUpstreamClient, request_headers=None,
+                                    flight: Optional[AsyncSingleFlight] = None) -> ApiResponse:
+    """Versión coroutine de pronostico_response: la consulta a SMN no bloquea el loop"""
+    params, cache_key, error = parse_pronostico_query(query)
+    if error is not None:
+        return error
+
+    # Búsqueda en memoria: no requiere hilo
+    indexed = indexed_pronostico_response(params, cache_key, request_headers)
+    if indexed is not None:
+        return indexed
+
+    entry = pronostico_cache.lookup(cache_key)
+    if entry is not None:
+        if entry.error is not None:
+            return pronostico_cached_error_response(entry)
+        if entry.is_stale() and pronostico_cache.begin_revalidate(cache_key):
+            task = asyncio.ensure_future(revalidate_pronostico_async(cache_key, params, flight, client))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return pronostico_cached_response(entry, request_headers, cache_key)
+
+    try:
+        entry = await _refresh_shared(cache_key, params, flight, client)
+        return pronostico_cached_response(entry, request_headers, cache_key)
+    except Exception as e:
+        return pronostico_error_response(e)
+
+class AsyncClimaServer:
+    """Servidor HTTP/1.1 sobre asyncio.start_server con las rutas de api_server"""
+
+    def __init__(self, host: str, port: int, idle_timeout: float = config.KEEPALIVE_TIMEOUT,
+                 max_requests: int = config.KEEPALIVE_MAX_REQUESTS, reuse_port: bool = False):
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.open_connections = 0
+        self.in_flight = 0
+        self.requests_served = 0
+        self.heartbeat = config.SSE_HEARTBEAT_SECONDS
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._streams: Set[asyncio.Queue] = set()
+        # Consultas a SMN en curso por clave de caché (compartidas entre conexiones)
+        self.pronostico_flight = AsyncSingleFlight()
+        self.admission = AsyncAdmissionController(
+            config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE, config.ADMISSION_QUEUE_TIMEOUT
+        )
+        # Consultas del proxy a SMN: coroutines sobre un pool keep-alive de este loop (sin hilos)
+        self.upstream = AsyncUpstreamClient(
+            pool_maxsize=config.UPSTREAM_POOL_MAXSIZE, retries=config.UPSTREAM_RETRIES, backoff=config.UPSTREAM_BACKOFF
+        )
+        # Hilos para el trabajo bloqueante local (SQLite, disco, cuerpos en streaming); no incluye la red
+        self.workers = max(1, config.SERVER_WORKERS)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='async-dispatch')
+
+    async def start(self) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES,
+            reuse_address=True, reuse_port=self.reuse_port or None
+        )
+        return self._server
+
+    async def serve_forever(self) -> None:
+        server = await self.start()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.upstream.close()
+
+    async def run_blocking(self, func, *args):
+        """Ejecutar func(*args) en el executor del servidor"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def get_pool_status(self) -> Dict[str, Any]:
+        """Estado del motor (mismo contrato que WorkerPoolHTTPServer.get_pool_status)"""
+        return {
+            'engine': 'asyncio',
+            'open_connections': self.open_connections,
+            'in_flight': self.in_flight,
+            'requests_served': self.requests_served,
+            'event_streams': len(self._streams),
+            'admission': self.admission.get_stats(),
+            'executor_workers': self.workers,
+            'upstream': self.upstream.get_stats(),
+            'idle_timeout_seconds': self.idle_timeout,
+            'max_requests_per_connection': self.max_requests
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.open_connections += 1
+        served = 0
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), self.idle_timeout)
+                except BadRequest as e:
+                    error = 'bad_request' if e.status == 400 else 'not_implemented'
+                    response = json_response({'error': error, 'message': str(e)}, status=e.status)
+                    await self.write_response(writer, response, keep_alive=False)
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                if request.method == 'GET' and urllib.parse.urlsplit(request.target).path == STREAM_PATH:
+                    await self.stream_events(request, writer)
+                    break
+
+                served += 1
+                keep_alive = request.keep_alive and served < self.max_requests
+                self.in_flight += 1
+                try:
+                    response = await self.route(request)
+                except Exception as e:
+                    print(f"❌ Error atendiendo {request.method} {request.target}: {e}")
+                    response = json_response({'error': 'server_error', 'message': str(e)}, status=500)
+                finally:
+                    self.in_flight -= 1
+                    self.requests_served += 1
+
+                chunked = request.version == 'HTTP/1.1'
+                if is_streamed(response.body) and not chunked:
+                    # HTTP/1.0 no conoce chunked: el cierre de la conexión delimita el cuerpo
+                    keep_alive = False
+                await self.write_response(writer, response, keep_alive, self.max_requests - served, chunked)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _deliver_event(self, event_id: int, frame: bytes) -> None:
+        """Suscriptor del hub (hilo del colector): un solo salto al event loop por evento"""
+        self._loop.call_soon_threadsafe(self._fanout, event_id, frame)
+
+    def _fanout(self, event_id: int, frame: bytes) -> None:
+        for stream in list(self._streams):
+            try:
+                stream.put_nowait((event_id, frame))
+            except asyncio.QueueFull:
+                # Cliente lento: se cierra y el navegador reanuda con Last-Event-ID
+                while not stream.empty():
+                    stream.get_nowait()
+                stream.put_nowait(None)
+
+    async def stream_events(self, request: HttpRequest, writer: asyncio.StreamWriter) -> None:
+        """Mantener abierta una conexión /api/weather/stream sin ocupar hilos"""
+        if not CONAGUA_AVAILABLE:
+            await self.write_response(writer, event_stream_unavailable_response(), keep_alive=False)
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            weather_event_hub.subscribe(self._deliver_event)
+
+        stream: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self._streams.add(stream)
+        try:
+            # El snapshot puede disparar una actualización síncrona del colector
+            initial, last_id = await self.run_blocking(event_stream_preamble, request.headers)
+            lines = ["HTTP/1.1 200 OK", f"Date: {formatdate(usegmt=True)}", "Server: ClimaCDMX-async"]
+            lines.extend(f"{name}: {value}" for name, value in event_stream_headers().items())
+            lines.append("Connection: close")
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + initial)
+            await writer.drain()
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(stream.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    item = (None, HEARTBEAT_FRAME)
+                if item is None:
+                    break
+                event_id, frame = item
+                if event_id is not None:
+                    # El evento pudo llegar ya en el preámbulo
+                    if last_id is not None and event_id <= last_id:
+                        continue
+                    last_id = event_id
+                writer.write(frame)
+                await asyncio.wait_for(writer.drain(), self.heartbeat)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._streams.discard(stream)
+
+    async def route(self, request: HttpRequest) -> ApiResponse:
+        parsed = urllib.parse.urlparse(request.target)
+        path = parsed.path
+        if request.method == 'GET':
+            query = urllib.parse.parse_qs(parsed.query)
+            if path == '/api/pronostico':
+                # Sin hilos: la admisión no lo limita; el caché y el single-flight acotan las consultas a SMN
+                return compress_response(
+                    await pronostico_response_async(query, self.upstream, request.headers, self.pronostico_flight),
+                    request.headers
+                )
+            # Las rutas síncronas pueden leer SQLite, el snapshot o generar cuerpos grandes
+            return await self.admitted(path, dispatch_get, path, query, self, request.headers)
+        if request.method == 'POST':
+            return await self.admitted(path, dispatch_post, path, request.body, request.headers)
+        if request.method == 'OPTIONS':
+            return options_response()
+        return json_response({'error': 'not_implemented', 'message': f"Unsupported method ({request.method})"}, status=501)
+
+    async def admitted(self, path: str, func, *args) -> ApiResponse:
+        """run_blocking con control de admisión: el executor es el recurso que se protege"""
+        if path in RESERVED_PATHS:
+            return await self.run_blocking(func, *args)
+        if not await self.admission.acquire():
+            return overloaded_response()
+        try:
+            return await self.run_blocking(func, *args)
+        finally:
+            self.admission.release()
+
+    async def write_response(self, writer: asyncio.StreamWriter, response: ApiResponse,
+                             keep_alive: bool, remaining: int = 0, chunked: bool = True) -> None:
+        lines = [
+            f"HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}",
+            f"Date: {formatdate(usegmt=True)}",
+            "Server: ClimaCDMX-async"
+        ]
+        lines.extend(f"{name}: {value}" for name, value in response.headers.items())
+        streamed = is_streamed(response.body)
+        if streamed:
+            if chunked:
+                lines.append("Transfer-Encoding: chunked")
+        elif response.status not in BODYLESS_STATUSES:
+            lines.append(f"Content-Length: {len(response.body)}")
+        if keep_alive:
+            lines.append("Connection: keep-alive")
+            lines.append(f"Keep-Alive: timeout={self.idle_timeout:.0f}, max={remaining}")
+        else:
+            lines.append("Connection: close")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+        if not streamed:
+            writer.write(head + response.body)
+            await writer.drain()
+            return
+        writer.write(head)
+        chunks = chunked_frames(response.body) if chunked else response.body
+        # El generador puede leer SQLite (conexión por hilo): se recorre completo en un solo hilo del executor
+        await self.run_blocking(self._pump, chunks, writer, asyncio.get_running_loop())
+
+    def _pump(self, chunks: Iterable[bytes], writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop) -> None:
+        """Hilo del executor: generar cada fragmento y esperar a que el loop lo escriba (contrapresión)"""
+        try:
+            for chunk in chunks:
+                asyncio.run_coroutine_threadsafe(self._write_chunk(writer, chunk), loop).result()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter, chunk: bytes) -> None:
+        writer.write(chunk)
+        await writer.drain()
+
+def run_async_server(host: str, port: int, reuse_port: bool = False) -> None:
+    """Ejecutar el motor asyncio hasta Ctrl+C"""
+    server = AsyncClimaServer(host, port, reuse_port=reuse_port)
+    print(f"⚡ Motor asyncio escuchando en {host}:{port} (keep-alive {server.idle_timeout}s)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n🛑 Servidor detenido")
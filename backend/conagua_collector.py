@@ -11,19 +11,109 @@ import os
 import time
 import threading
 import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
 from datetime import datetime, timedelta
 from urllib.parse import urlencode
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Set, Tuple
+
+from config import config
+from refresh_scheduler import RefreshScheduler, next_publication_time, parse_publication_times
+from smn_ingest import READ_SIZE, ingest_records, record_filter
+from spatial_index import StationLocator
+from sqlite_store import SQLiteStore, get_store
+from upstream_client import upstream_client
+from weather_models import ForecastDay, Observation, format_number, to_float, to_int
+
+# Fuente con la que se marcan los datos generados cuando SMN no responde
+FALLBACK_SOURCE = 'Fallback Data'
+
+# Motivos del planificador que fuerzan un ciclo completo aunque el intervalo no haya vencido
+FULL_REFRESH_REASONS = ('publication', 'manual')
+
+# Campos numéricos que se promedian y de texto que se toman por mayoría al agregar municipios
+AGGREGATE_MEAN_FIELDS = ('tmax', 'tmin', 'cc', 'velvien', 'prec', 'probprec', 'raf')
+AGGREGATE_MODE_FIELDS = ('desciel', 'dirvienc', 'dirvieng')
+
+def _fsync_directory(path: str) -> None:
+    """Sincronizar el directorio para que el rename del snapshot sobreviva a un corte de energía"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        # Windows no permite abrir directorios; ahí os.replace ya es suficiente
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Fecha ISO persistida (snapshot, journal o meta de SQLite); None si falta o es ilegible"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
 
 class ConaguaDataCollector:
     """Recolector automático de datos meteorológicos de Conagua/SMN"""
     
-    def __init__(self, cache_file: str = 'weather_cache.json', update_interval: int = 4500):  # 75 minutos = 4500 segundos
+    def __init__(self, cache_file: str = 'weather_cache.json', update_interval: int = 4500,  # 75 minutos = 4500 segundos
+                 max_state_fetches: int = config.COLLECTOR_MAX_STATE_FETCHES,
+                 refresh_deadline: float = config.COLLECTOR_REFRESH_DEADLINE,
+                 store: Optional[SQLiteStore] = None):
         self.cache_file = cache_file
+        # Con store (STORAGE_BACKEND=sqlite) las estaciones viven en SQLite en lugar del snapshot + journal JSON
+        self.store = store
         self.update_interval = update_interval  # 1 hora 15 minutos
-        self.cache_data: Dict[str, Any] = {}
+        # Descargas de estado simultáneas por ciclo y tiempo máximo del ciclo completo
+        self.max_state_fetches = max(1, max_state_fetches)
+        self.refresh_deadline = refresh_deadline
+        # Resumen del último ciclo: duración, consultas a SMN y latencia por estado
+        self.last_refresh: Optional[Dict[str, Any]] = None
+        # Frescura por estación: status (ok/failed/timeout), updated_at, failures y retry_at (epoch)
+        self.station_state: Dict[str, Dict[str, Any]] = {}
+        # Backoff exponencial de los reintentos de estaciones fallidas
+        self.station_retry_base = config.STATION_RETRY_BASE_SECONDS
+        self.station_retry_max = config.STATION_RETRY_MAX_SECONDS
+        self.cache_data: Dict[str, Observation] = {}
         self.last_update: Optional[datetime] = None
+        # Último cambio publicado de cache_data o station_state, también en reintentos parciales
+        # (Last-Modified); last_update solo marca los ciclos completos (intervalo de 75 minutos y max-age)
+        self.data_modified: Optional[datetime] = None
         self.is_running: bool = False
+        # Se incrementa cada vez que cambia cache_data (consumidores invalidan sus cachés derivados)
+        self.data_version: int = 0
+        # En modo pre-fork solo el proceso líder consulta a SMN; los seguidores leen su snapshot
+        self.is_follower: bool = False
+        # Firma (mtime del snapshot, tamaño del journal) de lo último leído de disco
+        self._snapshot_signature: Optional[Tuple[Optional[int], int]] = None
+        # Secuencia de la última entrada del journal y entradas desde el último snapshot
+        self._journal_seq: int = 0
+        self._journal_entries: int = 0
+        self.journal_compact_entries = config.COLLECTOR_JOURNAL_MAX_ENTRIES
+        # Serializa las actualizaciones cuando varias peticiones concurrentes detectan datos vencidos
+        self._update_lock = threading.RLock()
+        # Actualización en segundo plano disparada por una lectura vencida (a lo sumo una a la vez)
+        self._refresh_guard = threading.Lock()
+        self._refresh_scheduled = False
+        self._cycle_running = False
+        # Callbacks (data_version, alcaldías cambiadas) al terminar cada actualización o recarga
+        self._update_listeners: List[Callable[[int, List[str]], None]] = []
+        # Estadísticas de la última ingesta por estado (bytes recibidos, registros leídos y conservados)
+        self.ingest_stats: Dict[str, Dict[str, Any]] = {}
+        # Callbacks (ides, registros) por cada estado descargado: otros consumidores reutilizan la misma ingesta
+        self._ingest_listeners: List[Callable[[str, List[Dict[str, Any]]], None]] = []
+        # Plazos exactos de actualización (fin del intervalo, publicación de SMN, reintentos) en lugar de sondear
+        self.publication_times = parse_publication_times(config.SMN_PUBLICATION_TIMES)
+        self.publication_delay = config.SMN_PUBLICATION_DELAY_SECONDS
+        self.scheduler = RefreshScheduler(self._scheduled_refresh, self.next_refresh_deadline,
+                                          jitter=config.REFRESH_JITTER_SECONDS, name='conagua-scheduler')
+        # Despierta al hilo seguidor en cuanto se detiene el colector
+        self._stop_event = threading.Event()
         
         # URLs de servicios meteorológicos mexicanos
         self.conagua_api_base = "https://smn.conagua.gob.mx/tools/GUI/webservices/?method=1"
@@ -47,42 +137,295 @@ class ConaguaDataCollector:
             'venustiano-carranza': {'id': '9', 'idmun': '017', 'name': 'Venustiano Carranza', 'lat': 19.4284, 'lon': -99.1073},
             'xochimilco': {'id': '9', 'idmun': '013', 'name': 'Xochimilco', 'lat': 19.2577, 'lon': -99.1037}
         }
+        # Índice espacial de las alcaldías (sin el promedio 'cdmx'), construido una sola vez
+        self.locator = StationLocator({key: info for key, info in self.cdmx_stations.items() if 'idmun' in info})
         
         self.load_cache()
         print(f"🌤️ ConaguaDataCollector inicializado")
         print(f"📊 Intervalo de actualización: {self.update_interval/60:.0f} minutos")
     
+    @property
+    def data_seq(self) -> int:
+        """Secuencia persistida del último cambio (journal/SQLite): crece con cada estación escrita y cada snapshot,
+        también en reintentos parciales, y es la misma en el líder y en los seguidores que recargan su snapshot"""
+        return self._journal_seq
+    
+    @property
+    def journal_file(self) -> str:
+        """Journal append-only de actualizaciones por estación entre snapshots"""
+        return f"{self.cache_file}.journal"
+    
     def load_cache(self) -> None:
-        """Cargar datos de caché desde archivo"""
+        """Cargar el último snapshot y reaplicar el journal"""
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_content = json.load(f)
-                    self.cache_data = cache_content.get('data', {})
-                    last_update_str = cache_content.get('last_update')
-                    if last_update_str:
-                        self.last_update = datetime.fromisoformat(last_update_str)
-                    print(f"✅ Caché cargado: {len(self.cache_data)} alcaldías")
+            if self.store is not None:
+                self._migrate_to_store()
+                (self.cache_data, self.last_update, self.data_modified, self.station_state,
+                 self._journal_seq, self._snapshot_signature) = self._read_snapshot()
+                print(f"✅ Caché cargado de SQLite: {len(self.cache_data)} alcaldías")
+            elif os.path.exists(self.cache_file) or os.path.exists(self.journal_file):
+                (self.cache_data, self.last_update, self.data_modified, self.station_state,
+                 self._journal_seq, self._snapshot_signature) = self._read_snapshot(recover=True)
+                print(f"✅ Caché cargado: {len(self.cache_data)} alcaldías")
         except Exception as e:
             print(f"⚠️ Error cargando caché: {e}")
             self.cache_data = {}
     
+    def _migrate_to_store(self) -> None:
+        """Importar una sola vez el snapshot JSON existente a un store SQLite vacío"""
+        if self.store.get_meta('seq') is not None:
+            return
+        if not (os.path.exists(self.cache_file) or os.path.exists(self.journal_file)):
+            self.store.set_meta('seq', '0')
+            return
+        (self.cache_data, self.last_update, self.data_modified, self.station_state,
+         self._journal_seq, _) = self._read_json_snapshot(recover=True)
+        self.save_cache()
+        print(f"📦 Snapshot JSON migrado a SQLite: {len(self.cache_data)} alcaldías")
+    
+    def _disk_signature(self) -> Tuple[Optional[int], int]:
+        """(mtime del snapshot, tamaño del journal): cambia con cada snapshot o entrada nueva.
+
+        Con SQLite: (None, seq), donde seq aumenta con cada fila escrita por el líder.
+        """
+        if self.store is not None:
+            return None, int(self.store.get_meta('seq') or 0)
+        return self._json_signature()
+    
+    def _json_signature(self) -> Tuple[Optional[int], int]:
+        try:
+            mtime = os.stat(self.cache_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        try:
+            journal_size = os.stat(self.journal_file).st_size
+        except OSError:
+            journal_size = 0
+        return mtime, journal_size
+    
+    def _read_snapshot(self, recover: bool = False) -> Tuple[Dict[str, Observation], Optional[datetime], Optional[datetime], Dict[str, Dict[str, Any]], int, Tuple[Optional[int], int]]:
+        """Leer el estado persistido.
+
+        Retorna (datos, última actualización, último cambio, estado por estación, seq, firma en disco).
+        """
+        if self.store is None:
+            return self._read_json_snapshot(recover)
+        signature = self._disk_signature()
+        stored, station_state = self.store.load_stations()
+        data = {alcaldia: Observation.from_dict(value) for alcaldia, value in stored.items()}
+        last_update = _parse_datetime(self.store.get_meta('last_update'))
+        data_modified = _parse_datetime(self.store.get_meta('data_modified')) or last_update
+        return data, last_update, data_modified, station_state, signature[1], signature
+    
+    def _read_json_snapshot(self, recover: bool = False) -> Tuple[Dict[str, Observation], Optional[datetime], Optional[datetime], Dict[str, Dict[str, Any]], int, Tuple[Optional[int], int]]:
+        """Leer snapshot + journal JSON.
+
+        Con recover=True un snapshot ilegible se aparta como .corrupt y el
+        estado se reconstruye solo con el journal, en lugar de lanzar.
+        """
+        signature = self._json_signature()
+        data: Dict[str, Observation] = {}
+        station_state: Dict[str, Dict[str, Any]] = {}
+        last_update = None
+        data_modified = None
+        seq = 0
+        if signature[0] is not None:
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    cache_content = json.load(f)
+                last_update = _parse_datetime(cache_content.get('last_update'))
+                # Snapshots anteriores a data_modified: el último cambio conocido es el último ciclo
+                data_modified = _parse_datetime(cache_content.get('data_modified')) or last_update
+                data = {alcaldia: Observation.from_dict(value) for alcaldia, value in cache_content.get('data', {}).items()}
+                station_state = cache_content.get('stations', {})
+                seq = cache_content.get('seq', 0)
+                if not isinstance(station_state, dict) or not isinstance(seq, int):
+                    raise TypeError("estructura de snapshot inválida")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                # JSON ilegible o con otra estructura (p. ej. una lista donde se espera un objeto)
+                if not recover:
+                    raise
+                print(f"❌ Snapshot ilegible ({e}); se reconstruye desde el journal")
+                os.replace(self.cache_file, f"{self.cache_file}.corrupt")
+                data, station_state, last_update, data_modified, seq = {}, {}, None, None, 0
+        
+        replayed = 0
+        for entry in self._read_journal():
+            # Entradas anteriores al snapshot ya están incluidas en él
+            if entry['seq'] <= seq:
+                continue
+            try:
+                observation = Observation.from_dict(entry['data']) if entry.get('data') is not None else None
+            except (KeyError, TypeError, AttributeError) as e:
+                print(f"⚠️ Entrada {entry['seq']} del journal ignorada: {e}")
+                continue
+            if observation is not None:
+                data[entry['alcaldia']] = observation
+            if isinstance(entry.get('state'), dict):
+                station_state[entry['alcaldia']] = entry['state']
+            data_modified = _parse_datetime(entry.get('at')) or data_modified
+            seq = entry['seq']
+            replayed += 1
+        if replayed:
+            print(f"📜 Journal reaplicado: {replayed} actualizaciones")
+        return data, last_update, data_modified, station_state, seq, signature
+    
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """Entradas completas del journal (una línea truncada por un corte se ignora)"""
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        entries = []
+        for line in lines:
+            if not line.endswith('\n'):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get('seq'), int) and isinstance(entry.get('alcaldia'), str):
+                entries.append(entry)
+        return entries
+    
+    def journal_stations(self, alcaldias: List[str]) -> None:
+        """Registrar en el journal el dato y estado actuales de varias estaciones (un append + un fsync)"""
+        if not alcaldias:
+            return
+        # Los seguidores toman data_modified de la última entrada reaplicada
+        modified_at = (self.data_modified or datetime.now()).isoformat()
+        entries = []
+        for alcaldia in alcaldias:
+            self._journal_seq += 1
+            entries.append({
+                'seq': self._journal_seq,
+                'alcaldia': alcaldia,
+                'data': self._station_dict(alcaldia),
+                'state': self.station_state.get(alcaldia),
+                'at': modified_at
+            })
+        if self.store is not None:
+            # En SQLite la fila de la estación es el registro: todas en una sola transacción
+            try:
+                with self.store.write():
+                    for entry in entries:
+                        self.store.put_station(entry['alcaldia'], entry['data'], entry['state'], entry['seq'])
+                    self.store.set_meta('data_modified', modified_at)
+            except Exception as e:
+                print(f"❌ Error guardando estaciones en SQLite: {e}")
+            return
+        try:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_entries += len(entries)
+        except OSError as e:
+            print(f"❌ Error escribiendo journal: {e}")
+    
+    def _station_dict(self, alcaldia: str) -> Optional[Dict[str, Any]]:
+        data = self.cache_data.get(alcaldia)
+        return data.to_dict() if data is not None else None
+    
     def save_cache(self) -> None:
-        """Guardar datos en caché"""
+        """Guardar un snapshot completo (compacto, atómico y sincronizado a disco) y vaciar el journal"""
+        if self.store is not None:
+            self._save_to_store()
+            return
         try:
+            # El snapshot es un cambio más: seq avanza aunque el ciclo no haya escrito en el journal
+            self._journal_seq += 1
             cache_content = {
-                'data': self.cache_data,
+                'data': {alcaldia: data.to_dict() for alcaldia, data in self.cache_data.items()},
                 'last_update': self.last_update.isoformat() if self.last_update else None,
+                'data_modified': self.data_modified.isoformat() if self.data_modified else None,
+                'stations': self.station_state,
+                # Última entrada del journal incluida en este snapshot
+                'seq': self._journal_seq,
                 'updated_at': datetime.now().isoformat()
             }
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_content, f, indent=2, ensure_ascii=False)
+            # Escribir a un temporal y reemplazar: los procesos seguidores nunca leen un archivo a medias
+            # y un corte a mitad de la escritura deja intacto el snapshot anterior
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cache_content, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.cache_file)
+            _fsync_directory(self.cache_file)
+            # Todo lo del journal quedó en el snapshot (si el corte ocurre antes, seq evita reaplicarlo)
+            if self._journal_entries or os.path.exists(self.journal_file):
+                with open(self.journal_file, 'w', encoding='utf-8'):
+                    pass
+            self._journal_entries = 0
             print(f"💾 Caché guardado: {len(self.cache_data)} alcaldías")
         except Exception as e:
             print(f"❌ Error guardando caché: {e}")
     
-    def fetch_station_data(self, station_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Obtener datos de una estación específica usando el API de Conagua"""
+    def _save_to_store(self) -> None:
+        """Todas las estaciones y last_update en una sola transacción SQLite"""
+        try:
+            self._journal_seq += 1
+            with self.store.write():
+                for alcaldia in set(self.cache_data) | set(self.station_state):
+                    self.store.put_station(alcaldia, self._station_dict(alcaldia), self.station_state.get(alcaldia),
+                                           self._journal_seq)
+                self.store.set_meta('last_update', self.last_update.isoformat() if self.last_update else None)
+                self.store.set_meta('data_modified', self.data_modified.isoformat() if self.data_modified else None)
+                self.store.set_meta('seq', str(self._journal_seq))
+            print(f"💾 Caché guardado en SQLite: {len(self.cache_data)} alcaldías")
+        except Exception as e:
+            print(f"❌ Error guardando caché en SQLite: {e}")
+    
+    def reload_snapshot(self) -> bool:
+        """Recargar el snapshot y journal del proceso líder si cambiaron en disco"""
+        if self._disk_signature() == self._snapshot_signature:
+            return False
+        
+        try:
+            data, last_update, data_modified, station_state, seq, signature = self._read_snapshot()
+        except Exception as e:
+            # Conservar los datos actuales; se reintenta en el siguiente ciclo
+            print(f"⚠️ Error recargando snapshot: {e}")
+            return False
+        
+        previous = self.cache_data
+        self.cache_data = data
+        self.last_update = last_update
+        self.data_modified = data_modified
+        self.station_state = station_state
+        self._journal_seq = seq
+        self._snapshot_signature = signature
+        self.data_version += 1
+        print(f"🔁 Snapshot recargado: {len(data)} alcaldías (pid {os.getpid()})")
+        self._notify_update(self._changed_alcaldias(previous, data))
+        return True
+    
+    def follow_snapshot(self, poll_interval: float = 5) -> None:
+        """Modo seguidor: no consultar a SMN y seguir el snapshot que escribe el líder"""
+        if self.is_running:
+            print("⚠️ El colector ya está ejecutándose")
+            return
+        
+        self.is_follower = True
+        self.is_running = True
+        self._stop_event.clear()
+        
+        def follow_loop() -> None:
+            while not self._stop_event.is_set():
+                self.reload_snapshot()
+                self._stop_event.wait(poll_interval)
+        
+        threading.Thread(target=follow_loop, daemon=True).start()
+        print(f"👀 Siguiendo snapshot {self.cache_file} cada {poll_interval}s")
+    
+    def fetch_state_records(self, ides: str) -> Optional[List[Dict[str, Any]]]:
+        """Descargar el pronóstico municipal de un estado completo (una sola consulta a SMN).
+
+        El cuerpo se procesa en streaming (smn_ingest): solo se materializan
+        los registros de los municipios que atendemos de ese estado.
+        """
         try:
             # URL del servicio de Conagua con método 1 (pronóstico por municipio)
             url = self.conagua_api_base
@@ -94,40 +437,112 @@ class ConaguaDataCollector:
                 'Accept-Language': 'es-MX,es;q=0.9,en;q=0.8'
             }
             
-            # Preparar parámetros para la solicitud
-            # Para CDMX, ides=9 (Ciudad de México)
-            params = {
-                'ides': station_info['id']  # ID del estado (9 para CDMX)
-            }
-            
-            # Si hay un ID municipal específico, lo incluimos
-            if 'idmun' in station_info:
-                params['idmun'] = station_info['idmun']
+            # Sin idmun SMN responde todos los municipios del estado (ides=9 para CDMX)
+            print(f"📡 Solicitando datos a Conagua para el estado {ides}...")
+            response = upstream_client.get(url, params={'ides': ides}, headers=headers, timeout=15, stream=True)
             
-            # Realizar la solicitud HTTP al API de Conagua
-            print(f"📡 Solicitando datos a Conagua para {station_info['name']}...")
-            response = requests.get(url, params=params, headers=headers, timeout=15)
-            
-            if response.status_code == 200:
+            try:
+                if response.status_code != 200:
+                    print(f"⚠️ HTTP {response.status_code} para el estado {ides}")
+                    return None
+                keep = record_filter(to_int(ides), self.tracked_municipios(ides))
                 try:
-                    data = response.json()
-                    return self.parse_conagua_data(data, station_info)
-                except json.JSONDecodeError:
-                    print(f"⚠️ Error decodificando JSON para {station_info['name']}")
-                    print(f"Respuesta recibida: {response.text[:200]}...")
+                    records, stats = ingest_records(response.iter_content(READ_SIZE), keep)
+                except ValueError as e:
+                    print(f"⚠️ Error decodificando JSON para el estado {ides}: {e}")
                     return None
-            else:
-                print(f"⚠️ HTTP {response.status_code} para {station_info['name']}")
-                return None
+            finally:
+                # Devuelve la conexión al pool aunque el cuerpo no se haya leído completo
+                response.close()
+            
+            self.ingest_stats[ides] = stats
+            print(f"📥 Estado {ides}: {stats['records_kept']}/{stats['records_scanned']} registros, "
+                  f"{stats['bytes_received'] / 1024:.0f} KB en {stats['ms']:.0f} ms")
+            self._notify_ingest(ides, records)
+            return records
         
         except requests.RequestException as e:
-            print(f"❌ Error en solicitud para {station_info['name']}: {e}")
+            print(f"❌ Error en solicitud para el estado {ides}: {e}")
             return None
         except Exception as e:
-            print(f"❌ Error inesperado para {station_info['name']}: {e}")
+            print(f"❌ Error inesperado para el estado {ides}: {e}")
+            return None
+    
+    def tracked_states(self) -> Set[int]:
+        """ides de los estados que descarga el colector"""
+        return {to_int(station['id']) for station in self.cdmx_stations.values()}
+    
+    def tracked_municipios(self, ides: str) -> Optional[Set[int]]:
+        """idmun atendidos de un estado; None si el estado solo tiene el agregado estatal.
+
+        Las entradas agregadas (sin idmun, como 'cdmx') no amplían el filtro:
+        su promedio se calcula sobre los municipios atendidos del estado.
+        """
+        municipios = {to_int(station['idmun']) for station in self.cdmx_stations.values()
+                      if station['id'] == ides and 'idmun' in station}
+        return municipios or None
+    
+    @staticmethod
+    def index_state_records(records: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        """Agrupar los registros de un estado por idmun, cada municipio ordenado por ndia"""
+        index: Dict[int, List[Dict[str, Any]]] = {}
+        for record in records:
+            idmun = to_int(record.get('idmun'))
+            if idmun is not None:
+                index.setdefault(idmun, []).append(record)
+        for days in index.values():
+            days.sort(key=lambda record: to_int(record.get('ndia')) or 0)
+        return index
+    
+    @staticmethod
+    def aggregate_state_records(index: Dict[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Pronóstico estatal por día: promedio de los municipios y valor más frecuente en campos de texto"""
+        per_day: Dict[int, List[Dict[str, Any]]] = {}
+        for days in index.values():
+            for record in days:
+                per_day.setdefault(to_int(record.get('ndia')) or 0, []).append(record)
+        
+        aggregated = []
+        for ndia in sorted(per_day):
+            records = per_day[ndia]
+            day = {
+                'ides': records[0].get('ides'),
+                'nes': records[0].get('nes'),
+                'dloc': records[0].get('dloc'),
+                'ndia': records[0].get('ndia'),
+                'municipios': len(records)
+            }
+            for field in AGGREGATE_MEAN_FIELDS:
+                values = [value for value in (to_float(record.get(field)) for record in records) if value is not None]
+                if values:
+                    mean = round(sum(values) / len(values), 1)
+                    day[field] = int(mean) if mean.is_integer() else mean
+            for field in AGGREGATE_MODE_FIELDS:
+                values = [record.get(field) for record in records if record.get(field) not in (None, '')]
+                if values:
+                    day[field] = Counter(values).most_common(1)[0][0]
+            aggregated.append(day)
+        return aggregated
+    
+    def station_from_index(self, index: Dict[int, List[Dict[str, Any]]], station_info: Dict[str, Any]) -> Optional[Observation]:
+        """Datos de una estación a partir del índice de su estado (sin idmun: agregado estatal)"""
+        if 'idmun' in station_info:
+            days = index.get(to_int(station_info['idmun']), [])
+        else:
+            days = self.aggregate_state_records(index)
+        if not days:
+            print(f"⚠️ Sin datos de pronóstico para {station_info['name']}")
+            return None
+        return self.parse_conagua_data({'municipal': days}, station_info)
+    
+    def fetch_station_data(self, station_info: Dict[str, Any]) -> Optional[Observation]:
+        """Obtener datos de una estación específica usando el API de Conagua"""
+        records = self.fetch_state_records(station_info['id'])
+        if not records:
             return None
+        return self.station_from_index(self.index_state_records(records), station_info)
     
-    def parse_conagua_data(self, raw_data: Dict[str, Any], station_info: Dict[str, Any]) -> Dict[str, Any]:
+    def parse_conagua_data(self, raw_data: Dict[str, Any], station_info: Dict[str, Any]) -> Observation:
         """Parsear datos del formato Conagua a nuestro formato interno"""
         try:
             # El API de Conagua retorna datos en un formato específico
@@ -150,31 +565,16 @@ class ConaguaDataCollector:
             # Datos del día actual
             today_data = forecast_data[0]
             
-            # Construir los datos procesados
-            parsed_data = {
-                'station_name': station_info['name'],
-                'temperatura': f"{today_data.get('tmax', 'N/A')}°C",
-                'temperatura_min': f"{today_data.get('tmin', 'N/A')}°C",
-                'humedad': f"{today_data.get('cc', 'N/A')}%",
-                'viento': f"{today_data.get('velvien', 'N/A')} km/h",
-                'direccion_viento': today_data.get('dirvieng', 'N/A'),
-                'direccion_viento_card': today_data.get('dirvienc', 'N/A'),
-                'precipitacion': f"{today_data.get('prec', 'N/A')} mm",
-                'probabilidad_precipitacion': f"{today_data.get('probprec', 'N/A')}%",
-                'condicion_cielo': today_data.get('desciel', 'N/A'),
-                'timestamp': datetime.now().isoformat(),
-                'source': 'Conagua/SMN',
-                'raw_data': today_data,
-                'pronostico': self.parse_forecast_data(forecast_data)
-            }
-            
-            return parsed_data
+            return Observation.from_smn(
+                station_info['name'], today_data, self.parse_forecast_data(forecast_data),
+                timestamp=datetime.now().isoformat(), source='Conagua/SMN'
+            )
             
         except Exception as e:
             print(f"❌ Error parseando datos de Conagua: {e}")
             return self.generate_fallback_data(station_info['name'])
             
-    def parse_forecast_data(self, forecast_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def parse_forecast_data(self, forecast_data: List[Dict[str, Any]]) -> List[ForecastDay]:
         """Procesa los datos de pronóstico para múltiples días"""
         forecast = []
         
@@ -186,29 +586,17 @@ class ConaguaDataCollector:
             try:
                 day_name = day_names[i] if i < len(day_names) else f"En {i} días"
                 
-                forecast_day = {
-                    'dia': day_name,
-                    'fecha': day_data.get('ndia', 'N/A'),
-                    'temp_max': f"{day_data.get('tmax', 'N/A')}°C",
-                    'temp_min': f"{day_data.get('tmin', 'N/A')}°C",
-                    'condicion': day_data.get('desciel', 'N/A'),
-                    'precipitacion': f"{day_data.get('prec', 'N/A')} mm",
-                    'probabilidad_lluvia': f"{day_data.get('probprec', 'N/A')}%",
-                    'viento': f"{day_data.get('velvien', 'N/A')} km/h",
-                    'direccion_viento': day_data.get('dirvieng', 'N/A')
-                }
-                
-                forecast.append(forecast_day)
+                forecast.append(ForecastDay.from_smn(day_name, day_data))
             except Exception as e:
                 print(f"❌ Error procesando día {i} del pronóstico: {e}")
         
         return forecast
     
-    def generate_forecast(self) -> List[Dict[str, str]]:
+    def generate_forecast(self) -> List[ForecastDay]:
         """Generar pronóstico de 3 días"""
         import random
         
-        forecast: List[Dict[str, str]] = []
+        forecast: List[ForecastDay] = []
         days = ['Hoy', 'Mañana', 'Pasado mañana']
         conditions = ['Despejado', 'Parcialmente nublado', 'Nublado', 'Lluvia ligera', 'Lluvia moderada']
         
@@ -221,57 +609,209 @@ class ConaguaDataCollector:
             condition = random.choice(conditions)
             direccion = random.choice(direcciones)
             
-            forecast.append({
-                'dia': day,
-                'fecha': (datetime.now() + timedelta(days=days.index(day))).strftime('%d/%m/%Y'),
-                'temp_max': f"{temp_max}°C",
-                'temp_min': f"{temp_min}°C",
-                'condicion': condition,
-                'precipitacion': f"{random.choice([0, 0, 0, 0.2, 1.5])} mm",
-                'probabilidad_lluvia': f"{random.randint(0, 80)}%",
-                'viento': f"{8 + random.randint(0, 12)} km/h",
-                'direccion_viento': direccion
-            })
+            forecast.append(ForecastDay(
+                day,
+                date=(datetime.now() + timedelta(days=days.index(day))).strftime('%d/%m/%Y'),
+                temp_max=temp_max,
+                temp_min=temp_min,
+                sky=condition,
+                precip=random.choice([0, 0, 0, 0.2, 1.5]),
+                precip_prob=random.randint(0, 80),
+                wind_speed=8 + random.randint(0, 12),
+                wind_direction=direccion
+            ))
         
         return forecast
     
     def update_all_stations(self) -> bool:
         """Actualizar datos de todas las estaciones CDMX"""
-        print(f"🔄 Iniciando actualización de datos meteorológicos...")
+        with self._update_lock:
+            self._cycle_running = True
+            try:
+                return self._refresh_stations(list(self.cdmx_stations), full_cycle=True)
+            finally:
+                self._cycle_running = False
+    
+    def refresh_due_stations(self) -> bool:
+        """Reintentar solo las estaciones fallidas cuyo backoff ya venció (sin rehacer el ciclo completo)"""
+        with self._update_lock:
+            due = self.due_stations()
+            if not due:
+                return False
+            self._cycle_running = True
+            try:
+                return self._refresh_stations(due, full_cycle=False)
+            finally:
+                self._cycle_running = False
+    
+    def due_stations(self) -> List[str]:
+        """Alcaldías con un fallo pendiente cuyo reintento ya toca"""
+        now = time.time()
+        return [
+            alcaldia for alcaldia, state in self.station_state.items()
+            if state['status'] != 'ok' and state.get('retry_at') is not None and state['retry_at'] <= now
+        ]
+
+    def _refresh_stations(self, alcaldia_keys: List[str], full_cycle: bool) -> bool:
+        kind = "completa" if full_cycle else f"parcial ({len(alcaldia_keys)} estaciones)"
+        print(f"🔄 Iniciando actualización {kind} de datos meteorológicos...")
         updated_count = 0
+        previous = dict(self.cache_data)
+        started = time.monotonic()
+        latencies: Dict[str, Optional[float]] = {}
         
-        for alcaldia_key, station_info in self.cdmx_stations.items():
-            try:
-                print(f"📡 Obteniendo datos de {station_info['name']}...")
-                
-                # Intentar obtener datos reales
-                data = self.fetch_station_data(station_info)
-                
-                if data:
-                    self.cache_data[alcaldia_key] = data
-                    updated_count += 1
-                    print(f"✅ {station_info['name']}: {data['temperatura']}, {data.get('humedad', 'N/A')}")
-                else:
-                    # Usar datos fallback si falla la conexión real
-                    print(f"⚠️ Usando datos fallback para {station_info['name']}")
-                    self.cache_data[alcaldia_key] = self.generate_fallback_data(station_info['name'])
-                    updated_count += 1
-                
-                # Pausa corta entre requests
-                time.sleep(0.5)
+        # SMN entrega el pronóstico de todo un estado: una consulta por estado distinto
+        # (todas las alcaldías comparten ides=9) y el resultado se reparte por idmun
+        stations_by_state: Dict[str, List[str]] = {}
+        for alcaldia_key in alcaldia_keys:
+            stations_by_state.setdefault(self.cdmx_stations[alcaldia_key]['id'], []).append(alcaldia_key)
+        
+        # Estados en paralelo (acotado por max_state_fetches); cada estado se publica en cuanto llega
+        executor = ThreadPoolExecutor(max_workers=self.max_state_fetches, thread_name_prefix='conagua-fetch')
+        futures = {executor.submit(self._timed_fetch, ides): ides for ides in stations_by_state}
+        try:
+            for future in as_completed(futures, timeout=self.refresh_deadline):
+                ides = futures[future]
+                try:
+                    records, latencies[ides] = future.result()
+                except Exception as e:
+                    print(f"❌ Error procesando el estado {ides}: {e}")
+                    records, latencies[ides] = None, time.monotonic() - started
+                index = self.index_state_records(records) if records else {}
                 
-            except Exception as e:
-                print(f"❌ Error procesando {station_info['name']}: {e}")
-                # Generar datos fallback en caso de error
-                self.cache_data[alcaldia_key] = self.generate_fallback_data(station_info['name'])
+                for alcaldia_key in stations_by_state[ides]:
+                    station_info = self.cdmx_stations[alcaldia_key]
+                    try:
+                        data = self.station_from_index(index, station_info) if index else None
+                    except Exception as e:
+                        print(f"❌ Error procesando {station_info['name']}: {e}")
+                        data = None
+                    
+                    if data is not None and data.source != FALLBACK_SOURCE:
+                        self._commit_station(alcaldia_key, data)
+                        self._station_succeeded(alcaldia_key)
+                        updated_count += 1
+                        print(f"✅ {station_info['name']}: {format_number(data.temp_max, '°C')}, {format_number(data.humidity, '%')}")
+                    else:
+                        self._station_failed(alcaldia_key, 'failed')
+        except FuturesTimeout:
+            # Las consultas que siguen en curso terminan en segundo plano y su resultado se descarta
+            for ides in futures.values():
+                if ides in latencies:
+                    continue
+                print(f"⏱️ Estado {ides}: sin respuesta tras {self.refresh_deadline:.0f}s")
+                latencies[ides] = None
+                for alcaldia_key in stations_by_state[ides]:
+                    self._station_failed(alcaldia_key, 'timeout')
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         
-        self.last_update = datetime.now()
-        self.save_cache()
+        duration = time.monotonic() - started
+        self.last_refresh = {
+            'kind': 'full' if full_cycle else 'partial',
+            'finished_at': datetime.now().isoformat(),
+            'duration_ms': round(duration * 1000),
+            'stations': len(alcaldia_keys),
+            'updated': updated_count,
+            'upstream_requests': len(futures),
+            'timed_out': sorted(
+                alcaldia for ides, latency in latencies.items() if latency is None for alcaldia in stations_by_state[ides]
+            ),
+            'state_latency_ms': {
+                ides: round(latency * 1000) if latency is not None else None for ides, latency in latencies.items()
+            }
+        }
+        # Un reintento parcial no reinicia el ciclo de 75 minutos de las demás estaciones
+        if full_cycle:
+            self.last_update = datetime.now()
+        self.data_version += 1
+        # Un ciclo completo reescribe todas las estaciones: solo el snapshot, sin entradas de journal.
+        # Un reintento parcial solo agrega sus estaciones al journal (un fsync por reintento) y el
+        # snapshot se reescribe cuando el journal creció demasiado
+        if not full_cycle:
+            self.journal_stations(alcaldia_keys)
+        if full_cycle or self._journal_entries >= self.journal_compact_entries:
+            self.save_cache()
+        self._notify_update(self._changed_alcaldias(previous, self.cache_data))
+        # Nuevos plazos: fin del intervalo desde last_update y reintentos recién programados
+        self.scheduler.reschedule()
         
-        print(f"🎯 Actualización completada: {updated_count}/{len(self.cdmx_stations)} estaciones")
+        print(f"🎯 Actualización {kind} completada: {updated_count}/{len(alcaldia_keys)} estaciones en {duration:.1f}s")
         return updated_count > 0
     
-    def generate_fallback_data(self, station_name: str) -> Dict[str, Any]:
+    def _station_succeeded(self, alcaldia_key: str) -> None:
+        now = time.time()
+        self.station_state[alcaldia_key] = {
+            'status': 'ok', 'updated_at': now, 'last_attempt': now, 'failures': 0, 'retry_at': None
+        }
+    
+    def _station_failed(self, alcaldia_key: str, status: str) -> None:
+        """Conservar el último dato real de la estación (o generar fallback si no hay) y programar el reintento"""
+        now = time.time()
+        state = self.station_state.get(alcaldia_key, {})
+        failures = state.get('failures', 0) + 1
+        delay = min(self.station_retry_base * 2 ** (failures - 1), self.station_retry_max)
+        self.station_state[alcaldia_key] = {
+            'status': status,
+            'updated_at': state.get('updated_at'),
+            'last_attempt': now,
+            'failures': failures,
+            'retry_at': now + delay
+        }
+        # El estado de la estación viaja en la respuesta (station_status, stale)
+        self.data_modified = datetime.now()
+        
+        station_info = self.cdmx_stations[alcaldia_key]
+        if alcaldia_key in self.cache_data:
+            print(f"⚠️ {station_info['name']}: {status}, se conservan los datos previos (reintento en {delay:.0f}s)")
+        else:
+            # Usar datos fallback si nunca hubo datos reales
+            print(f"⚠️ Usando datos fallback para {station_info['name']} (reintento en {delay:.0f}s)")
+            self._commit_station(alcaldia_key, self.generate_fallback_data(station_info['name']))
+    
+    def _timed_fetch(self, ides: str) -> Tuple[Optional[List[Dict[str, Any]]], float]:
+        """fetch_state_records con su latencia en segundos (se ejecuta en el pool de consultas)"""
+        start = time.monotonic()
+        records = self.fetch_state_records(ides)
+        return records, time.monotonic() - start
+    
+    def _commit_station(self, alcaldia_key: str, data: Observation) -> None:
+        """Publicar el resultado de una estación sin esperar al resto del ciclo"""
+        self.cache_data[alcaldia_key] = data
+        self.data_modified = datetime.now()
+        # Invalida los cuerpos pre-renderizados que dependen de cache_data
+        self.data_version += 1
+    
+    def add_update_listener(self, listener: Callable[[int, List[str]], None]) -> None:
+        """Registrar un callback para cada actualización (p. ej. el canal SSE)"""
+        self._update_listeners.append(listener)
+    
+    def add_ingest_listener(self, listener: Callable[[str, List[Dict[str, Any]]], None]) -> None:
+        """Registrar un callback con los registros de cada estado descargado (p. ej. el índice de pronóstico)"""
+        self._ingest_listeners.append(listener)
+    
+    def _notify_ingest(self, ides: str, records: List[Dict[str, Any]]) -> None:
+        for listener in list(self._ingest_listeners):
+            try:
+                listener(ides, records)
+            except Exception as e:
+                print(f"❌ Error entregando la ingesta del estado {ides}: {e}")
+    
+    def _notify_update(self, changed: List[str]) -> None:
+        for listener in list(self._update_listeners):
+            try:
+                listener(self.data_version, changed)
+            except Exception as e:
+                print(f"❌ Error notificando actualización: {e}")
+    
+    @staticmethod
+    def _changed_alcaldias(previous: Dict[str, Observation], current: Dict[str, Observation]) -> List[str]:
+        """Alcaldías cuyo contenido cambió, sin contar el timestamp de la consulta"""
+        def content(data: Optional[Observation]) -> Optional[Dict[str, Any]]:
+            return data.content_key() if data is not None else None
+        return [alcaldia for alcaldia, data in current.items() if content(previous.get(alcaldia)) != content(data)]
+    
+    def generate_fallback_data(self, station_name: str) -> Observation:
         """Generar datos de respaldo realistas"""
         import random
         
@@ -292,38 +832,145 @@ class ConaguaDataCollector:
         # Elegir dirección aleatoria
         dir_index = random.randint(0, len(direcciones) - 1)
         
-        return {
-            'station_name': station_name,
-            'temperatura': f"{base_temp:.0f}°C",
-            'temperatura_min': f"{temp_min:.0f}°C",
-            'humedad': f"{55 + random.randint(0, 25)}%",
-            'viento': f"{8 + random.randint(0, 12)} km/h",
-            'direccion_viento': direcciones[dir_index],
-            'direccion_viento_card': direcciones_card[dir_index],
-            'precipitacion': f"{random.choice([0, 0, 0, 0.2, 1.5])} mm",
-            'probabilidad_precipitacion': f"{random.randint(0, 80)}%",
-            'condicion_cielo': random.choice(cielo_opciones),
-            'timestamp': datetime.now().isoformat(),
-            'source': 'Fallback Data',
-            'pronostico': self.generate_forecast(),
-            'note': 'Datos generados automáticamente (API no disponible)'
+        return Observation(
+            station_name, datetime.now().isoformat(), FALLBACK_SOURCE,
+            temp_max=round(base_temp),
+            temp_min=round(temp_min),
+            humidity=55 + random.randint(0, 25),
+            wind_speed=8 + random.randint(0, 12),
+            wind_direction=direcciones[dir_index],
+            wind_direction_card=direcciones_card[dir_index],
+            precip=random.choice([0, 0, 0, 0.2, 1.5]),
+            precip_prob=random.randint(0, 80),
+            sky=random.choice(cielo_opciones),
+            forecast=self.generate_forecast(),
+            note='Datos generados automáticamente (API no disponible)'
+        )
+    
+    def refresh_if_stale(self) -> bool:
+        """Si los datos vencieron, lanzar una actualización en segundo plano y regresar de inmediato.
+
+        Quien lee nunca espera a SMN: recibe el snapshot actual marcado como
+        vencido. Retorna True si esta llamada lanzó la actualización. Los
+        seguidores nunca consultan a SMN.
+        """
+        if self.is_follower or not (self.needs_update() or self.due_stations()):
+            return False
+        with self._refresh_guard:
+            if self._refresh_scheduled or self._cycle_running:
+                return False
+            self._refresh_scheduled = True
+        
+        # Con el planificador activo la actualización corre en su hilo; sin él, en uno propio
+        if not self.scheduler.trigger('stale'):
+            threading.Thread(target=self._scheduled_refresh, args=('stale',), name='conagua-refresh', daemon=True).start()
+        return True
+    
+    def request_refresh(self) -> bool:
+        """Ciclo completo a demanda, en segundo plano. Retorna False en un seguidor o si ya hay uno en curso"""
+        if self.is_follower:
+            return False
+        with self._refresh_guard:
+            if self._refresh_scheduled or self._cycle_running:
+                return False
+            self._refresh_scheduled = True
+        if not self.scheduler.trigger('manual'):
+            threading.Thread(target=self._scheduled_refresh, args=('manual',), name='conagua-refresh', daemon=True).start()
+        return True
+    
+    def _scheduled_refresh(self, reason: str) -> None:
+        """Job del planificador: ciclo completo o solo las estaciones con reintento vencido"""
+        try:
+            with self._update_lock:
+                # Otro ciclo pudo haber terminado mientras esperábamos el lock
+                if self.needs_update() or reason in FULL_REFRESH_REASONS:
+                    print(f"⏰ Actualización programada ({reason})...")
+                    self.update_all_stations()
+                elif self.due_stations():
+                    print(f"⏰ Reintentando estaciones fallidas...")
+                    self.refresh_due_stations()
+        except Exception as e:
+            print(f"❌ Error en actualización en segundo plano: {e}")
+        finally:
+            with self._refresh_guard:
+                self._refresh_scheduled = False
+    
+    def next_refresh_deadline(self) -> Tuple[Optional[float], str]:
+        """(timestamp, motivo) de la siguiente actualización: lo que venza primero entre el fin del
+        intervalo, la siguiente publicación de SMN y el reintento más próximo de una estación"""
+        if self.last_update is None:
+            return time.time(), 'initial'
+        last_update = self.last_update.timestamp()
+        candidates = [(last_update + self.update_interval, 'interval')]
+        publication = next_publication_time(last_update, self.publication_times, self.publication_delay)
+        if publication is not None:
+            candidates.append((publication, 'publication'))
+        retries = [state['retry_at'] for state in self.station_state.values()
+                   if state['status'] != 'ok' and state.get('retry_at') is not None]
+        if retries:
+            candidates.append((min(retries), 'retry'))
+        return min(candidates)
+    
+    def is_refreshing(self) -> bool:
+        """True mientras hay un ciclo de actualización en curso o programado"""
+        return self._refresh_scheduled or self._cycle_running
+    
+    def get_staleness(self, alcaldia: Optional[str] = None) -> Dict[str, Any]:
+        """Metadatos de frescura que acompañan a cada lectura (con alcaldía: también los de su estación)"""
+        staleness = {
+            'stale': self.needs_update(),
+            'refreshing': self.is_refreshing(),
+            'last_update': self.last_update.isoformat() if self.last_update else None
         }
+        if alcaldia is not None:
+            status = self.station_state.get(alcaldia, {}).get('status')
+            staleness['station_status'] = status
+            # Una estación fallida sirve su último dato real, vencido aunque el ciclo sea reciente
+            staleness['stale'] = staleness['stale'] or status not in (None, 'ok')
+        return staleness
     
     def get_weather_data(self, alcaldia: str = 'cdmx') -> Dict[str, Any]:
-        """Obtener datos meteorológicos para una alcaldía"""
-        # Verificar si los datos necesitan actualización
-        if self.needs_update():
-            print(f"📅 Datos desactualizados, iniciando actualización...")
-            self.update_all_stations()
+        """Obtener datos meteorológicos para una alcaldía (nunca espera a SMN)"""
+        self.refresh_if_stale()
         
-        # Retornar datos de la alcaldía solicitada
+        # Retornar datos de la alcaldía solicitada (o del promedio CDMX si no se conoce)
+        if alcaldia not in self.cache_data and 'cdmx' in self.cache_data:
+            print(f"⚠️ Alcaldía '{alcaldia}' no encontrada, usando CDMX promedio")
+            alcaldia = 'cdmx'
         if alcaldia in self.cache_data:
-            data = self.cache_data[alcaldia].copy()
+            data = self.cache_data[alcaldia].to_display()
             data['cache_age'] = self.get_cache_age()
+            data['last_update'] = self.last_update.isoformat() if self.last_update else None
+            data.update(self.get_staleness(alcaldia))
             return data
         else:
-            print(f"⚠️ Alcaldía '{alcaldia}' no encontrada, usando CDMX promedio")
-            return self.get_weather_data('cdmx')
+            print(f"⚠️ Caché vacío, usando datos fallback para {alcaldia}")
+            data = self.generate_fallback_data(self.cdmx_stations.get(alcaldia, self.cdmx_stations['cdmx'])['name']).to_display()
+            data.update(self.get_staleness())
+            return data
+    
+    def nearest_stations(self, lat: float, lon: float, k: int = config.NEAREST_STATIONS_K) -> List[Dict[str, Any]]:
+        """Las k alcaldías más cercanas a (lat, lon) con distancia (km) y peso por distancia inversa"""
+        nearest = self.locator.nearest(lat, lon, k)
+        for station in nearest:
+            station['station_name'] = self.cdmx_stations[station['alcaldia']]['name']
+        return nearest
+    
+    def get_weather_batch(self, alcaldias: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Datos de varias alcaldías del mismo snapshot; omite las que no están en caché"""
+        self.refresh_if_stale()
+        
+        cache_age = self.get_cache_age()
+        last_update = self.last_update.isoformat() if self.last_update else None
+        batch = {}
+        for alcaldia in alcaldias:
+            if alcaldia in self.cache_data:
+                data = self.cache_data[alcaldia].to_display()
+                data['cache_age'] = cache_age
+                data['last_update'] = last_update
+                data.update(self.get_staleness(alcaldia))
+                batch[alcaldia] = data
+        return batch
     
     def needs_update(self) -> bool:
         """Verificar si los datos necesitan actualización"""
@@ -333,6 +980,13 @@ class ConaguaDataCollector:
         time_since_update = datetime.now() - self.last_update
         return time_since_update.total_seconds() > self.update_interval
     
+    def seconds_until_next_update(self) -> int:
+        """Segundos que faltan para el siguiente ciclo de actualización (0 si ya venció)"""
+        if not self.last_update:
+            return 0
+        elapsed = (datetime.now() - self.last_update).total_seconds()
+        return max(0, int(self.update_interval - elapsed))
+    
     def get_cache_age(self) -> str:
         """Obtener la edad del caché en minutos"""
         if self.last_update:
@@ -347,65 +1001,89 @@ class ConaguaDataCollector:
             return
         
         self.is_running = True
+        self._stop_event.clear()
         print(f"🔄 Iniciando actualizaciones automáticas cada {self.update_interval/60:.0f} minutos")
         
-        def update_loop() -> None:
-            while self.is_running:
-                try:
-                    if self.needs_update():
-                        print(f"⏰ Actualización automática programada...")
-                        self.update_all_stations()
-                    
-                    # Esperar hasta la siguiente verificación (cada 5 minutos)
-                    time.sleep(300)  # 5 minutos
-                    
-                except Exception as e:
-                    print(f"❌ Error en loop de actualización automática: {e}")
-                    time.sleep(60)  # Esperar 1 minuto antes de reintentar
-        
         # Ejecutar primera actualización inmediatamente
         if not self.cache_data or self.needs_update():
             print("🔄 Ejecutando primera actualización...")
             self.update_all_stations()
         
-        # Iniciar thread de actualización automática
-        update_thread = threading.Thread(target=update_loop, daemon=True)
-        update_thread.start()
-        print("✅ Actualizaciones automáticas iniciadas")
+        # Iniciar el planificador: duerme hasta el siguiente plazo en lugar de revisar cada 5 minutos
+        self.scheduler.start()
+        status = self.scheduler.status()
+        print(f"✅ Actualizaciones automáticas iniciadas (siguiente: {status['next_run_at']}, {status['next_reason']})")
     
     def stop_automatic_updates(self) -> None:
-        """Detener actualizaciones automáticas"""
+        """Detener actualizaciones automáticas (despierta de inmediato al planificador y al seguidor)"""
         self.is_running = False
+        self._stop_event.set()
+        self.scheduler.stop()
         print("🛑 Actualizaciones automáticas detenidas")
     
     def get_system_status(self) -> Dict[str, Any]:
         """Obtener estado del sistema de recolección"""
         return {
             'status': 'running' if self.is_running else 'stopped',
+            'role': 'follower' if self.is_follower else 'leader',
             'stations_count': len(self.cdmx_stations),
             'cached_data_count': len(self.cache_data),
+            'data_version': self.data_version,
+            'data_seq': self._journal_seq,
             'last_update': self.last_update.isoformat() if self.last_update else None,
+            'data_modified': self.data_modified.isoformat() if self.data_modified else None,
             'cache_age': self.get_cache_age(),
             'update_interval_minutes': self.update_interval / 60,
-            'needs_update': self.needs_update()
+            'needs_update': self.needs_update(),
+            'refreshing': self.is_refreshing(),
+            'scheduler': self.scheduler.status(),
+            'max_state_fetches': self.max_state_fetches,
+            'refresh_deadline_seconds': self.refresh_deadline,
+            'last_refresh': self.last_refresh,
+            'ingest': self.ingest_stats,
+            'stations': {
+                alcaldia: {
+                    'status': state['status'],
+                    'failures': state['failures'],
+                    'updated_at': datetime.fromtimestamp(state['updated_at']).isoformat() if state.get('updated_at') else None,
+                    'retry_at': datetime.fromtimestamp(state['retry_at']).isoformat() if state.get('retry_at') else None
+                }
+                for alcaldia, state in self.station_state.items()
+            }
         }
 
 # Instancia global del colector
-weather_collector = ConaguaDataCollector()
+weather_collector = ConaguaDataCollector(store=get_store())
 
 # Funciones de conveniencia para usar en el API server
 def get_weather_for_alcaldia(alcaldia: str = 'cdmx') -> Dict[str, Any]:
     """Función helper para obtener datos meteorológicos"""
     return weather_collector.get_weather_data(alcaldia)
 
+def get_weather_for_alcaldias(alcaldias: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Función helper para obtener varias alcaldías en una sola lectura del caché"""
+    return weather_collector.get_weather_batch(alcaldias)
+
 def start_weather_collection() -> None:
     """Iniciar recolección automática"""
     weather_collector.start_automatic_updates()
 
+def stop_weather_collection() -> None:
+    """Detener la recolección o el seguimiento del snapshot"""
+    weather_collector.stop_automatic_updates()
+
+def follow_weather_snapshot(poll_interval: float = 5) -> None:
+    """Seguir el snapshot del proceso líder en lugar de consultar a SMN"""
+    weather_collector.follow_snapshot(poll_interval)
+
 def update_weather_data() -> bool:
     """Forzar actualización de datos meteorológicos"""
     return weather_collector.update_all_stations()
 
+def request_weather_refresh() -> bool:
+    """Pedir un ciclo completo en segundo plano sin esperar al siguiente plazo"""
+    return weather_collector.request_refresh()
+
 def get_collection_status() -> Dict[str, Any]:
     """Obtener estado del sistema"""
     return weather_collector.get_system_status()
@@ -8,21 +8,39 @@ Author: EdbETO Solutions Team
 import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any, Optional, Union
+
+from sqlite_store import SQLiteStore, get_store
+from weather_models import ForecastDay, Observation, format_number
+
+# Un punto más cercano que esto al último de la serie lo reemplaza en lugar de agregarse
+REPLACE_WITHIN_SECONDS = 1800  # 30 minutos
+
+# SMN no publica presión por municipio; las series conservan el valor estándar
+DEFAULT_PRESSURE_HPA = 1013
+
+def _round(value: Optional[float]) -> Optional[int]:
+    return int(round(value)) if value is not None else None
 
 class ConaguaTimeseriesCollector:
     """Extensión para almacenar datos históricos con series temporales"""
 
-    def __init__(self, timeseries_file='weather_timeseries.json', max_history_hours=72):
+    def __init__(self, timeseries_file='weather_timeseries.json', max_history_hours=72, store: Optional[SQLiteStore] = None):
         self.timeseries_file = timeseries_file
         self.max_history_hours = max_history_hours  # 72 horas = 3 días de historial
+        # Con store (STORAGE_BACKEND=sqlite) los puntos se consultan en disco y timeseries_data queda vacío:
+        # la memoria ya no crece con el período de retención
+        self.store = store
         self.timeseries_data = {}
         self.load_timeseries()
 
     def load_timeseries(self):
         """Cargar datos históricos desde archivo"""
         try:
-            if os.path.exists(self.timeseries_file):
+            if self.store is not None:
+                self._migrate_to_store()
+                print(f"📈 Timeseries en SQLite: {len(self.store.series_meta())} alcaldías")
+            elif os.path.exists(self.timeseries_file):
                 with open(self.timeseries_file, 'r', encoding='utf-8') as f:
                     self.timeseries_data = json.load(f)
                 print(f"📈 Timeseries cargadas: {len(self.timeseries_data)} alcaldías")
@@ -33,12 +51,30 @@ class ConaguaTimeseriesCollector:
             print(f"⚠️ Error cargando timeseries: {e}")
             self.timeseries_data = {}
 
+    def _migrate_to_store(self):
+        """Importar una sola vez weather_timeseries.json a un store SQLite sin series"""
+        if self.store.series_meta() or not os.path.exists(self.timeseries_file):
+            return
+        with open(self.timeseries_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+        with self.store.write():
+            for alcaldia, alcaldia_data in legacy.items():
+                self.store.add_points(alcaldia, alcaldia_data['municipio'], alcaldia_data['lastUpdate'],
+                                      alcaldia_data.get('series', []))
+        print(f"📦 Timeseries JSON migradas a SQLite: {len(legacy)} alcaldías")
+
     def save_timeseries(self):
         """Guardar datos históricos con limpieza automática"""
         try:
             # Limpiar datos antiguos antes de guardar
             self.cleanup_old_data()
 
+            if self.store is not None:
+                # Los puntos ya se escribieron en su transacción; aquí solo se aplica la retención
+                total_points = sum(meta['points'] for meta in self.store.series_meta().values())
+                print(f"💾 Timeseries en SQLite: {total_points} puntos")
+                return
+
             with open(self.timeseries_file, 'w', encoding='utf-8') as f:
                 json.dump(self.timeseries_data, f, indent=2, ensure_ascii=False)
 
@@ -47,30 +83,34 @@ class ConaguaTimeseriesCollector:
         except Exception as e:
             print(f"❌ Error guardando timeseries: {e}")
 
-    def add_weather_point(self, alcaldia: str, weather_data: Dict[str, Any]):
+    def add_weather_point(self, alcaldia: str, weather_data: Union[Observation, Dict[str, Any]]):
         """Agregar punto de datos meteorológicos a la serie temporal"""
         try:
-            # Extraer temperatura y precipitación numérica
-            temp_str = weather_data.get('temperatura', '0°C')
-            temp = float(temp_str.replace('°C', '').replace('°', ''))
-
-            precip_str = weather_data.get('precipitacion', '0 mm')
-            precip = float(precip_str.replace(' mm', '').replace('mm', ''))
+            # Los valores ya son numéricos; un dict (formato con textos) se convierte una sola vez
+            observation = weather_data if isinstance(weather_data, Observation) else Observation.from_dict(weather_data)
+            temp = observation.temp_max
+            precip = observation.precip
+            timestamp = observation.timestamp or datetime.now().isoformat()
 
-            timestamp = weather_data.get('timestamp', datetime.now().isoformat())
-
-            # Crear punto de datos
+            # Crear punto de datos (None donde SMN no reportó el valor)
             point = {
                 't': timestamp,
                 'temp': temp,
                 'pp': precip,
-                'humedad': int(weather_data.get('humedad', '0%').replace('%', '')),
-                'viento': int(weather_data.get('viento', '0 km/h').split()[0]),
-                'presion': int(weather_data.get('presion', '1013 hPa').split()[0]),
-                'desc': weather_data.get('pronostico', [{}])[0].get('condicion', 'Sin datos'),
-                'source': weather_data.get('source', 'unknown')
+                'humedad': _round(observation.humidity),
+                'viento': _round(observation.wind_speed),
+                'presion': _round(observation.pressure) if observation.pressure is not None else DEFAULT_PRESSURE_HPA,
+                'desc': observation.forecast[0].sky if observation.forecast and observation.forecast[0].sky else 'Sin datos',
+                'source': observation.source or 'unknown'
             }
 
+            if self.store is not None:
+                municipio = alcaldia.replace('-', ' ').title()
+                if self.store.add_point(alcaldia, municipio, point, replace_within=REPLACE_WITHIN_SECONDS):
+                    print(f"⚠️ Punto muy reciente para {alcaldia}, actualizando en lugar de agregar")
+                print(f"📊 Punto agregado para {alcaldia}: {format_number(temp, '°C')}, {format_number(precip, 'mm')}")
+                return
+
             # Inicializar alcaldía si no existe
             if alcaldia not in self.timeseries_data:
                 self.timeseries_data[alcaldia] = {
@@ -86,7 +126,7 @@ class ConaguaTimeseriesCollector:
             if series:
                 last_point_time = datetime.fromisoformat(series[-1]['t'])
                 current_time = datetime.fromisoformat(timestamp)
-                if (current_time - last_point_time).total_seconds() < 1800:  # 30 minutos
+                if (current_time - last_point_time).total_seconds() < REPLACE_WITHIN_SECONDS:
                     print(f"⚠️ Punto muy reciente para {alcaldia}, actualizando en lugar de agregar")
                     series[-1] = point
                 else:
@@ -97,7 +137,7 @@ class ConaguaTimeseriesCollector:
             # Actualizar metadata
             self.timeseries_data[alcaldia]['lastUpdate'] = timestamp
 
-            print(f"📊 Punto agregado para {alcaldia}: {temp}°C, {precip}mm")
+            print(f"📊 Punto agregado para {alcaldia}: {format_number(temp, '°C')}, {format_number(precip, 'mm')}")
 
         except Exception as e:
             print(f"❌ Error agregando punto para {alcaldia}: {e}")
@@ -106,6 +146,11 @@ class ConaguaTimeseriesCollector:
         """Limpiar datos anteriores al período de retención"""
         cutoff_time = datetime.now() - timedelta(hours=self.max_history_hours)
 
+        if self.store is not None:
+            for alcaldia, removed in self.store.delete_points_before(cutoff_time.isoformat()).items():
+                print(f"🧹 {alcaldia}: {removed} puntos eliminados (limpieza {self.max_history_hours}h)")
+            return
+
         for alcaldia in self.timeseries_data:
             series = self.timeseries_data[alcaldia]['series']
             original_count = len(series)
@@ -122,18 +167,57 @@ class ConaguaTimeseriesCollector:
 
     def get_timeseries_for_alcaldia(self, alcaldia: str) -> Dict[str, Any]:
         """Obtener serie temporal para una alcaldía específica"""
-        if alcaldia not in self.timeseries_data:
-            return {
-                'municipio': alcaldia.replace('-', ' ').title(),
-                'lastUpdate': datetime.now().isoformat(),
-                'series': [],
-                'error': 'No data available'
-            }
+        if self.store is not None:
+            meta = self.store.series_meta(alcaldia).get(alcaldia)
+            if meta is not None:
+                return {'municipio': meta['municipio'], 'lastUpdate': meta['lastUpdate'],
+                        'series': list(self.store.iter_points(alcaldia))}
+        elif alcaldia in self.timeseries_data:
+            return self.timeseries_data[alcaldia].copy()
+        return {
+            'municipio': alcaldia.replace('-', ' ').title(),
+            'lastUpdate': datetime.now().isoformat(),
+            'series': [],
+            'error': 'No data available'
+        }
 
-        return self.timeseries_data[alcaldia].copy()
+    def series_meta(self, alcaldia: str) -> Optional[Dict[str, Any]]:
+        """municipio y lastUpdate de una alcaldía sin leer ni copiar sus puntos; None si no hay serie"""
+        if self.store is not None:
+            meta = self.store.series_meta(alcaldia).get(alcaldia)
+            return {'municipio': meta['municipio'], 'lastUpdate': meta['lastUpdate']} if meta is not None else None
+        entry = self.timeseries_data.get(alcaldia)
+        if entry is None:
+            return None
+        return {key: value for key, value in entry.items() if key != 'series'}
+
+    def iter_points(self, alcaldia: str, since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Recorrer los puntos de una alcaldía sin copiar la serie, opcionalmente desde una fecha"""
+        if self.store is not None:
+            # Rango resuelto por el índice (alcaldia, t) directamente en disco
+            yield from self.store.iter_points(alcaldia, since.isoformat() if since is not None else None)
+            return
+        alcaldia_data = self.timeseries_data.get(alcaldia)
+        if alcaldia_data is None:
+            return
+        for point in alcaldia_data['series']:
+            if since is None or datetime.fromisoformat(point['t']) >= since:
+                yield point
+
+    def get_series_version(self, alcaldia: str):
+        """(lastUpdate, número de puntos) de una alcaldía sin copiar la serie; None si no existe"""
+        if self.store is not None:
+            meta = self.store.series_meta(alcaldia).get(alcaldia)
+            return (meta['lastUpdate'], meta['points']) if meta is not None else None
+        alcaldia_data = self.timeseries_data.get(alcaldia)
+        if alcaldia_data is None:
+            return None
+        return alcaldia_data['lastUpdate'], len(alcaldia_data['series'])
 
     def get_all_timeseries(self) -> Dict[str, Any]:
         """Obtener todas las series temporales"""
+        if self.store is not None:
+            return {alcaldia: self.get_timeseries_for_alcaldia(alcaldia) for alcaldia in self.store.series_meta()}
         return self.timeseries_data.copy()
 
     def get_next_update_info(self) -> Dict[str, Any]:
@@ -141,7 +225,8 @@ class ConaguaTimeseriesCollector:
         try:
             # Buscar la última actualización más reciente
             latest_update = None
-            for alcaldia_data in self.timeseries_data.values():
+            series_meta = self.store.series_meta() if self.store is not None else self.timeseries_data
+            for alcaldia_data in series_meta.values():
                 update_time = datetime.fromisoformat(alcaldia_data['lastUpdate'])
                 if not latest_update or update_time > latest_update:
                     latest_update = update_time
@@ -167,7 +252,7 @@ class ConaguaTimeseriesCollector:
         except Exception as e:
             return {'error': f'Error calculating next update: {e}'}
 
-    def batch_update_from_cache(self, cache_data: Dict[str, Any]):
+    def batch_update_from_cache(self, cache_data: Dict[str, Observation]):
         """Actualizar todas las series temporales desde el caché principal"""
         try:
             updated_count = 0
@@ -186,6 +271,20 @@ class ConaguaTimeseriesCollector:
 
     def get_statistics(self) -> Dict[str, Any]:
         """Obtener estadísticas del sistema de timeseries"""
+        if self.store is not None:
+            total_points, oldest, newest = self.store.points_summary()
+            total_alcaldias = len(self.store.series_meta())
+            return {
+                'total_alcaldias': total_alcaldias,
+                'total_points': total_points,
+                'average_points_per_alcaldia': round(total_points / max(1, total_alcaldias), 1),
+                'oldest_point': oldest,
+                'newest_point': newest,
+                'retention_hours': self.max_history_hours,
+                'storage': 'sqlite',
+                'file_size_mb': round(self.store.file_size() / 1024 / 1024, 2)
+            }
+
         total_points = 0
         oldest_point = None
         newest_point = None
@@ -212,10 +311,10 @@ class ConaguaTimeseriesCollector:
         }
 
 # Instancia global del collector de timeseries
-timeseries_collector = ConaguaTimeseriesCollector()
+timeseries_collector = ConaguaTimeseriesCollector(store=get_store())
 
 # Funciones helper para usar en el API server
-def add_weather_to_timeseries(alcaldia: str, weather_data: Dict[str, Any]):
+def add_weather_to_timeseries(alcaldia: str, weather_data: Union[Observation, Dict[str, Any]]):
     """Agregar datos meteorológicos a las series temporales"""
     timeseries_collector.add_weather_point(alcaldia, weather_data)
 
@@ -227,7 +326,7 @@ def get_cron_info() -> Dict[str, Any]:
     """Obtener información del cron de 75 minutos"""
     return timeseries_collector.get_next_update_info()
 
-def batch_update_timeseries(cache_data: Dict[str, Any]) -> int:
+def batch_update_timeseries(cache_data: Dict[str, Observation]) -> int:
     """Actualizar todas las timeseries desde el caché"""
     return timeseries_collector.batch_update_from_cache(cache_data)
 
@@ -240,16 +339,11 @@ if __name__ == "__main__":
     print("🧪 Probando sistema de timeseries...")
 
     # Simular datos de prueba
-    test_data = {
-        'temperatura': '22°C',
-        'precipitacion': '1.5 mm',
-        'humedad': '65%',
-        'viento': '12 km/h',
-        'presion': '1015 hPa',
-        'timestamp': datetime.now().isoformat(),
-        'source': 'Test Data',
-        'pronostico': [{'condicion': 'Parcialmente nublado'}]
-    }
+    test_data = Observation(
+        'CDMX', datetime.now().isoformat(), 'Test Data',
+        temp_max=22, precip=1.5, humidity=65, wind_speed=12, pressure=1015,
+        forecast=[ForecastDay('Hoy', sky='Parcialmente nublado')]
+    )
 
     # Agregar punto de prueba
     timeseries_collector.add_weather_point('cdmx', test_data)
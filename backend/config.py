@@ -15,9 +15,88 @@ class Config:
     PORT = int(os.getenv('BACKEND_PORT', 8000))
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     
+    # Modelo de concurrencia del servidor HTTP
+    # 'single': HTTPServer clásico (una petición a la vez)
+    # 'threaded': pool fijo de hilos con cola de conexiones acotada
+    # 'async': event loop asyncio (async_server.py) con consultas a SMN no bloqueantes
+    SERVER_MODE = os.getenv('SERVER_MODE', 'threaded').lower()
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', (os.cpu_count() or 1) * 4))
+    SERVER_ACCEPT_QUEUE = int(os.getenv('SERVER_ACCEPT_QUEUE', 64))
+    # Conexiones persistentes HTTP/1.1: segundos de inactividad y peticiones máximas por conexión.
+    # En modo threaded una conexión inactiva no ocupa un worker: espera en un selector y vuelve a la
+    # cola cuando llega la siguiente petición. El costo de un timeout largo es un descriptor abierto
+    # por conexión inactiva (acotado por KEEPALIVE_MAX_IDLE; pasado el tope se cierra tras responder).
+    # El timeout también acota la lectura de una petición ya iniciada, que sí ocupa su worker.
+    KEEPALIVE_TIMEOUT = float(os.getenv('KEEPALIVE_TIMEOUT', 15))
+    KEEPALIVE_MAX_REQUESTS = int(os.getenv('KEEPALIVE_MAX_REQUESTS', 100))
+    KEEPALIVE_MAX_IDLE = int(os.getenv('KEEPALIVE_MAX_IDLE', 1000))
+    # Procesos worker en el mismo puerto (SO_REUSEPORT); 1 = sin pre-fork
+    SERVER_PROCESSES = int(os.getenv('SERVER_PROCESSES', 1))
+    # Cada cuántos segundos los procesos seguidores revisan el snapshot del líder
+    SNAPSHOT_POLL_SECONDS = float(os.getenv('SNAPSHOT_POLL_SECONDS', 5))
+    # Control de admisión por petición: en curso, en espera y segundos máximos de espera.
+    # Excedidos los límites se responde 503 + Retry-After. ADMISSION_MAX_IN_FLIGHT=0 lo desactiva.
+    # En modo threaded quien espera ocupa un worker: el límite queda por debajo de SERVER_WORKERS para
+    # que sobren workers que respondan el 503 de inmediato, con una cola corta y una espera breve.
+    # En modo async la espera no ocupa hilos y la admisión protege solo al executor bloqueante:
+    # /api/pronostico consulta a SMN con coroutines y no cuenta contra el límite.
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT',
+                                            SERVER_WORKERS if SERVER_MODE == 'async' else SERVER_WORKERS - SERVER_WORKERS // 4))
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 128 if SERVER_MODE == 'async' else SERVER_WORKERS // 8))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 2 if SERVER_MODE == 'async' else 0.5))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+    # Rutas baratas que nunca se rechazan (sondas de orquestación); en modo threaded las atiende un
+    # worker propio, así que no esperan detrás de la cola general
+    ADMISSION_RESERVED_PATHS = os.getenv('ADMISSION_RESERVED_PATHS', '/health,/api,/api/').split(',')
+    # Server-Sent Events (/api/weather/stream)
+    SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_HISTORY = int(os.getenv('SSE_HISTORY', 32))  # eventos guardados para reanudar con Last-Event-ID
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 5000))
+    SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', 10000))
+    # Caché del proxy /api/pronostico (LRU + TTL de 75 minutos)
+    PRONOSTICO_CACHE_MAX_ENTRIES = int(os.getenv('PRONOSTICO_CACHE_MAX_ENTRIES', 1024))
+    PRONOSTICO_STALE_SECONDS = float(os.getenv('PRONOSTICO_STALE_SECONDS', 600))  # gracia sirviendo datos vencidos
+    PRONOSTICO_ERROR_TTL = float(os.getenv('PRONOSTICO_ERROR_TTL', 30))  # caché negativo de errores de SMN
+    # Índice local del pronóstico municipal: /api/pronostico responde (ides, idmun, ndia) desde memoria
+    # con los registros que ya descarga el colector (sus estados, una consulta a SMN por ciclo).
+    # FORECAST_INDEX_STATES: ides adicionales, separados por coma, que el índice descarga del feed nacional.
+    # Vacío (por defecto) solo se indexan los estados del colector (CDMX): las consultas de otros estados
+    # no se responden desde el índice y van al proxy en vivo con su caché TTL
+    FORECAST_INDEX_ENABLED = os.getenv('FORECAST_INDEX_ENABLED', 'true').lower() == 'true'
+    FORECAST_INDEX_FILE = os.getenv('FORECAST_INDEX_FILE', 'forecast_snapshot.json')
+    FORECAST_INDEX_STATES = [int(ides) for ides in os.getenv('FORECAST_INDEX_STATES', '').split(',') if ides.strip().isdigit()]
+    # /api/weather?lat=&lon=: estaciones más cercanas devueltas y distancia máxima a la más cercana
+    NEAREST_STATIONS_K = int(os.getenv('NEAREST_STATIONS_K', 3))
+    NEAREST_MAX_DISTANCE_KM = float(os.getenv('NEAREST_MAX_DISTANCE_KM', 50))
+    # Series de tiempo con al menos estos puntos se envían como JSON incremental (chunked)
+    # en lugar de renderizarse completas en memoria; 0 = siempre en streaming
+    TIMESERIES_STREAM_MIN_POINTS = int(os.getenv('TIMESERIES_STREAM_MIN_POINTS', 500))
+    
     # APIs externas
     CONAGUA_BASE_URL = "https://smn.conagua.gob.mx/es/"
     WEATHER_API_TIMEOUT = 30
+    # Cliente HTTP compartido hacia SMN (upstream_client.py)
+    UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', 4))  # hosts con pool propio
+    UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 16))  # conexiones keep-alive por host
+    UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', 2))
+    UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', 0.5))  # segundos base del backoff exponencial
+    # Actualización del colector: estados descargados en paralelo (una consulta a SMN por estado; las
+    # estaciones de un mismo estado comparten su descarga) y tiempo máximo de cada ciclo
+    COLLECTOR_MAX_STATE_FETCHES = int(os.getenv('COLLECTOR_MAX_STATE_FETCHES', 4))
+    COLLECTOR_REFRESH_DEADLINE = float(os.getenv('COLLECTOR_REFRESH_DEADLINE', 45))
+    # Reintentos de estaciones fallidas entre ciclos: backoff exponencial desde BASE hasta MAX segundos
+    STATION_RETRY_BASE_SECONDS = float(os.getenv('STATION_RETRY_BASE_SECONDS', 120))
+    STATION_RETRY_MAX_SECONDS = float(os.getenv('STATION_RETRY_MAX_SECONDS', 1800))
+    # Planificador de actualizaciones: jitter aleatorio sobre cada plazo y horas locales de publicación de SMN
+    # (HH:MM separadas por coma) tras las que se actualiza sin esperar al fin del intervalo
+    REFRESH_JITTER_SECONDS = float(os.getenv('REFRESH_JITTER_SECONDS', 30))
+    SMN_PUBLICATION_TIMES = os.getenv('SMN_PUBLICATION_TIMES', '06:00')
+    SMN_PUBLICATION_DELAY_SECONDS = float(os.getenv('SMN_PUBLICATION_DELAY_SECONDS', 600))
+    # Entradas del journal del colector antes de compactarlo en un snapshot nuevo
+    COLLECTOR_JOURNAL_MAX_ENTRIES = int(os.getenv('COLLECTOR_JOURNAL_MAX_ENTRIES', 256))
+    # Almacenamiento del colector y las series: 'json' (archivos) o 'sqlite' (WAL, sqlite_store.py)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'clima.db')
     
     # Configuración de caché
     CACHE_TIMEOUT = 75 * 60  # 75 minutos en segundos
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Fixtures compartidos de las pruebas del backend
+Author: EdbETO Solutions Team
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_workdir(tmp_path_factory):
+    """Directorio de trabajo temporal para toda la sesión.
+
+    El colector global y el índice de pronóstico escriben rutas relativas
+    (weather_cache.json, su .journal, forecast_snapshot.json): así nunca tocan
+    los archivos versionados de backend/. No se restaura al terminar porque
+    los hilos en segundo plano del colector pueden escribir hasta que sale el proceso.
+    """
+    workdir = tmp_path_factory.mktemp('workdir')
+    os.chdir(workdir)
+    return workdir
+
+@pytest.fixture
+def weather_snapshot(monkeypatch):
+    """Colector global con datos fijos y recientes: las rutas del API responden sin consultar a SMN"""
+    from conagua_collector import weather_collector
+    from weather_models import ForecastDay, Observation
+
+    weather_collector.stop_automatic_updates()
+    # Esperar a que termine un ciclo que otra prueba haya dejado en curso
+    with weather_collector._update_lock:
+        pass
+
+    now = datetime.now().replace(microsecond=0)
+    forecast = [ForecastDay(label, date=str(day), temp_max=22 + day, temp_min=11, sky='Medio nublado', precip=0.5,
+                            precip_prob=30, wind_speed=10, wind_direction='Norte')
+                for day, label in enumerate(('Hoy', 'Mañana', 'Pasado mañana'))]
+    cache_data = {
+        alcaldia: Observation(info['name'], now.isoformat(), 'SMN', temp_max=20 + i, temp_min=10, humidity=40 + i,
+                              wind_speed=12, wind_direction='Norte', precip=0, precip_prob=10, sky='Despejado',
+                              forecast=forecast)
+        for i, (alcaldia, info) in enumerate(weather_collector.cdmx_stations.items())
+    }
+    state = {'status': 'ok', 'updated_at': now.timestamp(), 'last_attempt': now.timestamp(), 'failures': 0, 'retry_at': None}
+    monkeypatch.setattr(weather_collector, 'cache_data', cache_data)
+    monkeypatch.setattr(weather_collector, 'station_state', {alcaldia: dict(state) for alcaldia in cache_data})
+    monkeypatch.setattr(weather_collector, 'last_update', now)
+    monkeypatch.setattr(weather_collector, 'data_modified', now)
+    # Sin restaurar: devolverla al valor anterior haría que la siguiente prueba reutilizara
+    # cuerpos renderizados en caché para otros datos con el mismo número de versión
+    weather_collector.data_version += 1
+    return weather_collector
+
+class FakeSMN:
+    """Respuestas de SMN por estado: registros de todos los municipios, salvo los indicados en missing"""
+
+    def __init__(self):
+        self.missing = set()
+        self.temp_max = 24
+        self.calls = []
+
+    def records(self, ides):
+        self.calls.append(ides)
+        return [
+            {'ides': ides, 'idmun': str(idmun), 'nes': 'Ciudad de México', 'nmun': f'Municipio {idmun}',
+             'ndia': str(ndia), 'tmax': str(self.temp_max + ndia), 'tmin': '11', 'cc': '45', 'velvien': '12',
+             'prec': '0.0', 'probprec': '20', 'desciel': 'Medio nublado', 'dirvienc': 'Norte', 'dirvieng': '10',
+             'dloc': '20261018T06'}
+            for idmun in range(2, 18) if idmun not in self.missing for ndia in range(3)
+        ]
+
+@pytest.fixture
+def fake_smn(monkeypatch):
+    """Sustituye la descarga por estado del colector (sin red)"""
+    from conagua_collector import ConaguaDataCollector
+
+    fake = FakeSMN()
+    monkeypatch.setattr(ConaguaDataCollector, 'fetch_state_records', lambda self, ides: fake.records(ides))
+    return fake
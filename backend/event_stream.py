@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Canal Server-Sent Events para el API de Clima CDMX
+El colector publica cada actualización una sola vez en el hub; los motores
+HTTP la reparten a todas las conexiones /api/weather/stream abiertas.
+Author: EdbETO Solutions Team
+"""
+
+import json
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config import config
+
+# Comentario SSE: mantiene viva la conexión a través de proxies y detecta clientes caídos
+HEARTBEAT_FRAME = b': ping\n\n'
+# Un cliente que acumula más de esto sin leer se desconecta (el navegador reconecta y reanuda)
+MAX_PENDING_BYTES = 256 * 1024
+
+def format_event(event_id: int, event: str, payload: Any) -> bytes:
+    """Serializar un evento SSE; el JSON compacto cabe en una sola línea 'data:'"""
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n".encode('utf-8')
+
+def retry_frame(retry_ms: int = config.SSE_RETRY_MS) -> bytes:
+    """Tiempo de reconexión sugerido al EventSource del navegador"""
+    return f"retry: {int(retry_ms)}\n\n".encode('utf-8')
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID enviado por el navegador al reconectar (None si falta o es inválido)"""
+    if value is None:
+        return None
+    value = value.strip()
+    return int(value) if value.isdigit() else None
+
+class WeatherEventHub:
+    """Historial corto de eventos y suscriptores (uno por motor HTTP, no por cliente).
+
+    Los ids de evento son crecientes; un cliente que reconecta con el id
+    vigente o con uno presente en el historial recibe solo lo que se perdió.
+    Si el id ya salió del historial se le envía de nuevo el snapshot completo.
+    """
+
+    def __init__(self, history: int = 32):
+        # (id, id del estado anterior, frame): un cliente con el estado anterior puede reanudar
+        self._history: Deque[Tuple[int, Optional[int], bytes]] = deque(maxlen=history)
+        self._current_id: Optional[int] = None
+        self._subscribers: List[Callable[[int, bytes], None]] = []
+        self._snapshot: Optional[Tuple[int, bytes]] = None
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, deliver: Callable[[int, bytes], None]) -> None:
+        with self._lock:
+            self._subscribers.append(deliver)
+
+    def unsubscribe(self, deliver: Callable[[int, bytes], None]) -> None:
+        with self._lock:
+            if deliver in self._subscribers:
+                self._subscribers.remove(deliver)
+
+    def publish(self, event_id: int, event: str, payload: Any) -> None:
+        frame = format_event(event_id, event, payload)
+        with self._lock:
+            self._history.append((event_id, self._current_id, frame))
+            self._current_id = event_id
+            self.published += 1
+            subscribers = list(self._subscribers)
+        for deliver in subscribers:
+            try:
+                deliver(event_id, frame)
+            except Exception as e:
+                print(f"❌ Error entregando evento {event_id}: {e}")
+
+    def backlog_since(self, last_event_id: Optional[int], current_id: int) -> Optional[List[Tuple[int, bytes]]]:
+        """Eventos posteriores a last_event_id; None si hay que reenviar el snapshot"""
+        if last_event_id is None:
+            return None
+        if last_event_id == current_id:
+            # El cliente ya tiene el estado vigente (p. ej. reconecta tras reiniciar el servidor)
+            return []
+        with self._lock:
+            known = {base_id for _, base_id, _ in self._history} | {event_id for event_id, _, _ in self._history}
+            if last_event_id not in known:
+                return None
+            return [(event_id, frame) for event_id, _, frame in self._history if event_id > last_event_id]
+
+    def snapshot(self, event_id: int, build: Callable[[], Any]) -> bytes:
+        """Evento 'snapshot' para clientes nuevos, serializado una vez por id"""
+        with self._lock:
+            if self._snapshot is not None and self._snapshot[0] == event_id:
+                return self._snapshot[1]
+        frame = format_event(event_id, 'snapshot', build())
+        with self._lock:
+            self._snapshot = (event_id, frame)
+            if self._current_id is None or event_id > self._current_id:
+                self._current_id = event_id
+        return frame
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'published': self.published,
+                'history': len(self._history),
+                'last_event_id': self._current_id
+            }
+
+class _StreamClient:
+    __slots__ = ('sock', 'pending', 'last_id')
+
+    def __init__(self, sock: socket.socket, initial: bytes, last_id: Optional[int]):
+        self.sock = sock
+        self.pending = bytearray(initial)
+        self.last_id = last_id
+
+class SSEBroadcaster:
+    """Un solo hilo con selectors para todas las conexiones SSE del motor con hilos.
+
+    El worker que atiende la petición escribe los headers y entrega el socket;
+    a partir de ahí la conexión no ocupa ningún hilo del pool.
+    """
+
+    def __init__(self, hub: WeatherEventHub, heartbeat: float = config.SSE_HEARTBEAT_SECONDS,
+                 max_clients: int = config.SSE_MAX_CLIENTS):
+        self.hub = hub
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._clients: Dict[socket.socket, _StreamClient] = {}
+        self._incoming: List[_StreamClient] = []
+        self._outbox: List[Tuple[int, bytes]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.hub.subscribe(self.deliver)
+            self._thread = threading.Thread(target=self._loop, name="sse-broadcaster", daemon=True)
+            self._thread.start()
+
+    def has_capacity(self) -> bool:
+        return len(self._clients) + len(self._incoming) < self.max_clients
+
+    def add(self, sock: socket.socket, initial: bytes, last_id: Optional[int]) -> None:
+        """Adoptar un socket con la respuesta ya iniciada"""
+        self.start()
+        sock.setblocking(False)
+        with self._lock:
+            self._incoming.append(_StreamClient(sock, initial, last_id))
+        self._wake()
+
+    def deliver(self, event_id: int, frame: bytes) -> None:
+        """Suscriptor del hub: se llama desde el hilo del colector"""
+        with self._lock:
+            self._outbox.append((event_id, frame))
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _loop(self) -> None:
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while True:
+            timeout = max(0.0, next_heartbeat - time.monotonic())
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    continue
+                client = self._clients.get(key.fileobj)
+                if client is None:
+                    continue
+                try:
+                    # El cliente no envía nada después de la petición: EOF significa que cerró
+                    if not client.sock.recv(4096):
+                        self._drop(client)
+                        continue
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self._drop(client)
+                    continue
+                self._flush(client)
+
+            with self._lock:
+                incoming, self._incoming = self._incoming, []
+                outbox, self._outbox = self._outbox, []
+            for client in incoming:
+                self._clients[client.sock] = client
+                self._selector.register(client.sock, selectors.EVENT_READ)
+
+            heartbeat_due = time.monotonic() >= next_heartbeat
+            if heartbeat_due:
+                next_heartbeat = time.monotonic() + self.heartbeat
+
+            for client in list(self._clients.values()):
+                for event_id, frame in outbox:
+                    # Un evento pudo llegar ya en el backlog inicial del cliente
+                    if client.last_id is None or event_id > client.last_id:
+                        client.pending += frame
+                        client.last_id = event_id
+                if heartbeat_due and not client.pending:
+                    client.pending += HEARTBEAT_FRAME
+                self._flush(client)
+
+    def _flush(self, client: _StreamClient) -> None:
+        if client.sock not in self._clients:
+            return
+        if client.pending:
+            try:
+                sent = client.sock.send(client.pending)
+                del client.pending[:sent]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._drop(client)
+                return
+        if len(client.pending) > MAX_PENDING_BYTES:
+            self._drop(client)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.pending else 0)
+        self._selector.modify(client.sock, events)
+
+    def _drop(self, client: _StreamClient) -> None:
+        self._clients.pop(client.sock, None)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+        self.dropped += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'engine': 'threaded', 'clients': len(self._clients), 'dropped': self.dropped}
+
+# Instancia global del hub (una por proceso; en pre-fork cada proceso la alimenta desde su colector)
+weather_event_hub = WeatherEventHub(history=config.SSE_HISTORY)
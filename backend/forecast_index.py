@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Índice local del pronóstico municipal de SMN para /api/pronostico
+En el proceso líder los estados que atiende el colector llegan de su
+propia ingesta (ingest, una sola descarga de SMN por estado y ciclo); solo
+los estados adicionales de FORECAST_INDEX_STATES se descargan aquí, en
+streaming con smn_ingest. Todo se indexa por (ides, idmun, ndia) y se
+guarda en disco; los seguidores pre-fork recargan ese snapshot. Cada
+consulta al proxy es una búsqueda en un dict en memoria en lugar de un
+viaje a SMN por clave.
+Author: EdbETO Solutions Team
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from refresh_scheduler import RefreshScheduler
+from smn_ingest import READ_SIZE, ingest_records
+from upstream_client import upstream_client
+from weather_models import to_int
+
+IndexKey = Tuple[int, int, int]
+
+def _group_by_state(records: Iterable[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for record in records:
+        state = to_int(record.get('ides'))
+        if state is not None:
+            grouped.setdefault(state, []).append(record)
+    return grouped
+
+class IndexSnapshot:
+    """Versión inmutable del índice.
+
+    Se construye completa y se publica con una sola asignación de referencia:
+    quien la toma ve claves, cobertura, fecha y versión de la misma descarga.
+    """
+
+    __slots__ = ('entries', 'states', 'pairs', 'fetched_at', 'version')
+
+    def __init__(self, entries: Dict[IndexKey, Dict[str, Any]], fetched_at: Optional[float], version: int):
+        # Nunca se modifica después de construirse
+        self.entries = entries
+        self.states: FrozenSet[int] = frozenset(key[0] for key in entries)
+        self.pairs: FrozenSet[Tuple[int, int]] = frozenset(key[:2] for key in entries)
+        self.fetched_at = fetched_at
+        self.version = version
+
+    def lookup(self, ides: Optional[int], idmun: Optional[int], ndia: Optional[int] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(cubierta, registro). Sin ndia se usa el día 0.
+
+        cubierta=False si el índice no puede responder la clave (falta ides o
+        idmun, municipio fuera del snapshot o índice aún vacío) y debe ir al
+        proxy en vivo; registro=None si el municipio está en el índice pero
+        SMN no publicó ese día.
+        """
+        if ides is None or idmun is None or (ides, idmun) not in self.pairs:
+            return False, None
+        return True, self.entries.get((ides, idmun, 0 if ndia is None else ndia))
+
+class ForecastIndex:
+    """Snapshot del pronóstico municipal indexado por (ides, idmun, ndia)"""
+
+    def __init__(self, url: str, snapshot_file: str, refresh_interval: float, states: Iterable[int] = (),
+                 headers: Optional[Dict[str, str]] = None, timeout: float = 30, poll_interval: float = 5,
+                 jitter: float = 0):
+        self.url = url
+        self.snapshot_file = snapshot_file
+        self.refresh_interval = refresh_interval
+        # Estados adicionales que el índice descarga por su cuenta del feed nacional (vacío = ninguno)
+        self.states_filter: Set[int] = set(states)
+        # Estados que llegan por ingest() desde la ingesta del colector; nunca se descargan aquí
+        self.fed_states: Set[int] = set()
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        # Versión publicada: cada recarga construye una nueva y la reemplaza con una sola asignación
+        self.snapshot = IndexSnapshot({}, None, 0)
+        # Registros vigentes por estado (solo los modifica quien tiene _refresh_lock)
+        self._records: Dict[int, List[Dict[str, Any]]] = {}
+        # Última descarga propia (la ingesta del colector no adelanta ni atrasa este plazo)
+        self.refreshed_at: Optional[float] = None
+        self.is_follower = False
+        self.last_error: Optional[str] = None
+        self.last_ingest: Optional[Dict[str, Any]] = None
+        self._snapshot_mtime: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self.scheduler = RefreshScheduler(self._scheduled_refresh, self._next_deadline, jitter=jitter,
+                                          name='forecast-index-scheduler')
+
+    # --- Consulta ---
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    @property
+    def fetched_at(self) -> Optional[float]:
+        return self.snapshot.fetched_at
+
+    def lookup(self, ides: Optional[int], idmun: Optional[int], ndia: Optional[int] = None) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Búsqueda en la versión publicada (ver IndexSnapshot.lookup)"""
+        return self.snapshot.lookup(ides, idmun, ndia)
+
+    def seconds_until_refresh(self, snapshot: Optional[IndexSnapshot] = None) -> float:
+        fetched_at = (snapshot or self.snapshot).fetched_at
+        if fetched_at is None:
+            return 0
+        return max(0.0, fetched_at + self.refresh_interval - time.time())
+
+    # --- Actualización (proceso líder) ---
+
+    def own_states(self) -> Set[int]:
+        """Estados que el índice descarga por su cuenta (los del colector se reciben por ingest)"""
+        return self.states_filter - self.fed_states
+
+    def feed_from(self, states: Iterable[int]) -> None:
+        """Declarar los estados que llenará la ingesta del colector (antes de start)"""
+        self.fed_states = set(states)
+
+    def ingest(self, ides: Any, records: List[Dict[str, Any]]) -> None:
+        """Registros de un estado ya descargados por el colector: reemplazan los de ese estado"""
+        state = to_int(ides)
+        if state is None or state not in self.fed_states or self.is_follower:
+            return
+        # Una consulta acotada al estado puede traer registros sin ides
+        records = [record if to_int(record.get('ides')) is not None else dict(record, ides=str(state))
+                   for record in records]
+        with self._refresh_lock:
+            # SMN publica pocas veces al día: una ingesta igual a la vigente no reescribe el snapshot
+            if self._records.get(state) == records:
+                return
+            self._records[state] = records
+            self._install(self._records, time.time())
+            self._save()
+        print(f"🗂️ Índice de pronóstico: estado {state} desde la ingesta del colector ({len(records)} registros)")
+
+    def refresh(self) -> bool:
+        """Descargar el feed nacional para los estados propios y guardar el snapshot. Conserva el anterior si falla"""
+        states = self.own_states()
+        if not states:
+            return True
+        with self._refresh_lock:
+            try:
+                print(f"📡 Descargando pronóstico municipal para el índice local...")
+                response = upstream_client.get(self.url, headers=self.headers, timeout=self.timeout, stream=True)
+                try:
+                    response.raise_for_status()
+                    records, stats = ingest_records(
+                        response.iter_content(READ_SIZE), lambda record: to_int(record.get('ides')) in states
+                    )
+                finally:
+                    response.close()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Error actualizando índice de pronóstico: {e}")
+                return False
+
+            self.last_ingest = stats
+            self.last_error = None
+            fresh = _group_by_state(records)
+            self.refreshed_at = time.time()
+            if all(self._records.get(state) == fresh.get(state) for state in states):
+                print(f"🗂️ Índice de pronóstico sin cambios ({stats['records_scanned']} registros en {stats['ms']:.0f} ms)")
+                return True
+            for state in states:
+                self._records.pop(state, None)
+            self._records.update(fresh)
+            self._install(self._records, self.refreshed_at)
+            self._save()
+            snapshot = self.snapshot
+            print(f"🗂️ Índice de pronóstico: {len(snapshot.entries)} claves de {len(snapshot.states)} estados "
+                  f"({stats['records_scanned']} registros en {stats['ms']:.0f} ms)")
+            return True
+
+    def _install(self, records: Dict[int, List[Dict[str, Any]]], fetched_at: float) -> None:
+        index: Dict[IndexKey, Dict[str, Any]] = {}
+        for state_records in records.values():
+            for record in state_records:
+                key = (to_int(record.get('ides')), to_int(record.get('idmun')), to_int(record.get('ndia')))
+                if None not in key:
+                    index[key] = record
+        self.snapshot = IndexSnapshot(index, fetched_at, self.snapshot.version + 1)
+
+    def _save(self) -> None:
+        """Snapshot compacto escrito a un temporal y renombrado (los seguidores nunca leen uno a medias)"""
+        try:
+            tmp_file = f"{self.snapshot_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                records = [record for state_records in self._records.values() for record in state_records]
+                json.dump({'fetched_at': self.fetched_at, 'records': records}, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+            self._snapshot_mtime = os.stat(self.snapshot_file).st_mtime_ns
+        except OSError as e:
+            print(f"❌ Error guardando snapshot de pronóstico: {e}")
+
+    def load(self) -> bool:
+        """Cargar el snapshot en disco si cambió desde la última lectura"""
+        try:
+            mtime = os.stat(self.snapshot_file).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._snapshot_mtime:
+            return False
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            records = _group_by_state(snapshot.get('records', []))
+            self._install(records, snapshot.get('fetched_at') or time.time())
+            self._records = records
+            if self.refreshed_at is None:
+                self.refreshed_at = self.fetched_at
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error cargando snapshot de pronóstico: {e}")
+            return False
+        self._snapshot_mtime = mtime
+        print(f"🗂️ Índice de pronóstico cargado: {len(self.snapshot.entries)} claves (pid {os.getpid()})")
+        return True
+
+    def _next_deadline(self) -> Tuple[Optional[float], str]:
+        if self.refreshed_at is None:
+            return time.time(), 'initial'
+        return self.refreshed_at + self.refresh_interval, 'interval'
+
+    def _scheduled_refresh(self, reason: str) -> None:
+        self.refresh()
+
+    def start(self) -> None:
+        """Proceso líder: partir del snapshot en disco y refrescarlo una vez por ciclo"""
+        self.is_follower = False
+        self.load()
+        if self.own_states():
+            self.scheduler.start()
+
+    def follow(self) -> None:
+        """Proceso seguidor: no consultar a SMN y recargar el snapshot del líder cuando cambie"""
+        self.is_follower = True
+        self._stop_event.clear()
+
+        def follow_loop() -> None:
+            # La recarga ocurre en este hilo: las búsquedas (también las del event loop async) nunca esperan al disco
+            while not self._stop_event.is_set():
+                self.load()
+                self._stop_event.wait(self.poll_interval)
+
+        threading.Thread(target=follow_loop, name='forecast-index-follower', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.scheduler.stop()
+
+    def get_status(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            'role': 'follower' if self.is_follower else 'leader',
+            'keys': len(snapshot.entries),
+            'states': len(snapshot.states),
+            'fed_states': sorted(self.fed_states),
+            'own_states': sorted(self.own_states()),
+            'version': snapshot.version,
+            'fetched_at': datetime.fromtimestamp(snapshot.fetched_at).isoformat() if snapshot.fetched_at else None,
+            'refresh_interval_seconds': self.refresh_interval,
+            'last_error': self.last_error,
+            'last_ingest': self.last_ingest,
+            'scheduler': self.scheduler.status() if not self.is_follower else None
+        }
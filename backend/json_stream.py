@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Codificación JSON incremental para respuestas grandes del API de Clima CDMX
+Produce los mismos bytes que json.dumps(indent=2, ensure_ascii=False), pero
+en fragmentos: las listas se recorren elemento por elemento desde su origen y
+nunca existe el documento completo en memoria.
+Author: EdbETO Solutions Team
+"""
+
+import json
+from typing import Any, Iterable, Iterator, List, Tuple
+
+# Tamaño mínimo de cada fragmento escrito al socket
+CHUNK_SIZE = 16 * 1024
+
+def _dumps(value: Any, level: int) -> str:
+    text = json.dumps(value, indent=2, ensure_ascii=False)
+    return text.replace('\n', '\n' + '  ' * level) if level else text
+
+def _iter_pieces(fields: List[Tuple[str, Any]]) -> Iterator[str]:
+    if not fields:
+        yield '{}'
+        return
+    yield '{'
+    for i, (key, value) in enumerate(fields):
+        yield (',' if i else '') + '\n  ' + json.dumps(key, ensure_ascii=False) + ': '
+        if isinstance(value, Iterator):
+            first = True
+            for item in value:
+                yield ('[' if first else ',') + '\n    ' + _dumps(item, 2)
+                first = False
+            yield '[]' if first else '\n  ]'
+        else:
+            yield _dumps(value, 1)
+    yield '\n}'
+
+def iter_json_object(fields: List[Tuple[str, Any]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Objeto JSON a partir de pares (clave, valor) en orden.
+
+    Los valores que son iteradores se emiten como listas, consumiéndolos de
+    forma perezosa; el resto se serializa completo. La salida se agrupa en
+    fragmentos de al menos chunk_size bytes.
+    """
+    buffer: List[bytes] = []
+    size = 0
+    for piece in _iter_pieces(fields):
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def is_streamed(body: Any) -> bool:
+    """True si el cuerpo de una respuesta es un iterable de fragmentos y no bytes"""
+    return not isinstance(body, (bytes, bytearray))
+
+def chunked_frames(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Enmarcar fragmentos con Transfer-Encoding: chunked (incluye el fragmento final vacío)"""
+    for chunk in chunks:
+        if chunk:
+            yield b'%x\r\n%s\r\n' % (len(chunk), chunk)
+    yield b'0\r\n\r\n'
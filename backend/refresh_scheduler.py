@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Planificador de actualizaciones del colector por plazos exactos
+Un hilo duerme en un Condition hasta el siguiente plazo (fin del intervalo,
+publicación de SMN o reintento de una estación) en lugar de despertar cada
+5 minutos a revisar. trigger() y stop() lo despiertan de inmediato.
+Author: EdbETO Solutions Team
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Espera máxima entre revisiones del reloj de pared (cubre ajustes de hora del sistema)
+MAX_WAIT_SECONDS = 600
+# Si tras ejecutar el job el plazo sigue vencido (p. ej. el job falló), se espera esto antes de repetirlo
+MIN_RERUN_SECONDS = 60
+
+def parse_publication_times(value: str) -> List[Tuple[int, int]]:
+    """'06:00,18:30' -> [(6, 0), (18, 30)]; entradas inválidas se ignoran"""
+    times = []
+    for item in value.split(','):
+        hour, _, minute = item.strip().partition(':')
+        try:
+            parsed = (int(hour), int(minute or 0))
+        except ValueError:
+            continue
+        if 0 <= parsed[0] < 24 and 0 <= parsed[1] < 60:
+            times.append(parsed)
+    return sorted(times)
+
+def next_publication_time(after: float, times: List[Tuple[int, int]], delay: float = 0) -> Optional[float]:
+    """Primera publicación (hora local + delay segundos) posterior a `after`, como timestamp"""
+    if not times:
+        return None
+    day = datetime.fromtimestamp(after).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in (0, 1):
+        for hour, minute in times:
+            candidate = (day + timedelta(days=offset, hours=hour, minutes=minute)).timestamp() + delay
+            if candidate > after:
+                return candidate
+    return None
+
+class RefreshScheduler:
+    """Ejecuta job(motivo) en cada plazo que entrega next_deadline(), o al llamar trigger()"""
+
+    def __init__(self, job: Callable[[str], None], next_deadline: Callable[[], Tuple[Optional[float], str]],
+                 jitter: float = 0, name: str = 'refresh-scheduler'):
+        self._job = job
+        self._next_deadline = next_deadline
+        self.jitter = jitter
+        self.name = name
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._deadline: Optional[float] = None
+        self._reason: Optional[str] = None
+        self._triggered: Optional[str] = None
+        self.runs = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    def start(self) -> None:
+        with self._cond:
+            if self.running:
+                return
+            self._stopping = False
+            self._plan()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Detener el hilo sin esperar al siguiente plazo (un job en curso termina primero)"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def trigger(self, reason: str = 'manual') -> bool:
+        """Ejecutar el job lo antes posible. Retorna False si el planificador no está corriendo"""
+        with self._cond:
+            if not self.running:
+                return False
+            self._triggered = reason
+            self._cond.notify_all()
+            return True
+
+    def reschedule(self) -> None:
+        """Recalcular el siguiente plazo (p. ej. tras una actualización hecha fuera del planificador)"""
+        with self._cond:
+            self._plan()
+            self._cond.notify_all()
+
+    def _plan(self, not_before: Optional[float] = None) -> None:
+        deadline, reason = self._next_deadline()
+        if deadline is not None and not_before is not None:
+            deadline = max(deadline, not_before)
+        # El jitter reparte en el tiempo las consultas de varias instancias; un plazo ya vencido no se retrasa
+        if deadline is not None and self.jitter and deadline > time.time():
+            deadline += random.uniform(0, self.jitter)
+        self._deadline, self._reason = deadline, reason
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    if self._triggered is not None:
+                        reason, planned = self._triggered, None
+                        self._triggered = None
+                        break
+                    delay = self._deadline - time.time() if self._deadline is not None else None
+                    if delay is not None and delay <= 0:
+                        reason, planned = self._reason, self._deadline
+                        break
+                    self._cond.wait(min(delay, MAX_WAIT_SECONDS) if delay is not None else MAX_WAIT_SECONDS)
+
+            started = time.time()
+            try:
+                self._job(reason)
+            except Exception as e:
+                print(f"❌ Error en actualización programada ({reason}): {e}")
+
+            with self._cond:
+                self.runs += 1
+                self.last_run = {
+                    'reason': reason,
+                    'started_at': datetime.fromtimestamp(started).isoformat(),
+                    # Retraso respecto al plazo planeado (None si fue disparada a demanda)
+                    'lateness_ms': round((started - planned) * 1000) if planned is not None else None,
+                    'duration_ms': round((time.time() - started) * 1000)
+                }
+                self._plan(not_before=time.time() + MIN_RERUN_SECONDS)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'running': self.running,
+                'next_run_at': datetime.fromtimestamp(self._deadline).isoformat() if self._deadline is not None else None,
+                'next_reason': self._reason,
+                'jitter_seconds': self.jitter,
+                'runs': self.runs,
+                'last_run': self.last_run
+            }
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Caché de respuestas pre-serializadas para el API de Clima CDMX
+Los cuerpos JSON se renderizan una vez por versión de datos y se guardan como
+bytes listos para escribir en el socket, junto con su variante comprimida.
+Author: EdbETO Solutions Team
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+# Codificaciones de contenido que el servidor sabe producir, en orden de preferencia
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+COMPRESSION_LEVEL = 6
+# Por debajo de este tamaño la cabecera gzip y el costo de CPU no compensan
+COMPRESSION_MIN_BYTES = 512
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """Comprimir un cuerpo con el content-coding indicado ('deflate' = formato zlib, RFC 9110)"""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=COMPRESSION_LEVEL)
+    if encoding == 'deflate':
+        return zlib.compress(body, COMPRESSION_LEVEL)
+    raise ValueError(f"Codificación no soportada: {encoding}")
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Comprimir un flujo de fragmentos de forma incremental, sin juntarlo en memoria"""
+    if encoding not in ('gzip', 'deflate'):
+        raise ValueError(f"Codificación no soportada: {encoding}")
+    # wbits 31 = contenedor gzip; 15 = formato zlib
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+class RenderedBody:
+    """Cuerpo JSON renderizado una sola vez; cada variante comprimida se calcula al primer uso y se conserva"""
+
+    __slots__ = ('identity', 'encoded', 'digest')
+
+    def __init__(self, payload: Any):
+        self.identity: bytes = json.dumps(payload, indent=2, ensure_ascii=False).encode('utf-8')
+        self.encoded: Dict[str, bytes] = {}
+        self.digest: str = body_digest(self.identity)
+
+    def select(self, encoding: str) -> Tuple[str, bytes]:
+        """(codificación efectiva, bytes) para la codificación negociada"""
+        if encoding == 'identity' or len(self.identity) < COMPRESSION_MIN_BYTES:
+            return 'identity', self.identity
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = compress_body(self.identity, encoding)
+            self.encoded[encoding] = body
+        return encoding, body
+
+    def etag_for(self, encoding: str) -> str:
+        """ETag fuerte por representación: cada content-coding tiene su propio validador"""
+        return make_etag(self.digest, encoding)
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + sum(len(body) for body in self.encoded.values())
+
+def body_digest(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()[:20]
+
+def make_etag(digest: str, encoding: str = 'identity', weak: bool = False) -> str:
+    tag = digest if encoding in ('identity', None) else f"{digest}-{encoding}"
+    return f'W/"{tag}"' if weak else f'"{tag}"'
+
+def http_date(moment: datetime) -> str:
+    """Fecha HTTP (RFC 7231) a partir de un datetime local sin zona"""
+    return formatdate(moment.timestamp(), usegmt=True)
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (la que aplica a GET)"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def is_not_modified(request_headers, etag: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """Evaluar If-None-Match / If-Modified-Since (If-None-Match tiene prioridad)"""
+    if request_headers is None:
+        return False
+
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    if_modified_since = request_headers.get('If-Modified-Since')
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # Las fechas HTTP tienen resolución de segundos
+        return int(last_modified.timestamp()) <= int(since.timestamp())
+    return False
+
+def negotiate_encoding(accept_encoding: Optional[str], available=SUPPORTED_ENCODINGS) -> str:
+    """Elegir codificación según Accept-Encoding (respeta q=0); 'identity' por defecto"""
+    if not accept_encoding:
+        return 'identity'
+
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    best, best_q = 'identity', 0.0
+    for encoding in available:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+class VersionedRenderCache:
+    """Cuerpos pre-renderizados por clave, válidos mientras no cambie su versión.
+
+    Cada clave guarda solo la versión más reciente: cuando los datos cambian
+    la entrada se vuelve a renderizar en la siguiente petición. Con
+    max_entries el número de claves queda acotado (se descarta la menos usada).
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, RenderedBody]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+
+    def get(self, key: Hashable, version: Hashable, render: Callable[[], Any]) -> RenderedBody:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        rendered = RenderedBody(render())
+        with self._lock:
+            self._entries[key] = (version, rendered)
+            self._entries.move_to_end(key)
+            self.renders += 1
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return rendered
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = sum(rendered.size for _, rendered in self._entries.values())
+            return {'entries': len(self._entries), 'renders': self.renders, 'hits': self.hits, 'bytes': size}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Ingesta en streaming del pronóstico municipal de SMN
+El cuerpo se lee por bloques, se descomprime de forma incremental (el
+servicio puede entregar el archivo .gz nacional tal cual) y cada registro
+del arreglo JSON se decodifica por separado: solo se conservan los de los
+estados y municipios que atendemos, así que la memoria y el tiempo de
+parseo dependen de lo que servimos y no del tamaño del feed nacional.
+Author: EdbETO Solutions Team
+"""
+
+import codecs
+import json
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from weather_models import to_int
+
+# Bytes pedidos al socket por lectura
+READ_SIZE = 64 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Separadores entre elementos del arreglo
+_SEPARATORS = re.compile(r'[\s,]*')
+
+def iter_decompressed(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Quitar la capa gzip del cuerpo si la trae; un cuerpo sin comprimir pasa tal cual.
+
+    El Content-Encoding HTTP ya lo resuelve requests: esto cubre el archivo
+    .gz servido como application/gzip. Lanza ValueError si el gzip está dañado.
+    """
+    head = b''
+    decompressor = None
+    chunks = iter(chunks)
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= len(GZIP_MAGIC):
+            break
+    if not head:
+        return
+    if head.startswith(GZIP_MAGIC):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        for chunk in _prepend(head, chunks):
+            if decompressor is None:
+                yield chunk
+                continue
+            # max_length acota cada bloque descomprimido: un .gz muy comprimible no infla la memoria
+            data = decompressor.decompress(chunk, READ_SIZE)
+            while data:
+                yield data
+                data = decompressor.decompress(decompressor.unconsumed_tail, READ_SIZE)
+        if decompressor is not None:
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+    except zlib.error as e:
+        raise ValueError(f"gzip inválido: {e}") from e
+
+def _prepend(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
+
+def iter_json_records(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Objetos de un arreglo JSON en bytes UTF-8, decodificados uno por uno conforme llegan.
+
+    También acepta {'municipal': [...]} (se decodifica completo). Lanza
+    ValueError si el JSON está incompleto o mal formado.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] == '{':
+                    yield from _wrapped_records(buffer[pos:] + ''.join(text.decode(chunk) for chunk in chunks)
+                                                + text.decode(b'', final=True))
+                    return
+                if buffer[pos] != '[':
+                    raise ValueError(f"se esperaba un arreglo JSON, llegó {buffer[pos]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Registro cortado entre dos bloques: se completa con el siguiente
+                if eof:
+                    raise
+            else:
+                if isinstance(record, dict):
+                    yield record
+                continue
+        if eof:
+            raise ValueError("JSON incompleto" if started else "respuesta vacía")
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer = buffer[pos:] + text.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+
+def _wrapped_records(document: str) -> Iterator[Dict[str, Any]]:
+    data = json.loads(document)
+    records = data.get('municipal', []) if isinstance(data, dict) else None
+    if not isinstance(records, list):
+        raise ValueError("formato de datos inválido")
+    return (record for record in records if isinstance(record, dict))
+
+def _counted(chunks: Iterable[bytes], stats: Dict[str, Any], key: str) -> Iterator[bytes]:
+    for chunk in chunks:
+        stats[key] += len(chunk)
+        yield chunk
+
+def record_filter(ides: Optional[int], municipios: Optional[Set[int]]) -> Callable[[Dict[str, Any]], bool]:
+    """Predicado sobre registros de SMN: estado ides (None = cualquiera) y municipios (None = todos)"""
+    def keep(record: Dict[str, Any]) -> bool:
+        if ides is not None:
+            record_ides = to_int(record.get('ides'))
+            # Sin ides el registro viene de una consulta ya acotada al estado
+            if record_ides is not None and record_ides != ides:
+                return False
+        return municipios is None or to_int(record.get('idmun')) in municipios
+    return keep
+
+def ingest_records(chunks: Iterable[bytes], keep: Callable[[Dict[str, Any]], bool]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Registros que cumplen keep, con estadísticas de la ingesta (bytes, registros, tiempo)"""
+    started = time.monotonic()
+    stats = {'bytes_received': 0, 'bytes_decoded': 0, 'records_scanned': 0, 'records_kept': 0}
+    records = []
+    decoded = _counted(iter_decompressed(_counted(chunks, stats, 'bytes_received')), stats, 'bytes_decoded')
+    for record in iter_json_records(decoded):
+        stats['records_scanned'] += 1
+        if keep(record):
+            records.append(record)
+    stats['records_kept'] = len(records)
+    stats['ms'] = round((time.monotonic() - started) * 1000, 1)
+    return records, stats
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Índice espacial de estaciones para consultas por coordenadas
+Un KD-tree 2D sobre una proyección equirectangular (km) centrada en las
+estaciones: cada consulta de las k más cercanas recorre O(log n) nodos.
+Las distancias reportadas son de círculo máximo (haversine).
+Author: EdbETO Solutions Team
+"""
+
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+# Exponente del peso por distancia inversa (1/d^p)
+IDW_POWER = 2
+# Más cerca que esto la consulta se considera sobre la estación (peso 1)
+SAME_POINT_KM = 0.05
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class _Node:
+    __slots__ = ('point', 'item', 'axis', 'left', 'right')
+
+    def __init__(self, point: Tuple[float, float], item: Any, axis: int):
+        self.point = point
+        self.item = item
+        self.axis = axis
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+
+class KDTree:
+    """KD-tree de puntos 2D con consulta de los k vecinos más cercanos (distancia euclidiana)"""
+
+    def __init__(self, points: Sequence[Tuple[Tuple[float, float], Any]]):
+        self.size = len(points)
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points: List[Tuple[Tuple[float, float], Any]], depth: int) -> Optional[_Node]:
+        if not points:
+            return None
+        axis = depth % 2
+        points.sort(key=lambda entry: entry[0][axis])
+        median = len(points) // 2
+        node = _Node(points[median][0], points[median][1], axis)
+        node.left = self._build(points[:median], depth + 1)
+        node.right = self._build(points[median + 1:], depth + 1)
+        return node
+
+    def nearest(self, x: float, y: float, k: int = 1) -> List[Tuple[float, Any]]:
+        """[(distancia², item)] de los k puntos más cercanos, del más cercano al más lejano"""
+        if k <= 0:
+            return []
+        # Heap de máximos (distancias negadas) con los k mejores hasta ahora
+        best: List[Tuple[float, int, Any]] = []
+        counter = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            dx, dy = node.point[0] - x, node.point[1] - y
+            distance = dx * dx + dy * dy
+            if len(best) < k:
+                heapq.heappush(best, (-distance, counter, node.item))
+                counter += 1
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, counter, node.item))
+                counter += 1
+            diff = (x, y)[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            # La rama lejana solo puede mejorar el resultado si el plano divisorio está dentro del radio actual
+            if far is not None and (len(best) < k or diff * diff < -best[0][0]):
+                stack.append(far)
+            stack.append(near)
+        return sorted((-negated, item) for negated, _, item in best)
+
+class StationLocator:
+    """Estaciones más cercanas a unas coordenadas, con pesos por distancia inversa"""
+
+    def __init__(self, stations: Dict[str, Dict[str, Any]]):
+        located = {key: info for key, info in stations.items() if 'lat' in info and 'lon' in info}
+        if located:
+            self.ref_lat = sum(info['lat'] for info in located.values()) / len(located)
+        else:
+            self.ref_lat = 0.0
+        self._cos_ref = math.cos(math.radians(self.ref_lat))
+        self.stations = located
+        self.tree = KDTree([(self._project(info['lat'], info['lon']), key) for key, info in located.items()])
+
+    def _project(self, lat: float, lon: float) -> Tuple[float, float]:
+        # A escala de una ciudad la proyección equirectangular conserva el orden de las distancias
+        km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+        return lon * self._cos_ref * km_per_degree, lat * km_per_degree
+
+    def nearest(self, lat: float, lon: float, k: int = 3) -> List[Dict[str, Any]]:
+        """[{'alcaldia', 'distance_km', 'weight'}] de las k estaciones más cercanas; los pesos suman 1"""
+        x, y = self._project(lat, lon)
+        neighbors = []
+        for _, key in self.tree.nearest(x, y, min(k, self.tree.size)):
+            info = self.stations[key]
+            neighbors.append({'alcaldia': key, 'distance_km': haversine_km(lat, lon, info['lat'], info['lon'])})
+        if not neighbors:
+            return neighbors
+
+        if neighbors[0]['distance_km'] < SAME_POINT_KM:
+            weights = [1.0] + [0.0] * (len(neighbors) - 1)
+        else:
+            inverse = [1 / neighbor['distance_km'] ** IDW_POWER for neighbor in neighbors]
+            total = sum(inverse)
+            weights = [value / total for value in inverse]
+        for neighbor, weight in zip(neighbors, weights):
+            neighbor['distance_km'] = round(neighbor['distance_km'], 3)
+            neighbor['weight'] = round(weight, 4)
+        return neighbors
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento SQLite (modo WAL) para el colector de Conagua y las series de tiempo
+Alternativa opcional a weather_cache.json / weather_timeseries.json: cada
+estación y cada punto es una fila indexada, las escrituras van en
+transacciones por lote y los lectores (hilos o procesos pre-fork) nunca
+bloquean al escritor. Se activa con STORAGE_BACKEND=sqlite.
+Author: EdbETO Solutions Team
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import config
+
+try:
+    import sqlite3
+    SQLITE_AVAILABLE = True
+except ImportError:
+    # Algunas compilaciones mínimas de Python no incluyen el módulo
+    SQLITE_AVAILABLE = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS stations (
+    alcaldia TEXT PRIMARY KEY,
+    data TEXT,
+    state TEXT,
+    seq INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS series (
+    alcaldia TEXT PRIMARY KEY,
+    municipio TEXT NOT NULL,
+    last_update TEXT NOT NULL,
+    points INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS points (
+    alcaldia TEXT NOT NULL,
+    t TEXT NOT NULL,
+    point TEXT NOT NULL,
+    PRIMARY KEY (alcaldia, t)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS points_t ON points (t);
+"""
+
+# Filas leídas por vuelta al recorrer una serie con iter_points
+FETCH_SIZE = 256
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+class SQLiteStore:
+    """Una conexión por hilo; un solo escritor a la vez y transacciones anidables"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        # Conexiones heredadas de un fork: se conservan referenciadas para que el GC no las cierre
+        # (cerrar un descriptor del archivo libera los locks POSIX de todas las conexiones del proceso)
+        self._inherited: List[threading.local] = []
+        if hasattr(os, 'register_at_fork'):
+            # SQLite prohíbe usar en el hijo una conexión abierta antes de fork() (pre-fork):
+            # cada proceso abre las suyas y las heredadas se abandonan sin cerrarlas
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+        with self._write_lock:
+            # executescript hace su propio COMMIT, por eso no va dentro de write()
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: las transacciones se controlan explícitamente con BEGIN/COMMIT
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # En WAL, NORMAL es seguro ante caídas del proceso y solo arriesga el último commit ante un corte de energía
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        self._inherited.append(self._local)
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+
+    @contextmanager
+    def write(self) -> Iterator["sqlite3.Connection"]:
+        """Transacción de escritura; las llamadas anidadas se unen a la exterior"""
+        with self._write_lock:
+            conn = self.conn
+            depth = self._local.depth
+            self._local.depth = depth + 1
+            try:
+                if depth == 0:
+                    conn.execute('BEGIN IMMEDIATE')
+                yield conn
+                if depth == 0:
+                    conn.execute('COMMIT')
+            except BaseException:
+                if depth == 0:
+                    conn.execute('ROLLBACK')
+                raise
+            finally:
+                self._local.depth = depth
+
+    # --- Metadatos ---
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: Optional[str]) -> None:
+        with self.write() as conn:
+            conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    # --- Colector: una fila por estación ---
+
+    def put_station(self, alcaldia: str, data: Optional[Dict[str, Any]], state: Optional[Dict[str, Any]], seq: int) -> None:
+        with self.write() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO stations (alcaldia, data, state, seq) VALUES (?, ?, ?, ?)',
+                (alcaldia, _dumps(data) if data is not None else None, _dumps(state) if state is not None else None, seq)
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seq', ?)", (str(seq),))
+
+    def load_stations(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """(datos por alcaldía, estado por alcaldía)"""
+        data: Dict[str, Any] = {}
+        states: Dict[str, Dict[str, Any]] = {}
+        for alcaldia, data_json, state_json in self.conn.execute('SELECT alcaldia, data, state FROM stations'):
+            if data_json is not None:
+                data[alcaldia] = json.loads(data_json)
+            if state_json is not None:
+                states[alcaldia] = json.loads(state_json)
+        return data, states
+
+    # --- Series de tiempo: una fila por punto, indexada por (alcaldía, t) ---
+
+    def add_point(self, alcaldia: str, municipio: str, point: Dict[str, Any], replace_within: float = 0) -> bool:
+        """Insertar un punto; si el último de la serie es más reciente que replace_within segundos, lo reemplaza.
+
+        Retorna True si hubo reemplazo.
+        """
+        with self.write() as conn:
+            replaced = False
+            if replace_within:
+                row = conn.execute(
+                    'SELECT t FROM points WHERE alcaldia = ? ORDER BY t DESC LIMIT 1', (alcaldia,)
+                ).fetchone()
+                if row is not None and _seconds_between(row[0], point['t']) < replace_within:
+                    conn.execute('DELETE FROM points WHERE alcaldia = ? AND t = ?', (alcaldia, row[0]))
+                    replaced = True
+            conn.execute('INSERT OR REPLACE INTO points (alcaldia, t, point) VALUES (?, ?, ?)',
+                         (alcaldia, point['t'], _dumps(point)))
+            conn.execute(
+                'INSERT INTO series (alcaldia, municipio, last_update, points) VALUES (?, ?, ?, 0) '
+                'ON CONFLICT (alcaldia) DO UPDATE SET last_update = excluded.last_update',
+                (alcaldia, municipio, point['t'])
+            )
+            self._recount(conn, alcaldia)
+            return replaced
+
+    def add_points(self, alcaldia: str, municipio: str, last_update: str, points: List[Dict[str, Any]]) -> None:
+        """Carga masiva de una serie en una sola transacción (migración desde JSON)"""
+        with self.write() as conn:
+            conn.executemany('INSERT OR REPLACE INTO points (alcaldia, t, point) VALUES (?, ?, ?)',
+                             [(alcaldia, point['t'], _dumps(point)) for point in points])
+            conn.execute('INSERT OR REPLACE INTO series (alcaldia, municipio, last_update, points) VALUES (?, ?, ?, 0)',
+                         (alcaldia, municipio, last_update))
+            self._recount(conn, alcaldia)
+
+    @staticmethod
+    def _recount(conn: "sqlite3.Connection", alcaldia: str) -> None:
+        conn.execute('UPDATE series SET points = (SELECT COUNT(*) FROM points WHERE alcaldia = ?) WHERE alcaldia = ?',
+                     (alcaldia, alcaldia))
+
+    def delete_points_before(self, cutoff: str) -> Dict[str, int]:
+        """Borrar puntos con t <= cutoff. Retorna {alcaldía: puntos borrados}"""
+        with self.write() as conn:
+            removed = dict(conn.execute(
+                'SELECT alcaldia, COUNT(*) FROM points WHERE t <= ? GROUP BY alcaldia', (cutoff,)
+            ).fetchall())
+            if removed:
+                conn.execute('DELETE FROM points WHERE t <= ?', (cutoff,))
+                for alcaldia in removed:
+                    self._recount(conn, alcaldia)
+            return removed
+
+    def series_meta(self, alcaldia: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """{alcaldía: {'municipio', 'lastUpdate', 'points'}} de una o de todas las series"""
+        query = 'SELECT alcaldia, municipio, last_update, points FROM series'
+        rows = self.conn.execute(query + ' WHERE alcaldia = ?', (alcaldia,)) if alcaldia else self.conn.execute(query)
+        return {
+            row[0]: {'municipio': row[1], 'lastUpdate': row[2], 'points': row[3]}
+            for row in rows
+        }
+
+    def iter_points(self, alcaldia: str, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Puntos de una serie en orden cronológico, leídos del disco por bloques"""
+        if since is None:
+            cursor = self.conn.execute('SELECT point FROM points WHERE alcaldia = ? ORDER BY t', (alcaldia,))
+        else:
+            cursor = self.conn.execute('SELECT point FROM points WHERE alcaldia = ? AND t >= ? ORDER BY t',
+                                       (alcaldia, since))
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    return
+                for (point_json,) in rows:
+                    yield json.loads(point_json)
+        finally:
+            cursor.close()
+
+    def points_summary(self) -> Tuple[int, Optional[str], Optional[str]]:
+        """(total de puntos, t más antiguo, t más reciente)"""
+        return self.conn.execute('SELECT COUNT(*), MIN(t), MAX(t) FROM points').fetchone()
+
+    def file_size(self) -> int:
+        return sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal') if os.path.exists(self.path + suffix))
+
+def _seconds_between(earlier: str, later: str) -> float:
+    return (datetime.fromisoformat(later) - datetime.fromisoformat(earlier)).total_seconds()
+
+_store: Optional[SQLiteStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> Optional[SQLiteStore]:
+    """Store compartido si STORAGE_BACKEND=sqlite; None para el almacenamiento JSON por defecto"""
+    global _store
+    if config.STORAGE_BACKEND != 'sqlite':
+        return None
+    if not SQLITE_AVAILABLE:
+        print("⚠️ STORAGE_BACKEND=sqlite pero el módulo sqlite3 no está disponible; se usa JSON")
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteStore(config.SQLITE_PATH)
+            print(f"🗄️ Almacenamiento SQLite (WAL): {config.SQLITE_PATH}")
+        return _store
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Pruebas del control de admisión (admission.py) y del carril de sondas del pool de workers
+Author: EdbETO Solutions Team
+"""
+
+import asyncio
+import threading
+import time
+
+from admission import AdmissionController, AsyncAdmissionController
+
+def test_admision_rechaza_sin_cola_y_libera():
+    admission = AdmissionController(max_in_flight=2, max_queue=0, queue_timeout=1)
+    assert admission.acquire() and admission.acquire()
+    started = time.monotonic()
+    assert not admission.acquire()
+    assert time.monotonic() - started < 0.1
+    admission.release()
+    assert admission.acquire()
+    stats = admission.get_stats()
+    assert stats['in_flight'] == 2 and stats['admitted'] == 3 and stats['rejected'] == 1
+
+def test_admision_espera_turno_o_vence():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.1)
+    assert admission.acquire()
+    assert not admission.acquire()
+    assert admission.get_stats()['timed_out'] == 1
+
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(admission.acquire()))
+    admission.queue_timeout = 5
+    waiter.start()
+    while admission.get_stats()['waiting'] == 0:
+        time.sleep(0.01)
+    # Con la cola llena el siguiente se rechaza de inmediato
+    assert not admission.acquire()
+    admission.release()
+    waiter.join(5)
+    assert admitted == [True]
+    assert admission.get_stats()['in_flight'] == 1
+
+def test_admision_desactivada_con_limite_cero():
+    admission = AdmissionController(max_in_flight=0, max_queue=0, queue_timeout=0)
+    assert all(admission.acquire() for _ in range(100))
+
+def test_admision_async_cede_el_turno_en_orden():
+    async def scenario():
+        admission = AsyncAdmissionController(max_in_flight=1, max_queue=2, queue_timeout=5)
+        assert await admission.acquire()
+        waiters = [asyncio.ensure_future(admission.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert not await admission.acquire()
+        admission.release()
+        assert await waiters[0]
+        assert not waiters[1].done()
+        admission.release()
+        assert await waiters[1]
+        admission.release()
+        return admission.get_stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['in_flight'] == 0 and stats['admitted'] == 3 and stats['rejected'] == 1
+
+# --- Carril de sondas del pool de workers (api_server.py) ---
+
+def test_ruta_reservada_se_atiende_con_los_workers_ocupados():
+    import api_server
+    from test_http_server import _connect, _read_response, _request, _start
+
+    started, release = threading.Event(), threading.Event()
+
+    class SlowHandler(api_server.ClimaCDMXHandler):
+        def do_GET(self):
+            if self.path == '/lento':
+                started.set()
+                release.wait(5)
+            super().do_GET()
+
+    server = _start(SlowHandler, workers=1)
+    busy, busy_reader = _connect(server)
+    probe, probe_reader = _connect(server)
+    try:
+        busy.sendall(_request('/lento'))
+        assert started.wait(5)
+        sent = time.monotonic()
+        probe.sendall(_request('/health'))
+        assert _read_response(probe_reader)[0] == 200
+        # La sonda no espera a que se libere el único worker
+        assert time.monotonic() - sent < 1
+        release.set()
+        assert _read_response(busy_reader)[0] == 404
+    finally:
+        release.set()
+        busy.close()
+        probe.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la persistencia JSON del colector: snapshot atómico + journal de reintentos parciales
+Author: EdbETO Solutions Team
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from conagua_collector import ConaguaDataCollector
+
+TLALPAN_IDMUN = 12
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'weather_cache.json')
+
+def _journal_lines(collector):
+    with open(collector.journal_file, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+def _retry_now(collector, *alcaldias):
+    for alcaldia in alcaldias:
+        collector.station_state[alcaldia]['retry_at'] = time.time() - 1
+
+@pytest.fixture
+def recovered(cache_file, fake_smn):
+    """Colector con un ciclo completo (tlalpan fallida) y un reintento parcial exitoso en el journal"""
+    fake_smn.missing = {TLALPAN_IDMUN}
+    collector = ConaguaDataCollector(cache_file=cache_file)
+    assert collector.update_all_stations()
+    assert collector.station_state['tlalpan']['status'] == 'failed'
+
+    fake_smn.missing = set()
+    _retry_now(collector, 'tlalpan')
+    assert collector.refresh_due_stations()
+    return collector
+
+def test_ciclo_completo_solo_escribe_el_snapshot(cache_file, fake_smn):
+    collector = ConaguaDataCollector(cache_file=cache_file)
+    collector.update_all_stations()
+    assert os.path.exists(cache_file)
+    assert not os.path.exists(collector.journal_file) or _journal_lines(collector) == []
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file)
+    assert reloaded.cache_data['coyoacan'].to_dict() == collector.cache_data['coyoacan'].to_dict()
+    assert reloaded.data_seq == collector.data_seq
+    assert reloaded.last_update == collector.last_update
+    assert reloaded.data_modified == collector.data_modified
+
+def test_reintento_parcial_se_reaplica_desde_el_journal(cache_file, recovered):
+    snapshot_mtime = os.stat(cache_file).st_mtime_ns
+    # Un solo append para la estación reintentada; el snapshot no se reescribe
+    entries = [json.loads(line) for line in _journal_lines(recovered)]
+    assert [entry['alcaldia'] for entry in entries] == ['tlalpan']
+    assert os.stat(cache_file).st_mtime_ns == snapshot_mtime
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file)
+    assert reloaded.station_state['tlalpan']['status'] == 'ok'
+    assert reloaded.cache_data['tlalpan'].to_dict() == recovered.cache_data['tlalpan'].to_dict()
+    assert reloaded.data_seq == recovered.data_seq == entries[-1]['seq']
+    # Last-Modified de los seguidores: el último cambio, no el último ciclo completo
+    assert reloaded.data_modified == recovered.data_modified > recovered.last_update
+
+def test_linea_truncada_o_ilegible_se_ignora(cache_file, recovered):
+    with open(recovered.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 999, "alcaldia": "tlalpan", "data": nul\n')
+        # Corte a mitad del append: la última línea queda sin salto de línea
+        f.write('{"seq": 1000, "alcaldia": "coyoacan", "da')
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file)
+    assert reloaded.data_seq == recovered.data_seq
+    assert reloaded.cache_data['tlalpan'].to_dict() == recovered.cache_data['tlalpan'].to_dict()
+    assert reloaded.cache_data['coyoacan'].to_dict() == recovered.cache_data['coyoacan'].to_dict()
+
+def test_entradas_incluidas_en_el_snapshot_no_se_reaplican(cache_file, recovered, fake_smn):
+    stale_journal = _journal_lines(recovered)
+    fake_smn.temp_max = 30
+    recovered.update_all_stations()
+    # Corte entre el reemplazo del snapshot y el vaciado del journal: quedan entradas viejas
+    with open(recovered.journal_file, 'w', encoding='utf-8') as f:
+        f.write(''.join(line + '\n' for line in stale_journal))
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file)
+    assert reloaded.cache_data['tlalpan'].temp_max == 30
+    assert reloaded.data_seq == recovered.data_seq
+
+def test_snapshot_corrupto_se_aparta_y_se_reconstruye_del_journal(cache_file, recovered):
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        f.write('{"data": {"coyoacan": ')
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file)
+    assert os.path.exists(cache_file + '.corrupt') and not os.path.exists(cache_file)
+    assert list(reloaded.cache_data) == ['tlalpan']
+    assert reloaded.data_seq == recovered.data_seq
+
+def test_journal_se_compacta_al_crecer(cache_file, recovered, fake_smn):
+    recovered.journal_compact_entries = 2
+    fake_smn.missing = {TLALPAN_IDMUN}
+    _retry_now(recovered, 'coyoacan')
+    recovered.station_state['coyoacan']['status'] = 'failed'
+    recovered.refresh_due_stations()
+    # La segunda entrada alcanza el límite: snapshot nuevo y journal vacío
+    assert _journal_lines(recovered) == []
+    with open(cache_file, encoding='utf-8') as f:
+        assert json.load(f)['seq'] == recovered.data_seq
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Pruebas de GET condicional (ETag / If-Modified-Since / 304) y Cache-Control
+Author: EdbETO Solutions Team
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import api_server
+from response_cache import etag_matches, http_date, is_not_modified, make_etag
+
+def test_etag_por_codificacion_y_debil():
+    assert make_etag('abc') == '"abc"'
+    assert make_etag('abc', 'gzip') == '"abc-gzip"'
+    assert make_etag('abc', weak=True) == 'W/"abc"'
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('*', True),
+    ('"abc-gzip"', False),
+    ('"x"', False),
+])
+def test_if_none_match_comparacion_debil(if_none_match, matches):
+    assert etag_matches(if_none_match, '"abc"') is matches
+
+def test_if_none_match_tiene_prioridad_sobre_la_fecha():
+    modified = datetime(2026, 10, 18, 12, 0, 0)
+    later = http_date(modified + timedelta(hours=1))
+    assert is_not_modified({'If-Modified-Since': later}, '"abc"', modified)
+    # Con If-None-Match la fecha no cuenta aunque indique que no hubo cambios
+    assert not is_not_modified({'If-None-Match': '"x"', 'If-Modified-Since': later}, '"abc"', modified)
+    # Resolución de segundos: una fracción posterior no es un cambio
+    assert is_not_modified({'If-Modified-Since': http_date(modified)}, '"abc"', modified.replace(microsecond=500000))
+    assert not is_not_modified({'If-Modified-Since': http_date(modified - timedelta(seconds=1))}, '"abc"', modified)
+    assert not is_not_modified({'If-Modified-Since': 'no es una fecha'}, '"abc"', modified)
+
+def test_304_conserva_validadores_sin_cuerpo():
+    modified = datetime(2026, 10, 18, 12, 0, 0)
+    response = api_server.conditional_response(api_server.json_response({'ok': True}), {}, modified, 120)
+    etag = response.headers['ETag']
+    assert response.status == 200 and response.headers['Cache-Control'] == 'public, max-age=120'
+
+    not_modified = api_server.conditional_response(api_server.json_response({'ok': True}), {'If-None-Match': etag},
+                                                   modified, 120)
+    assert not_modified.status == 304 and not_modified.body == b''
+    assert not_modified.headers['ETag'] == etag
+    assert not_modified.headers['Last-Modified'] == http_date(modified)
+    assert 'Content-Type' not in not_modified.headers
+
+    error = api_server.json_response({'error': 'x'}, status=500)
+    assert api_server.conditional_response(error, {'If-None-Match': '*'}).status == 500
+
+def test_weather_304_hasta_el_siguiente_cambio(weather_snapshot):
+    query = {'alcaldia': ['iztapalapa']}
+    first = api_server.weather_response(query, {})
+    assert first.status == 200
+    assert first.headers['Last-Modified'] == http_date(weather_snapshot.data_modified)
+    max_age = int(first.headers['Cache-Control'].split('max-age=')[1])
+    assert 0 < max_age <= weather_snapshot.update_interval
+
+    etag = first.headers['ETag']
+    assert api_server.weather_response(query, {'If-None-Match': etag}).status == 304
+    assert api_server.weather_response(query, {'If-Modified-Since': first.headers['Last-Modified']}).status == 304
+
+    # Un reintento parcial cambia datos y data_modified pero no last_update: ambos validadores cambian
+    weather_snapshot.data_modified = weather_snapshot.data_modified + timedelta(seconds=30)
+    weather_snapshot._journal_seq += 1
+    weather_snapshot.data_version += 1
+    assert api_server.weather_response(query, {'If-None-Match': etag}).status == 200
+    assert api_server.weather_response(query, {'If-Modified-Since': first.headers['Last-Modified']}).status == 200
+
+def test_etag_cambia_cuando_los_datos_vencen(weather_snapshot):
+    query = {'alcaldia': ['cdmx']}
+    fresh = api_server.weather_response(query, {}).headers['ETag']
+    weather_snapshot.last_update = datetime.now() - timedelta(seconds=weather_snapshot.update_interval + 60)
+    # Evitar que la lectura vencida lance una actualización real contra SMN
+    weather_snapshot.is_follower = True
+    try:
+        stale = api_server.weather_response(query, {})
+    finally:
+        weather_snapshot.is_follower = False
+    assert stale.headers['ETag'] != fresh
+    assert stale.headers['Cache-Control'] == 'public, max-age=0'
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pruebas del canal SSE y su reanudación (event_stream.py)
+Author: EdbETO Solutions Team
+"""
+
+import socket
+
+from event_stream import SSEBroadcaster, WeatherEventHub, parse_event_id
+
+def test_hub_backlog_desde_last_event_id():
+    hub = WeatherEventHub(history=3)
+    hub.snapshot(10, lambda: {'estado': 10})
+    for event_id in (11, 12, 13):
+        hub.publish(event_id, 'update', {'id': event_id})
+
+    assert [event_id for event_id, _ in hub.backlog_since(11, 13)] == [12, 13]
+    # El id base del evento más antiguo del historial todavía puede reanudar
+    assert [event_id for event_id, _ in hub.backlog_since(10, 13)] == [11, 12, 13]
+    assert hub.backlog_since(13, 13) == []
+    hub.publish(14, 'update', {'id': 14})
+    assert hub.backlog_since(10, 14) is None
+    assert hub.backlog_since(None, 14) is None
+    assert parse_event_id(' 14 ') == 14 and parse_event_id('abc') is None
+
+def test_hub_snapshot_serializado_una_vez_por_id():
+    hub = WeatherEventHub()
+    builds = []
+    frame = hub.snapshot(5, lambda: builds.append(1) or {'n': 1})
+    assert hub.snapshot(5, lambda: builds.append(1) or {'n': 2}) == frame
+    assert frame.startswith(b'id: 5\nevent: snapshot\n')
+    assert len(builds) == 1
+
+def _read_frames(sock, count, timeout=5):
+    sock.settimeout(timeout)
+    data = b''
+    while data.count(b'\n\n') < count:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def test_broadcaster_reanuda_sin_duplicar_eventos():
+    hub = WeatherEventHub()
+    broadcaster = SSEBroadcaster(hub, heartbeat=60, max_clients=4)
+    server, client = socket.socketpair()
+    try:
+        hub.publish(1, 'update', {'id': 1})
+        hub.publish(2, 'update', {'id': 2})
+        # El cliente reconecta con Last-Event-ID 1: el preámbulo ya incluye el evento 2
+        initial = b''.join(frame for _, frame in hub.backlog_since(1, 2))
+        broadcaster.add(server, initial, 2)
+        # Un evento ya incluido en el preámbulo no se vuelve a enviar
+        broadcaster.deliver(2, hub.backlog_since(1, 2)[-1][1])
+        hub.publish(3, 'update', {'id': 3})
+
+        data = _read_frames(client, 2)
+        ids = [line for line in data.decode().splitlines() if line.startswith('id: ')]
+        assert ids == ['id: 2', 'id: 3']
+        assert broadcaster.get_stats()['clients'] == 1
+    finally:
+        hub.unsubscribe(broadcaster.deliver)
+        client.close()
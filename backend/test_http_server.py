@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Pruebas del servidor HTTP/1.1 con pool de workers (api_server.WorkerPoolHTTPServer)
+Framing de conexiones persistentes y estacionamiento de conexiones inactivas.
+Author: EdbETO Solutions Team
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+import api_server
+
+def _start(handler_class, workers=1):
+    server = api_server.WorkerPoolHTTPServer(('127.0.0.1', 0), handler_class, workers=workers, queue_size=8)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def server():
+    server = _start(api_server.ClimaCDMXHandler)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _connect(server):
+    sock = socket.create_connection(server.server_address, timeout=5)
+    return sock, sock.makefile('rb')
+
+def _request(path='/health', version='HTTP/1.1', headers=''):
+    return f"GET {path} {version}\r\nHost: test\r\n{headers}\r\n".encode('latin-1')
+
+def _read_response(reader):
+    """(status, headers, cuerpo) leyendo exactamente Content-Length bytes"""
+    status_line = reader.readline()
+    if not status_line:
+        return None
+    headers = {}
+    while True:
+        line = reader.readline().decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = reader.read(int(headers['content-length'])) if 'content-length' in headers else b''
+    return int(status_line.split()[1]), headers, body
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_peticiones_sucesivas_en_la_misma_conexion(server):
+    sock, reader = _connect(server)
+    try:
+        maxes = []
+        for _ in range(3):
+            sock.sendall(_request())
+            status, headers, body = _read_response(reader)
+            assert status == 200 and len(body) == int(headers['content-length'])
+            assert headers['connection'] == 'keep-alive'
+            maxes.append(headers['keep-alive'].split('max=')[1])
+        # La cuenta de peticiones sobrevive a cada paso por el estacionamiento
+        limit = api_server.ClimaCDMXHandler.max_requests_per_connection
+        assert maxes == [str(limit - 1), str(limit - 2), str(limit - 3)]
+    finally:
+        sock.close()
+
+def test_peticiones_en_pipeline_responden_en_orden(server):
+    sock, reader = _connect(server)
+    try:
+        sock.sendall(_request('/health') + _request('/api') + _request('/no-existe'))
+        statuses = [_read_response(reader)[0] for _ in range(3)]
+        assert statuses == [200, 200, 404]
+    finally:
+        sock.close()
+
+@pytest.mark.parametrize('version, headers', [('HTTP/1.1', 'Connection: close\r\n'), ('HTTP/1.0', '')])
+def test_cierre_solicitado_o_http10(server, version, headers):
+    sock, reader = _connect(server)
+    try:
+        sock.sendall(_request(version=version, headers=headers))
+        status, response_headers, _ = _read_response(reader)
+        assert status == 200 and response_headers['connection'] == 'close'
+        assert reader.read() == b''
+    finally:
+        sock.close()
+
+def test_304_sin_cuerpo_no_desincroniza_la_conexion(server, weather_snapshot):
+    sock, reader = _connect(server)
+    try:
+        sock.sendall(_request('/api/weather?alcaldia=coyoacan'))
+        _, headers, _ = _read_response(reader)
+        sock.sendall(_request('/api/weather?alcaldia=coyoacan', headers=f"If-None-Match: {headers['etag']}\r\n")
+                     + _request('/health'))
+        status, not_modified, body = _read_response(reader)
+        assert status == 304 and body == b'' and 'content-length' not in not_modified
+        assert _read_response(reader)[0] == 200
+    finally:
+        sock.close()
+
+def test_conexion_inactiva_no_ocupa_el_worker(server):
+    assert server.workers == 1
+    idle, idle_reader = _connect(server)
+    other, other_reader = _connect(server)
+    try:
+        idle.sendall(_request())
+        assert _read_response(idle_reader)[0] == 200
+        _wait_for(lambda: server.get_pool_status()['idle_connections'] >= 1)
+        # Con un solo worker la segunda conexión se atiende mientras la primera sigue abierta
+        other.sendall(_request())
+        assert _read_response(other_reader)[0] == 200
+        idle.sendall(_request())
+        assert _read_response(idle_reader)[0] == 200
+    finally:
+        idle.close()
+        other.close()
+
+def test_limite_de_peticiones_y_timeout_de_inactividad():
+    class ShortKeepAlive(api_server.ClimaCDMXHandler):
+        timeout = 0.3
+        max_requests_per_connection = 2
+
+    server = _start(ShortKeepAlive)
+    try:
+        sock, reader = _connect(server)
+        sock.sendall(_request() + _request())
+        assert _read_response(reader)[1]['connection'] == 'keep-alive'
+        _, headers, _ = _read_response(reader)
+        assert headers['connection'] == 'close'
+        sock.close()
+
+        sock, reader = _connect(server)
+        sock.sendall(_request())
+        assert _read_response(reader)[1]['connection'] == 'keep-alive'
+        # Sin otra petición antes del timeout el servidor cierra la conexión estacionada
+        assert reader.read() == b''
+        sock.close()
+        _wait_for(lambda: server.get_pool_status()['idle_connections'] == 0)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la serialización JSON incremental (json_stream.py)
+Author: EdbETO Solutions Team
+"""
+
+import json
+
+import pytest
+
+from json_stream import iter_json_object
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 16 * 1024])
+def test_json_stream_igual_a_json_dumps(chunk_size):
+    series = [{'t': f'2026-10-18T{h:02d}:00:00', 'temp': 14.5 + h, 'desc': 'Lluvia ligera en Álvaro Obregón'}
+              for h in range(24)]
+    document = {
+        'municipio': 'Álvaro Obregón',
+        'lastUpdate': '2026-10-18T23:00:00',
+        'series': series,
+        'vacia': [],
+        'meta': {'fuente': 'SMN', 'niveles': [1, [2, {'x': None}]]},
+        'filtered_by_hours': 24
+    }
+    fields = [(key, iter(value) if key in ('series', 'vacia') else value) for key, value in document.items()]
+    streamed = b''.join(iter_json_object(fields, chunk_size=chunk_size))
+    assert streamed == json.dumps(document, indent=2, ensure_ascii=False).encode('utf-8')
+
+def test_json_stream_objeto_vacio():
+    assert b''.join(iter_json_object([])) == json.dumps({}, indent=2).encode()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Pruebas del planificador de actualizaciones por plazos exactos (refresh_scheduler.py)
+Author: EdbETO Solutions Team
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import refresh_scheduler
+from conagua_collector import ConaguaDataCollector
+from refresh_scheduler import RefreshScheduler, next_publication_time, parse_publication_times
+
+class Deadlines:
+    """next_deadline controlable desde la prueba; registra cada ejecución del job"""
+
+    def __init__(self, deadline=None, reason='interval'):
+        self.deadline = deadline
+        self.reason = reason
+        self.runs = []
+        self.ran = threading.Event()
+
+    def next_deadline(self):
+        return self.deadline, self.reason
+
+    def job(self, reason):
+        self.runs.append(reason)
+        self.ran.set()
+
+@pytest.fixture
+def scheduled():
+    deadlines = Deadlines()
+    scheduler = RefreshScheduler(deadlines.job, deadlines.next_deadline)
+    yield deadlines, scheduler
+    scheduler.stop()
+
+def test_horas_de_publicacion():
+    assert parse_publication_times('18:30, 06:00,25:00,x,7') == [(6, 0), (7, 0), (18, 30)]
+    times = [(6, 0), (18, 30)]
+    morning = datetime(2026, 10, 18, 5, 0).timestamp()
+    assert next_publication_time(morning, times) == datetime(2026, 10, 18, 6, 0).timestamp()
+    assert next_publication_time(morning, times, delay=600) == datetime(2026, 10, 18, 6, 10).timestamp()
+    # Pasada la última publicación del día: la primera del día siguiente
+    night = datetime(2026, 10, 18, 19, 0).timestamp()
+    assert next_publication_time(night, times) == datetime(2026, 10, 19, 6, 0).timestamp()
+    assert next_publication_time(night, []) is None
+
+def test_ejecuta_al_vencer_el_plazo(scheduled):
+    deadlines, scheduler = scheduled
+    deadlines.deadline = time.time() + 0.2
+    started = time.monotonic()
+    scheduler.start()
+    assert deadlines.ran.wait(5)
+    assert time.monotonic() - started >= 0.15
+    assert deadlines.runs == ['interval']
+    status = scheduler.status()
+    assert status['runs'] == 1 and status['last_run']['reason'] == 'interval'
+    assert status['last_run']['lateness_ms'] >= 0
+
+def test_trigger_despierta_sin_esperar_el_plazo(scheduled):
+    deadlines, scheduler = scheduled
+    assert not scheduler.trigger('stale')
+    deadlines.deadline = time.time() + 3600
+    scheduler.start()
+    assert scheduler.trigger('stale')
+    assert deadlines.ran.wait(5)
+    assert deadlines.runs == ['stale']
+    assert scheduler.status()['last_run']['lateness_ms'] is None
+
+def test_reschedule_adelanta_el_siguiente_plazo(scheduled):
+    deadlines, scheduler = scheduled
+    deadlines.deadline = time.time() + 3600
+    scheduler.start()
+    time.sleep(0.05)
+    assert not deadlines.runs
+    deadlines.deadline, deadlines.reason = time.time(), 'retry'
+    scheduler.reschedule()
+    assert deadlines.ran.wait(5)
+    assert deadlines.runs == ['retry']
+
+def test_plazo_vencido_tras_el_job_no_se_repite_de_inmediato(scheduled, monkeypatch):
+    deadlines, scheduler = scheduled
+    monkeypatch.setattr(refresh_scheduler, 'MIN_RERUN_SECONDS', 60)
+    # El job no avanza el plazo (p. ej. SMN falló): se espera MIN_RERUN_SECONDS antes de repetirlo
+    deadlines.deadline = time.time() - 1
+    scheduler.start()
+    assert deadlines.ran.wait(5)
+    time.sleep(0.1)
+    assert deadlines.runs == ['interval']
+    next_run = datetime.fromisoformat(scheduler.status()['next_run_at'])
+    assert next_run >= datetime.now() + timedelta(seconds=55)
+
+def test_stop_no_espera_al_siguiente_plazo(scheduled):
+    deadlines, scheduler = scheduled
+    deadlines.deadline = time.time() + 3600
+    scheduler.start()
+    assert scheduler.running
+    started = time.monotonic()
+    scheduler.stop()
+    assert time.monotonic() - started < 1
+    assert not scheduler.running and not scheduler.trigger()
+
+def test_plazos_del_colector(tmp_path):
+    collector = ConaguaDataCollector(cache_file=str(tmp_path / 'weather_cache.json'))
+    collector.publication_times = [(6, 0)]
+    collector.publication_delay = 600
+    assert collector.next_refresh_deadline()[1] == 'initial'
+
+    collector.last_update = datetime(2026, 10, 18, 5, 0)
+    # 06:10 llega antes que el fin del intervalo (06:15)
+    assert collector.next_refresh_deadline() == (datetime(2026, 10, 18, 6, 10).timestamp(), 'publication')
+    collector.last_update = datetime(2026, 10, 18, 7, 0)
+    assert collector.next_refresh_deadline() == (datetime(2026, 10, 18, 8, 15).timestamp(), 'interval')
+
+    retry_at = datetime(2026, 10, 18, 7, 5).timestamp()
+    collector.station_state['tlalpan'] = {'status': 'failed', 'retry_at': retry_at}
+    assert collector.next_refresh_deadline() == (retry_at, 'retry')
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la compresión negociada y de los cuerpos pre-renderizados (response_cache.py)
+Author: EdbETO Solutions Team
+"""
+
+import gzip
+import json
+import zlib
+
+import pytest
+
+from response_cache import RenderedBody, VersionedRenderCache, compress_chunks, negotiate_encoding
+
+LARGE_PAYLOAD = {'alcaldias': [{'nombre': f'Alcaldía {i}', 'temperatura': '21°C'} for i in range(40)]}
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    (None, 'identity'),
+    ('', 'identity'),
+    ('gzip', 'gzip'),
+    ('GZIP, deflate', 'gzip'),
+    ('deflate', 'deflate'),
+    ('gzip;q=0, deflate', 'deflate'),
+    ('gzip;q=0.5, deflate;q=0.8', 'deflate'),
+    ('gzip; q=0.3, deflate; q=0.2', 'gzip'),
+    ('*;q=0.1', 'gzip'),
+    ('*, gzip;q=0', 'deflate'),
+    ('gzip;q=0', 'identity'),
+    ('gzip;q=abc', 'identity'),
+    ('br, identity', 'identity'),
+])
+def test_negociacion_respeta_q(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+def test_variantes_comprimidas_se_calculan_una_vez():
+    rendered = RenderedBody(LARGE_PAYLOAD)
+    encoding, body = rendered.select('gzip')
+    assert encoding == 'gzip'
+    assert json.loads(gzip.decompress(body)) == LARGE_PAYLOAD
+    assert rendered.select('gzip')[1] is body
+    assert zlib.decompress(rendered.select('deflate')[1]) == rendered.identity
+    assert rendered.etag_for('gzip') == f'"{rendered.digest}-gzip"'
+    # Un cuerpo pequeño no se comprime aunque el cliente lo acepte
+    assert RenderedBody({'ok': True}).select('gzip')[0] == 'identity'
+
+def test_cache_reutiliza_el_render_por_version():
+    cache = VersionedRenderCache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return LARGE_PAYLOAD
+
+    first = cache.get('cdmx', 1, render)
+    gzip_body = first.select('gzip')[1]
+    again = cache.get('cdmx', 1, render)
+    assert again is first and again.select('gzip')[1] is gzip_body
+    assert len(renders) == 1
+
+    assert cache.get('cdmx', 2, render) is not first
+    assert len(renders) == 2
+    assert cache.get_stats()['hits'] == 1
+
+def test_compresion_incremental_de_fragmentos():
+    chunks = [json.dumps(LARGE_PAYLOAD).encode()[i:i + 100] for i in range(0, 2000, 100)]
+    for encoding, decompress in (('gzip', gzip.decompress), ('deflate', zlib.decompress)):
+        assert decompress(b''.join(compress_chunks(iter(chunks), encoding))) == b''.join(chunks)
+    with pytest.raises(ValueError):
+        list(compress_chunks([b'x'], 'br'))
+
+# --- Integración con las rutas del API ---
+
+def test_weather_negocia_y_declara_vary(weather_snapshot):
+    import api_server
+
+    plain = api_server.weather_response({'alcaldia': ['coyoacan']}, {})
+    compressed = api_server.weather_response({'alcaldia': ['coyoacan']}, {'Accept-Encoding': 'gzip;q=1, deflate;q=0.5'})
+    refused = api_server.weather_response({'alcaldia': ['coyoacan']}, {'Accept-Encoding': 'gzip;q=0'})
+
+    for response in (plain, compressed, refused):
+        assert response.headers['Vary'] == 'Accept-Encoding'
+    assert 'Content-Encoding' not in plain.headers and 'Content-Encoding' not in refused.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.body) == plain.body
+    # Cada representación tiene su propio ETag
+    assert compressed.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+def test_weather_reutiliza_variantes_en_la_misma_version(weather_snapshot):
+    import api_server
+
+    renders = api_server.weather_body_cache.get_stats()['renders']
+    first = api_server.weather_response({'alcaldia': ['tlalpan']}, {'Accept-Encoding': 'gzip'})
+    second = api_server.weather_response({'alcaldia': ['tlalpan']}, {'Accept-Encoding': 'gzip'})
+    assert second.body is first.body
+    assert api_server.weather_body_cache.get_stats()['renders'] == renders + 1
+
+    # Datos nuevos: otra versión, otro render
+    weather_snapshot.data_version += 1
+    third = api_server.weather_response({'alcaldia': ['tlalpan']}, {'Accept-Encoding': 'gzip'})
+    assert third.body is not first.body
+    assert api_server.weather_body_cache.get_stats()['renders'] == renders + 2
+
+def test_respuestas_dinamicas_se_comprimen_por_peticion():
+    import api_server
+
+    response = api_server.compress_response(api_server.json_response(LARGE_PAYLOAD), {'Accept-Encoding': 'deflate'})
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(zlib.decompress(response.body)) == LARGE_PAYLOAD
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la coalescencia de llamadas concurrentes (singleflight.py)
+Author: EdbETO Solutions Team
+"""
+
+import threading
+import time
+
+from singleflight import SingleFlight
+
+def _run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def test_singleflight_una_sola_llamada_por_clave():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'dato'
+
+    threads = _run_concurrently(8, lambda: results.append(flight.do('k', fetch)))
+    while flight.get_stats()['shared'] < 7:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ['dato'] * 8
+    assert flight.get_stats() == {'in_flight': 0, 'leaders': 1, 'shared': 7}
+
+def test_singleflight_propaga_el_error_y_no_lo_recuerda():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError('SMN no responde')
+
+    def call():
+        try:
+            flight.do('k', fail)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = _run_concurrently(4, call)
+    while flight.get_stats()['shared'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert errors == ['SMN no responde'] * 4
+    # La clave se libera: la siguiente petición vuelve a consultar
+    assert flight.do('k', lambda: 'ok') == 'ok'
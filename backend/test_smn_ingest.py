@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la ingesta incremental de SMN (smn_ingest.py)
+Author: EdbETO Solutions Team
+"""
+
+import gzip
+import json
+
+import pytest
+
+from smn_ingest import ingest_records, record_filter
+
+def _smn_records():
+    records = []
+    for ides, idmun in ((9, 3), (9, 7), (9, 15), (15, 3)):
+        for ndia in range(2):
+            records.append({'ides': str(ides), 'idmun': f'{idmun:03d}', 'ndia': str(ndia), 'nmun': 'Coyoacán'})
+    return records
+
+def _chunks(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+@pytest.mark.parametrize('compressed', [False, True])
+def test_ingesta_filtra_estado_y_municipios(compressed):
+    body = json.dumps(_smn_records(), ensure_ascii=False).encode('utf-8')
+    if compressed:
+        body = gzip.compress(body)
+    records, stats = ingest_records(_chunks(body, 5), record_filter(9, {3, 7}))
+    assert {(record['ides'], record['idmun']) for record in records} == {('9', '003'), ('9', '007')}
+    assert stats['records_scanned'] == 8 and stats['records_kept'] == 4
+    # La lectura termina con el cierre del arreglo (sin comprimir, el último byte del cuerpo)
+    assert stats['bytes_received'] <= len(body)
+    if not compressed:
+        assert stats['bytes_received'] == len(body)
+
+def test_ingesta_sin_filtro_de_municipios_y_sin_ides():
+    records = [{'idmun': '3', 'ndia': '0'}, {'ides': '15', 'idmun': '3', 'ndia': '0'}]
+    body = json.dumps({'municipal': records}).encode('utf-8')
+    kept, _ = ingest_records([body], record_filter(9, None))
+    # Un registro sin ides viene de una consulta ya acotada al estado
+    assert kept == [records[0]]
+
+def test_ingesta_json_incompleto():
+    with pytest.raises(ValueError):
+        ingest_records([b'[{"ides": "9"}, {"ides'], record_filter(None, None))
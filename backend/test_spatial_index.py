@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Pruebas del índice espacial de estaciones (spatial_index.py)
+Author: EdbETO Solutions Team
+"""
+
+import math
+import random
+
+import pytest
+
+from spatial_index import KDTree, StationLocator, haversine_km
+
+def test_kdtree_coincide_con_fuerza_bruta():
+    rng = random.Random(7)
+    points = [((rng.uniform(-50, 50), rng.uniform(-50, 50)), i) for i in range(300)]
+    tree = KDTree(points)
+    for _ in range(200):
+        x, y = rng.uniform(-60, 60), rng.uniform(-60, 60)
+        for k in (1, 3, 8):
+            expected = sorted(((px - x) ** 2 + (py - y) ** 2, item) for (px, py), item in points)[:k]
+            found = tree.nearest(x, y, k)
+            assert [item for _, item in found] == [item for _, item in expected]
+            assert [distance for distance, _ in found] == pytest.approx([distance for distance, _ in expected])
+
+def test_kdtree_vacio_y_k_mayor_que_n():
+    assert KDTree([]).nearest(0, 0, 3) == []
+    tree = KDTree([((0.0, 0.0), 'a'), ((1.0, 0.0), 'b')])
+    assert [item for _, item in tree.nearest(0.9, 0, 5)] == ['b', 'a']
+
+def test_locator_pesos_por_distancia():
+    stations = {
+        'centro': {'lat': 19.43, 'lon': -99.13},
+        'sur': {'lat': 19.29, 'lon': -99.17},
+        'norte': {'lat': 19.48, 'lon': -99.11},
+        'sin-coordenadas': {}
+    }
+    locator = StationLocator(stations)
+    nearest = locator.nearest(19.44, -99.13, k=3)
+    assert [station['alcaldia'] for station in nearest] == ['centro', 'norte', 'sur']
+    assert math.isclose(sum(station['weight'] for station in nearest), 1, abs_tol=1e-3)
+    assert nearest[0]['distance_km'] == round(haversine_km(19.44, -99.13, 19.43, -99.13), 3)
+    # Sobre la estación el peso completo es suyo
+    assert locator.nearest(19.43, -99.13, k=2)[0]['weight'] == 1.0
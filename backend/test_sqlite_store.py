@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Pruebas del almacenamiento SQLite (sqlite_store.py) y de los colectores con STORAGE_BACKEND=sqlite
+Author: EdbETO Solutions Team
+"""
+
+import json
+import time
+
+import pytest
+
+from conagua_collector import ConaguaDataCollector
+from conagua_timeseries import ConaguaTimeseriesCollector
+from sqlite_store import SQLiteStore
+from weather_models import Observation
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteStore(str(tmp_path / 'clima.db'))
+
+def _point(t, temp):
+    return {'t': t, 'temp': temp, 'pp': 0, 'desc': 'Despejado'}
+
+def test_estaciones_y_metadatos(store):
+    store.put_station('coyoacan', {'temp_max': 22}, {'status': 'ok'}, 3)
+    store.put_station('tlalpan', None, {'status': 'failed'}, 4)
+    store.set_meta('last_update', '2026-10-18T06:10:00')
+    data, states = store.load_stations()
+    assert data == {'coyoacan': {'temp_max': 22}}
+    assert states == {'coyoacan': {'status': 'ok'}, 'tlalpan': {'status': 'failed'}}
+    assert store.get_meta('seq') == '4'
+    assert store.get_meta('last_update') == '2026-10-18T06:10:00'
+    assert store.get_meta('no-existe') is None
+
+def test_transaccion_anidada_se_revierte_completa(store):
+    with pytest.raises(RuntimeError):
+        with store.write():
+            store.put_station('coyoacan', {'temp_max': 22}, None, 1)
+            with store.write():
+                store.set_meta('last_update', 'x')
+            raise RuntimeError('corte')
+    assert store.load_stations() == ({}, {})
+    assert store.get_meta('last_update') is None
+
+def test_puntos_reemplazo_lectura_y_retencion(store):
+    assert not store.add_point('coyoacan', 'Coyoacan', _point('2026-10-18T06:00:00', 20))
+    # Un punto a menos de replace_within segundos del último lo reemplaza
+    assert store.add_point('coyoacan', 'Coyoacan', _point('2026-10-18T06:20:00', 21), replace_within=1800)
+    assert not store.add_point('coyoacan', 'Coyoacan', _point('2026-10-18T07:30:00', 23), replace_within=1800)
+    store.add_points('tlalpan', 'Tlalpan', '2026-10-18T07:00:00',
+                     [_point(f'2026-10-18T0{hour}:00:00', 15 + hour) for hour in range(5, 8)])
+
+    assert [point['temp'] for point in store.iter_points('coyoacan')] == [21, 23]
+    assert [point['t'] for point in store.iter_points('tlalpan', since='2026-10-18T06:00:00')] == [
+        '2026-10-18T06:00:00', '2026-10-18T07:00:00'
+    ]
+    assert store.series_meta('coyoacan') == {
+        'coyoacan': {'municipio': 'Coyoacan', 'lastUpdate': '2026-10-18T07:30:00', 'points': 2}
+    }
+
+    assert store.delete_points_before('2026-10-18T06:20:00') == {'coyoacan': 1, 'tlalpan': 2}
+    assert {alcaldia: meta['points'] for alcaldia, meta in store.series_meta().items()} == {'coyoacan': 1, 'tlalpan': 1}
+    assert store.points_summary() == (2, '2026-10-18T07:00:00', '2026-10-18T07:30:00')
+
+def test_colector_persiste_en_sqlite(tmp_path, store, fake_smn):
+    cache_file = str(tmp_path / 'weather_cache.json')
+    fake_smn.missing = {12}
+    collector = ConaguaDataCollector(cache_file=cache_file, store=store)
+    collector.update_all_stations()
+    fake_smn.missing = set()
+    collector.station_state['tlalpan']['retry_at'] = time.time() - 1
+    assert collector.refresh_due_stations()
+
+    reloaded = ConaguaDataCollector(cache_file=cache_file, store=store)
+    assert reloaded.station_state == collector.station_state
+    assert {alcaldia: data.to_dict() for alcaldia, data in reloaded.cache_data.items()} == {
+        alcaldia: data.to_dict() for alcaldia, data in collector.cache_data.items()
+    }
+    assert reloaded.data_seq == collector.data_seq
+    assert reloaded.last_update == collector.last_update
+    assert reloaded.data_modified == collector.data_modified > collector.last_update
+
+def test_snapshot_json_se_migra_una_sola_vez(tmp_path, store, fake_smn):
+    cache_file = str(tmp_path / 'weather_cache.json')
+    legacy = ConaguaDataCollector(cache_file=cache_file)
+    legacy.update_all_stations()
+
+    migrated = ConaguaDataCollector(cache_file=cache_file, store=store)
+    assert migrated.cache_data['coyoacan'].to_dict() == legacy.cache_data['coyoacan'].to_dict()
+    assert migrated.last_update == legacy.last_update
+
+    # Con el store ya poblado el snapshot JSON no vuelve a importarse
+    fake_smn.temp_max = 30
+    legacy.update_all_stations()
+    assert ConaguaDataCollector(cache_file=cache_file, store=store).cache_data['coyoacan'].temp_max == 24
+
+def test_timeseries_en_sqlite(tmp_path, store):
+    timeseries_file = tmp_path / 'weather_timeseries.json'
+    timeseries_file.write_text(json.dumps({
+        'coyoacan': {'municipio': 'Coyoacan', 'lastUpdate': '2026-10-18T05:00:00',
+                     'series': [_point('2026-10-18T05:00:00', 19)]}
+    }), encoding='utf-8')
+    collector = ConaguaTimeseriesCollector(timeseries_file=str(timeseries_file), store=store)
+    collector.add_weather_point('coyoacan', Observation('Coyoacán', '2026-10-18T07:00:00', 'Conagua/SMN', temp_max=23))
+
+    series = collector.get_timeseries_for_alcaldia('coyoacan')
+    assert [point['temp'] for point in series['series']] == [19, 23]
+    assert collector.timeseries_data == {}
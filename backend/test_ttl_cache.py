@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché TTL con gracia para datos vencidos (ttl_cache.py)
+Author: EdbETO Solutions Team
+"""
+
+import types
+
+import pytest
+
+import ttl_cache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj manual para ttl_cache: las pruebas avanzan el tiempo sin dormir"""
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def test_ttl_cache_expira_y_sirve_en_gracia(clock):
+    cache = ttl_cache.TTLCache(max_entries=4, ttl=10, stale_grace=5)
+    cache.set('a', 1)
+    assert not cache.lookup('a').is_stale()
+    assert cache.get_fresh('a') is not None
+
+    clock[0] += 12
+    entry = cache.lookup('a')
+    assert entry.value == 1 and entry.is_stale()
+    assert cache.get_fresh('a') is None
+
+    clock[0] += 5
+    assert cache.lookup('a') is None
+    assert len(cache) == 0
+    assert cache.get_stats()['stale_hits'] == 1
+
+def test_ttl_cache_descarta_la_menos_usada(clock):
+    cache = ttl_cache.TTLCache(max_entries=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.lookup('a')
+    cache.set('c', 3)
+    assert cache.lookup('b') is None
+    assert cache.lookup('a').value == 1 and cache.lookup('c').value == 3
+    assert cache.get_stats()['evictions'] == 1
+
+def test_ttl_cache_error_conserva_el_valor(clock):
+    cache = ttl_cache.TTLCache(ttl=10, stale_grace=60, error_ttl=30)
+    cache.set_error('caida', 'HTTP 500')
+    assert cache.lookup('caida').error == 'HTTP 500'
+    clock[0] += 31
+    assert cache.lookup('caida') is None
+
+    cache.set('a', 1)
+    clock[0] += 11
+    assert cache.begin_revalidate('a')
+    cache.set_error('a', 'timeout')
+    cache.end_revalidate('a')
+    assert cache.lookup('a').value == 1
+    # Tras el fallo la revalidación queda en pausa error_ttl segundos
+    assert not cache.begin_revalidate('a')
+    clock[0] += 31
+    assert cache.begin_revalidate('a')
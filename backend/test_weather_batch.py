@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Pruebas de /api/weather/batch: varias alcaldías en un documento renderizado una vez por versión
+Author: EdbETO Solutions Team
+"""
+
+import json
+
+import api_server
+
+def _body(response):
+    return json.loads(response.body)
+
+def test_parse_batch_normaliza_la_seleccion():
+    assert api_server.parse_batch_query({}) == ('all', None)
+    assert api_server.parse_batch_query({'alcaldias': ['Coyoacan, tlalpan', 'coyoacan']}) == (('coyoacan', 'tlalpan'), None)
+    assert api_server.parse_batch_query({'alcaldias': ['tlalpan,all']}) == ('all', None)
+    selection, error = api_server.parse_batch_query({'alcaldias': [f'a{i}' for i in range(api_server.MAX_BATCH_ALCALDIAS + 1)]})
+    assert selection is None and error.status == 400
+    assert _body(error)['error'] == 'too_many_alcaldias'
+
+def test_lote_de_alcaldias_y_no_encontradas(weather_snapshot):
+    response = api_server.weather_batch_response({'alcaldias': ['coyoacan,tlalpan,atlantida']}, {})
+    assert response.status == 200
+    data = _body(response)
+    assert list(data['alcaldias']) == ['coyoacan', 'tlalpan']
+    assert data['count'] == 2 and data['not_found'] == ['atlantida']
+    assert data['alcaldias']['coyoacan'] == _body(api_server.weather_response({'alcaldia': ['coyoacan']}, {}))
+
+def test_lote_completo(weather_snapshot):
+    data = _body(api_server.weather_batch_response({'alcaldias': ['all']}, {}))
+    assert set(data['alcaldias']) == set(weather_snapshot.cdmx_stations)
+    assert data['count'] == len(weather_snapshot.cdmx_stations) and data['not_found'] == []
+    assert data['stale'] is False
+
+def test_lote_renderizado_una_vez_por_version(weather_snapshot):
+    renders = api_server.batch_body_cache.get_stats()['renders']
+    first = api_server.weather_batch_response({'alcaldias': ['iztacalco,gustavo-madero']}, {'Accept-Encoding': 'gzip'})
+    # El orden de la selección forma parte de la clave; las repeticiones no
+    second = api_server.weather_batch_response({'alcaldias': ['iztacalco', 'gustavo-madero', 'iztacalco']}, {'Accept-Encoding': 'gzip'})
+    assert second.body is first.body
+    assert api_server.batch_body_cache.get_stats()['renders'] == renders + 1
+    assert api_server.weather_batch_response({'alcaldias': ['iztacalco,gustavo-madero']},
+                                             {'If-None-Match': first.headers['ETag'], 'Accept-Encoding': 'gzip'}).status == 304
+
+    weather_snapshot.data_version += 1
+    third = api_server.weather_batch_response({'alcaldias': ['iztacalco,gustavo-madero']}, {'Accept-Encoding': 'gzip'})
+    assert third.body is not first.body
+    assert api_server.batch_body_cache.get_stats()['renders'] == renders + 2
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Caché LRU con TTL para respuestas de servicios externos (SMN)
+Acotado en número de entradas, seguro entre hilos, con ventana de gracia
+para servir datos vencidos mientras se revalidan y caché negativo de errores.
+Author: EdbETO Solutions Team
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class CacheEntry:
+    """Valor (o error) guardado con sus tiempos de vigencia, en segundos epoch"""
+
+    __slots__ = ('value', 'error', 'stored_at', 'expires_at', 'stale_until', 'retry_at')
+
+    def __init__(self, value: Any, error: Optional[str], stored_at: float, expires_at: float, stale_until: float):
+        self.value = value
+        self.error = error
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        # Tras una revalidación fallida no se reintenta antes de este momento
+        self.retry_at = 0.0
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        return (time.time() if now is None else now) >= self.expires_at
+
+class TTLCache:
+    """Caché LRU + TTL.
+
+    - Entradas frescas: se sirven tal cual.
+    - Vencidas dentro de stale_grace: se sirven y el llamador dispara una
+      revalidación en segundo plano (begin_revalidate evita duplicarlas).
+    - Errores: se guardan error_ttl segundos para no repetir la consulta
+      contra un servicio caído; si ya había un valor, se conserva el valor.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 4500, stale_grace: float = 0, error_ttl: float = 30):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.stale_grace = stale_grace
+        self.error_ttl = error_ttl
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.error_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        """Entrada utilizable (fresca, vencida en gracia o error vigente); None si no hay"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if now >= entry.stale_until:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.error is not None:
+                self.error_hits += 1
+            elif entry.is_stale(now):
+                self.stale_hits += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get_fresh(self, key: Hashable) -> Optional[CacheEntry]:
+        """Entrada con valor no vencido (sin contar estadísticas)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.error is not None or entry.is_stale():
+                return None
+            return entry
+
+    def set(self, key: Hashable, value: Any) -> CacheEntry:
+        now = time.time()
+        entry = CacheEntry(value, None, now, now + self.ttl, now + self.ttl + self.stale_grace)
+        self._store(key, entry)
+        return entry
+
+    def set_error(self, key: Hashable, error: str) -> None:
+        """Registrar un fallo: caché negativo, o pausa de revalidación si hay valor que servir"""
+        now = time.time()
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.error is None and now < current.stale_until:
+                current.retry_at = now + self.error_ttl
+                return
+        self._store(key, CacheEntry(None, error, now, now + self.error_ttl, now + self.error_ttl))
+
+    def _store(self, key: Hashable, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def begin_revalidate(self, key: Hashable) -> bool:
+        """True si el llamador debe revalidar la clave (ninguna revalidación en curso ni en pausa)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if key in self._revalidating or (entry is not None and time.time() < entry.retry_at):
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def end_revalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._revalidating.discard(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'error_hits': self.error_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'revalidating': len(self._revalidating)
+            }
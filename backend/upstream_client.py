@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Cliente HTTP compartido para servicios externos (SMN/Conagua)
+Una sola requests.Session con pools de conexiones keep-alive y una política
+de reintentos común para el colector y el proxy de pronóstico (motores
+single/threaded y pre-fork). El motor asyncio usa AsyncUpstreamClient: el
+mismo pool keep-alive y los mismos reintentos sobre asyncio streams, sin
+ocupar hilos por consulta.
+Author: EdbETO Solutions Team
+"""
+
+import asyncio
+import gzip
+import json
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import config
+
+# Códigos de SMN que suelen ser transitorios
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class UpstreamClient:
+    """Session compartida entre hilos con pools acotados por host y estadísticas de uso"""
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, retries: int = 2, backoff: float = 0.5):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']), respect_retry_after_header=True,
+            # Tras agotar los reintentos se devuelve la última respuesta; raise_for_status decide
+            raise_on_status=False
+        )
+        # pool_block=False: si todas las conexiones del host están ocupadas se abre una extra sin esperar
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=retry, pool_block=False)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_latency = 0.0
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+            timeout: float = config.WEATHER_API_TIMEOUT, stream: bool = False) -> requests.Response:
+        """GET con reintentos; lanza requests.RequestException si no hubo respuesta.
+
+        Con stream=True el cuerpo no se descarga: quien llama lo consume con
+        iter_content() y debe cerrar la respuesta para devolver la conexión al pool.
+        """
+        start = time.monotonic()
+        retries = 0
+        failed = False
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+            if response.raw is not None and getattr(response.raw, 'retries', None) is not None:
+                retries = len(response.raw.retries.history)
+            return response
+        except requests.RequestException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.errors += failed
+                self.retries += retries
+                self.total_latency += time.monotonic() - start
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = config.WEATHER_API_TIMEOUT) -> Any:
+        """GET que exige 2xx y retorna el JSON decodificado"""
+        response = self.get(url, params=params, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _pool_stats(self) -> List[Dict[str, Any]]:
+        pools = self.adapter.poolmanager.pools
+        stats = []
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats.append({
+                'host': f"{key.key_scheme}://{key.key_host}:{key.key_port or ''}".rstrip(':'),
+                # Conexiones nuevas abiertas frente a peticiones: cuanto menor, más reutilización keep-alive
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                # La cola del pool se llena con None como marcadores de espacios libres
+                'idle': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            })
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'avg_latency_ms': round(self.total_latency / self.requests * 1000, 1) if self.requests else None
+            }
+        stats['pool_connections'] = self.pool_connections
+        stats['pool_maxsize'] = self.pool_maxsize
+        stats['pools'] = self._pool_stats()
+        return stats
+
+class UpstreamHTTPError(Exception):
+    """Respuesta HTTP de error del servicio externo tras agotar los reintentos"""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"{status} Error for url: {url}")
+        self.status = status
+
+# (esquema, host, puerto) de un pool del cliente asyncio
+HostKey = Tuple[str, str, int]
+
+class _HostPool:
+    __slots__ = ('idle', 'connections_opened', 'requests')
+
+    def __init__(self):
+        self.idle: Deque[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = deque()
+        self.connections_opened = 0
+        self.requests = 0
+
+class AsyncUpstreamClient:
+    """Cliente GET no bloqueante para el motor asyncio.
+
+    Conserva hasta pool_maxsize conexiones keep-alive libres por host y
+    aplica la misma política que UpstreamClient: reintentos con backoff
+    exponencial ante errores de conexión y RETRY_STATUSES, respetando
+    Retry-After. No hay límite de consultas simultáneas: si no hay una
+    conexión libre se abre otra (como pool_block=False). Las conexiones
+    pertenecen al event loop que las abrió: una instancia por loop.
+    """
+
+    def __init__(self, pool_maxsize: int = 16, retries: int = 2, backoff: float = 0.5):
+        self.pool_maxsize = pool_maxsize
+        self.retries = retries
+        self.backoff = backoff
+        self._pools: Dict[HostKey, _HostPool] = {}
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0
+        self.in_flight = 0
+        self.total_latency = 0.0
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       headers: Optional[Dict[str, str]] = None, timeout: float = config.WEATHER_API_TIMEOUT) -> Any:
+        """GET que exige 2xx y retorna el JSON decodificado; timeout aplica a cada intento"""
+        parts = urllib.parse.urlsplit(url)
+        query = parts.query
+        if params:
+            extra = urllib.parse.urlencode(params)
+            query = f"{query}&{extra}" if query else extra
+        target = (parts.path or '/') + (f"?{query}" if query else '')
+        https = parts.scheme == 'https'
+        key = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+
+        start = time.monotonic()
+        self.in_flight += 1
+        failed = True
+        try:
+            attempt = 0
+            while True:
+                try:
+                    status, response_headers, body = await asyncio.wait_for(self._request(key, target, headers), timeout)
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError):
+                    if attempt >= self.retries:
+                        raise
+                    delay = self._backoff_delay(attempt)
+                else:
+                    if status < 400:
+                        failed = False
+                        return json.loads(body)
+                    if status not in RETRY_STATUSES or attempt >= self.retries:
+                        raise UpstreamHTTPError(status, f"{parts.scheme}://{parts.hostname}{target}")
+                    delay = _retry_after(response_headers.get('retry-after'))
+                    if delay is None:
+                        delay = self._backoff_delay(attempt)
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+            self.errors += failed
+            self.total_latency += time.monotonic() - start
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt)
+
+    async def _request(self, key: HostKey, target: str, headers: Optional[Dict[str, str]]) -> Tuple[int, Dict[str, str], bytes]:
+        pool = self._pools.setdefault(key, _HostPool())
+        while pool.idle:
+            reader, writer = pool.idle.pop()
+            try:
+                return await self._exchange(pool, key, reader, writer, target, headers)
+            except (OSError, asyncio.IncompleteReadError):
+                # El servidor cerró la conexión libre mientras esperaba: se intenta con otra
+                continue
+        reader, writer = await asyncio.open_connection(key[1], key[2], ssl=self._ssl() if key[0] == 'https' else None)
+        pool.connections_opened += 1
+        return await self._exchange(pool, key, reader, writer, target, headers)
+
+    async def _exchange(self, pool: _HostPool, key: HostKey, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                        target: str, headers: Optional[Dict[str, str]]) -> Tuple[int, Dict[str, str], bytes]:
+        reusable = False
+        try:
+            lines = [f"GET {target} HTTP/1.1", f"Host: {key[1]}", "Accept-Encoding: gzip", "Connection: keep-alive"]
+            lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+            await writer.drain()
+            pool.requests += 1
+
+            status_line, *header_lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+            status = int(status_line.split()[1])
+            response_headers: Dict[str, str] = {}
+            for line in header_lines:
+                name, sep, value = line.partition(':')
+                if sep:
+                    response_headers[name.strip().lower()] = value.strip()
+
+            if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+                body = await _read_chunked(reader)
+                framed = True
+            elif 'content-length' in response_headers:
+                body = await reader.readexactly(int(response_headers['content-length']))
+                framed = True
+            else:
+                body = await reader.read()
+                framed = False
+            reusable = (framed and status_line.startswith('HTTP/1.1')
+                        and response_headers.get('connection', '').lower() != 'close')
+            if response_headers.get('content-encoding', '').lower() == 'gzip':
+                body = gzip.decompress(body)
+            return status, response_headers, body
+        finally:
+            # Un intento cancelado por timeout deja la conexión a medias: solo vuelve al pool si terminó limpia
+            if reusable and len(pool.idle) < self.pool_maxsize:
+                pool.idle.append((reader, writer))
+            else:
+                writer.close()
+
+    def _ssl(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+        return self._ssl_context
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            while pool.idle:
+                pool.idle.pop()[1].close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'engine': 'asyncio',
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retried,
+            'in_flight': self.in_flight,
+            'avg_latency_ms': round(self.total_latency / self.requests * 1000, 1) if self.requests else None,
+            'pool_maxsize': self.pool_maxsize,
+            'pools': [
+                {'host': f"{scheme}://{host}:{port}", 'connections_opened': pool.connections_opened,
+                 'requests': pool.requests, 'idle': len(pool.idle)}
+                for (scheme, host, port), pool in self._pools.items()
+            ]
+        }
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';')[0].strip(), 16)
+        if size == 0:
+            # Descartar trailers hasta la línea vacía
+            while (await reader.readuntil(b'\r\n')) != b'\r\n':
+                pass
+            return b''.join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos de un header Retry-After (número o fecha HTTP); None si falta o es inválido"""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value.strip())
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Instancia global compartida por el colector y el proxy
+upstream_client = UpstreamClient(
+    pool_connections=config.UPSTREAM_POOL_CONNECTIONS, pool_maxsize=config.UPSTREAM_POOL_MAXSIZE,
+    retries=config.UPSTREAM_RETRIES, backoff=config.UPSTREAM_BACKOFF
+)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Modelo tipado de observaciones y pronósticos de Conagua/SMN
+Los valores se guardan como números (None = sin dato) en objetos con
+__slots__; el texto con unidades ("21°C", "61%", "18 km/h") solo se genera
+al construir las respuestas del API con to_display().
+Author: EdbETO Solutions Team
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Union
+
+# Número al inicio de un valor de SMN o de un texto formateado ("21", "21.5°C", "-3 °C", "18 km/h")
+_NUMBER = re.compile(r'\s*(-?\d+(?:[.,]\d+)?)')
+
+Number = Union[int, float]
+
+def parse_number(value: Any) -> Optional[Number]:
+    """Valor numérico de un campo de SMN o de un texto con unidades; None si no hay dato"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = _NUMBER.match(str(value))
+    if not match:
+        return None
+    number = float(match.group(1).replace(',', '.'))
+    return int(number) if number.is_integer() else number
+
+def to_int(value: Any) -> Optional[int]:
+    """Entero de un campo de SMN o de la query ("010", " 9 ", "3.0"); None si falta o no es entero"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    number = to_float(text)
+    return int(number) if number is not None and number.is_integer() else None
+
+def to_float(value: Any) -> Optional[float]:
+    """Número de un campo de SMN o de la query (acepta coma decimal); None si falta o no es numérico"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(str(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+def format_number(value: Optional[Number], unit: str = '') -> str:
+    """Texto para el API: 'N/A' sin dato y sin decimales si el valor es entero"""
+    if value is None:
+        text = 'N/A'
+    elif isinstance(value, float) and value.is_integer():
+        text = str(int(value))
+    else:
+        text = str(value)
+    return f"{text}{unit}"
+
+def _text(value: Any) -> Any:
+    return 'N/A' if value is None else value
+
+class ForecastDay:
+    """Un día de pronóstico"""
+
+    __slots__ = ('label', 'date', 'temp_max', 'temp_min', 'sky', 'precip', 'precip_prob', 'wind_speed', 'wind_direction')
+
+    def __init__(self, label: str, date: Any = None, temp_max: Optional[Number] = None, temp_min: Optional[Number] = None,
+                 sky: Optional[str] = None, precip: Optional[Number] = None, precip_prob: Optional[Number] = None,
+                 wind_speed: Optional[Number] = None, wind_direction: Any = None):
+        self.label = label
+        self.date = date
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.sky = sky
+        self.precip = precip
+        self.precip_prob = precip_prob
+        self.wind_speed = wind_speed
+        self.wind_direction = wind_direction
+
+    @classmethod
+    def from_smn(cls, label: str, record: Dict[str, Any]) -> "ForecastDay":
+        """Día a partir de un registro de SMN (campos tmax, tmin, desciel, prec, ...)"""
+        return cls(
+            label,
+            date=record.get('ndia'),
+            temp_max=parse_number(record.get('tmax')),
+            temp_min=parse_number(record.get('tmin')),
+            sky=record.get('desciel'),
+            precip=parse_number(record.get('prec')),
+            precip_prob=parse_number(record.get('probprec')),
+            wind_speed=parse_number(record.get('velvien')),
+            wind_direction=record.get('dirvieng')
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma numérica para persistir en JSON/SQLite"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ForecastDay":
+        """Inverso de to_dict; también acepta el formato con textos de versiones anteriores"""
+        if 'dia' in data:
+            return cls(
+                data['dia'],
+                date=data.get('fecha'),
+                temp_max=parse_number(data.get('temp_max')),
+                temp_min=parse_number(data.get('temp_min')),
+                sky=data.get('condicion'),
+                precip=parse_number(data.get('precipitacion')),
+                precip_prob=parse_number(data.get('probabilidad_lluvia')),
+                wind_speed=parse_number(data.get('viento')),
+                wind_direction=data.get('direccion_viento')
+            )
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def to_display(self) -> Dict[str, Any]:
+        """Día formateado con el contrato público del API"""
+        return {
+            'dia': self.label,
+            'fecha': _text(self.date),
+            'temp_max': format_number(self.temp_max, '°C'),
+            'temp_min': format_number(self.temp_min, '°C'),
+            'condicion': _text(self.sky),
+            'precipitacion': format_number(self.precip, ' mm'),
+            'probabilidad_lluvia': format_number(self.precip_prob, '%'),
+            'viento': format_number(self.wind_speed, ' km/h'),
+            'direccion_viento': _text(self.wind_direction)
+        }
+
+class Observation:
+    """Datos de una estación: condiciones del día y pronóstico"""
+
+    __slots__ = ('station_name', 'temp_max', 'temp_min', 'humidity', 'wind_speed', 'wind_direction',
+                 'wind_direction_card', 'precip', 'precip_prob', 'pressure', 'sky', 'timestamp', 'source',
+                 'raw', 'forecast', 'note')
+
+    def __init__(self, station_name: str, timestamp: str, source: str, temp_max: Optional[Number] = None,
+                 temp_min: Optional[Number] = None, humidity: Optional[Number] = None, wind_speed: Optional[Number] = None,
+                 wind_direction: Any = None, wind_direction_card: Optional[str] = None, precip: Optional[Number] = None,
+                 precip_prob: Optional[Number] = None, pressure: Optional[Number] = None, sky: Optional[str] = None,
+                 raw: Optional[Dict[str, Any]] = None, forecast: Optional[List[ForecastDay]] = None,
+                 note: Optional[str] = None):
+        self.station_name = station_name
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.humidity = humidity
+        self.wind_speed = wind_speed
+        self.wind_direction = wind_direction
+        self.wind_direction_card = wind_direction_card
+        self.precip = precip
+        self.precip_prob = precip_prob
+        self.pressure = pressure
+        self.sky = sky
+        self.timestamp = timestamp
+        self.source = source
+        self.raw = raw
+        self.forecast = forecast if forecast is not None else []
+        self.note = note
+
+    @classmethod
+    def from_smn(cls, station_name: str, record: Dict[str, Any], forecast: List[ForecastDay],
+                 timestamp: str, source: str) -> "Observation":
+        """Observación a partir del registro de SMN del día actual"""
+        return cls(
+            station_name, timestamp, source,
+            temp_max=parse_number(record.get('tmax')),
+            temp_min=parse_number(record.get('tmin')),
+            # SMN no publica humedad relativa por municipio; se reporta la nubosidad (cc)
+            humidity=parse_number(record.get('cc')),
+            wind_speed=parse_number(record.get('velvien')),
+            wind_direction=record.get('dirvieng'),
+            wind_direction_card=record.get('dirvienc'),
+            precip=parse_number(record.get('prec')),
+            precip_prob=parse_number(record.get('probprec')),
+            sky=record.get('desciel'),
+            raw=record,
+            forecast=forecast
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Forma numérica para persistir en JSON/SQLite"""
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['forecast'] = [day.to_dict() for day in self.forecast]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Observation":
+        """Inverso de to_dict; también acepta el formato con textos de versiones anteriores"""
+        if 'temperatura' in data:
+            return cls(
+                data.get('station_name', ''), data.get('timestamp', ''), data.get('source', 'unknown'),
+                temp_max=parse_number(data.get('temperatura')),
+                temp_min=parse_number(data.get('temperatura_min')),
+                humidity=parse_number(data.get('humedad')),
+                wind_speed=parse_number(data.get('viento')),
+                wind_direction=data.get('direccion_viento'),
+                wind_direction_card=data.get('direccion_viento_card'),
+                precip=parse_number(data.get('precipitacion')),
+                precip_prob=parse_number(data.get('probabilidad_precipitacion')),
+                pressure=parse_number(data.get('presion')),
+                sky=data.get('condicion_cielo'),
+                raw=data.get('raw_data'),
+                forecast=[ForecastDay.from_dict(day) for day in data.get('pronostico', [])],
+                note=data.get('note')
+            )
+        fields = {name: data.get(name) for name in cls.__slots__}
+        fields['forecast'] = [ForecastDay.from_dict(day) for day in data.get('forecast') or []]
+        return cls(**fields)
+
+    def content_key(self) -> Dict[str, Any]:
+        """Contenido comparable entre ciclos (sin el timestamp de la consulta)"""
+        data = self.to_dict()
+        del data['timestamp']
+        return data
+
+    def to_display(self) -> Dict[str, Any]:
+        """Observación formateada con el contrato público del API (dict nuevo en cada llamada)"""
+        display = {
+            'station_name': self.station_name,
+            'temperatura': format_number(self.temp_max, '°C'),
+            'temperatura_min': format_number(self.temp_min, '°C'),
+            'humedad': format_number(self.humidity, '%'),
+            'viento': format_number(self.wind_speed, ' km/h'),
+            'direccion_viento': _text(self.wind_direction),
+            'direccion_viento_card': _text(self.wind_direction_card),
+            'precipitacion': format_number(self.precip, ' mm'),
+            'probabilidad_precipitacion': format_number(self.precip_prob, '%'),
+            'condicion_cielo': _text(self.sky),
+            'timestamp': self.timestamp,
+            'source': self.source
+        }
+        if self.pressure is not None:
+            display['presion'] = format_number(self.pressure, ' hPa')
+        if self.raw is not None:
+            display['raw_data'] = self.raw
+        display['pronostico'] = [day.to_display() for day in self.forecast]
+        if self.note is not None:
+            display['note'] = self.note
+        return display
@@ -50,6 +50,7 @@ let STATE = {
     chart: null,
     modelsLoaded: false,
     updateTimer: null,
+    eventSource: null,
     fetchingData: false
 };
 
@@ -145,10 +146,27 @@ function handleTimeseriesChange() {
 }
 
 /**
- * Iniciar actualizaciones periódicas
+ * Iniciar actualizaciones: push por Server-Sent Events o, si no hay soporte, polling
  */
 function startPeriodicUpdates() {
     // Limpiar timer existente si hay alguno
+    if (STATE.updateTimer) {
+        clearInterval(STATE.updateTimer);
+        STATE.updateTimer = null;
+    }
+    
+    if (window.EventSource) {
+        startEventStream();
+        return;
+    }
+    
+    startPolling();
+}
+
+/**
+ * Polling cada CONFIG.UPDATE_INTERVAL (sin EventSource o si el stream no está disponible)
+ */
+function startPolling() {
     if (STATE.updateTimer) {
         clearInterval(STATE.updateTimer);
     }
@@ -170,6 +188,50 @@ function startPeriodicUpdates() {
     console.log(`⏰ Actualizaciones automáticas cada ${CONFIG.UPDATE_INTERVAL / 60000} minutos`);
 }
 
+/**
+ * Escuchar /api/weather/stream: el servidor avisa cuando termina cada actualización.
+ * EventSource reconecta solo y reanuda con Last-Event-ID.
+ */
+function startEventStream() {
+    if (STATE.eventSource) {
+        STATE.eventSource.close();
+    }
+    
+    const source = new EventSource(`${CONFIG.API_BASE_URL}/weather/stream`);
+    const applyEvent = (event) => {
+        const payload = JSON.parse(event.data);
+        const data = payload.alcaldias && payload.alcaldias[STATE.alcaldiaActual];
+        if (!data) return;
+        
+        console.log(`📡 Evento ${event.type} (${event.lastEventId})`);
+        STATE.weatherData = data;
+        STATE.lastFetchTime = new Date();
+        updateWeatherUI(data);
+        updateStatus(`✅ Datos actualizados para ${STATE.alcaldiaActual}`, 'success');
+        
+        if (event.type === 'update' && DOM.timeseriesPeriod && DOM.timeseriesMetric) {
+            fetchTimeseriesData(STATE.alcaldiaActual);
+        }
+    };
+    
+    source.addEventListener('snapshot', applyEvent);
+    source.addEventListener('update', applyEvent);
+    source.onerror = () => {
+        // Una respuesta distinta de 200 (503 too_many_streams, servidor sin SSE) no se reintenta
+        if (source.readyState === EventSource.CLOSED) {
+            console.warn('⚠️ Stream de clima no disponible, usando polling');
+            source.close();
+            STATE.eventSource = null;
+            startPolling();
+            return;
+        }
+        console.warn('⚠️ Stream de clima interrumpido, reconectando...');
+    };
+    STATE.eventSource = source;
+    
+    console.log('📡 Actualizaciones por Server-Sent Events');
+}
+
 /**
  * Manejar errores generales
  * @param {Error} error - El error producido